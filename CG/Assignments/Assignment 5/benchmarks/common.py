@@ -0,0 +1,75 @@
+import glob
+import time
+from types import SimpleNamespace
+
+import pygame as pg
+from OpenGL.GL import *
+
+from oven_engine_3D.camera import Camera
+from oven_engine_3D.environment import Environment
+from oven_engine_3D.light_clusters import LightClusters
+from oven_engine_3D.shaders import BaseShader
+from oven_engine_3D.shaders.uniform_blocks import FrameUniforms
+from oven_engine_3D.utils.geometry import Vector3D
+
+MODELS_GLOB = "res/models/*.obj"
+
+
+def create_context(size=(640, 360)):
+    """
+    Opens a hidden window with an OpenGL context, so that benchmarks can
+    create buffers and shaders without a full BaseApp3D
+    """
+    pg.init()
+    pg.display.set_mode(size, pg.OPENGL | pg.DOUBLEBUF | pg.HIDDEN)
+
+    glViewport(0, 0, *size)
+    glEnable(GL_DEPTH_TEST)
+
+
+def bundled_models():
+    return sorted(glob.glob(MODELS_GLOB))
+
+
+class BenchmarkApp:
+    """
+    Bare minimum of what the shaders expect to find in a BaseApp3D
+    """
+    def __init__(self, ratio=16. / 9.):
+        self.lights = []
+        self.ticks = 0
+        self.environment = Environment()
+        BaseShader.global_defines.update(self.environment.shader_defines)
+        self.skybox = SimpleNamespace(cubemap_id=0)
+        self.camera = Camera(self, eye=Vector3D.BACKWARD * 5., look_at=Vector3D.ZERO, ratio=ratio)
+
+        self.light_clusters = LightClusters()
+        self.light_clusters.build(self.camera, self.lights)
+        self.light_clusters.upload()
+
+        self.frame_uniforms = FrameUniforms()
+        self.frame_uniforms.update(self)
+
+
+def time_frames(draw_frame, frames=200, warmup=10):
+    """
+    Runs draw_frame a few times to warm up, then returns the average frame time in milliseconds
+    """
+    for _ in range(warmup):
+        draw_frame()
+    glFinish()
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        draw_frame()
+    glFinish()
+
+    return (time.perf_counter() - start) * 1000. / frames
+
+
+def print_table(header, rows):
+    widths = [max(len(str(r[i])) for r in [header] + rows) for i in range(len(header))]
+
+    for r in [header] + rows:
+        print("  ".join(str(c).rjust(w) for c, w in zip(r, widths)))
@@ -0,0 +1,77 @@
+"""
+Compares the forward and the deferred paths on a scene of overlapping spheres as the number of
+point lights grows: forward shading evaluates the lights of every fragment drawn, even those that
+get drawn over later, while the deferred light pass only shades each visible pixel once.
+
+Run from the assignment folder with:
+    python -m benchmarks.deferred
+"""
+import random
+
+from benchmarks.common import create_context, BenchmarkApp, time_frames, print_table
+from oven_engine_3D.deferred import DeferredRenderer
+from oven_engine_3D.entities import Sphere
+from oven_engine_3D.light import Light
+from oven_engine_3D.render_queue import RenderQueue
+from oven_engine_3D.shaders.mesh_shader import MeshShader
+from oven_engine_3D.transforms import TransformStore
+from oven_engine_3D.utils.geometry import Vector3D
+
+SIZE = (1280, 720)
+GRID_SIZE = 8
+# Spheres one behind the other along each line of sight
+LAYERS = 6
+LIGHT_COUNTS = [8, 64, 256, 1024]
+
+
+def build_scene(app):
+    material = MeshShader(diffuse_color="white", shininess=20.)
+
+    return [Sphere(app, origin=Vector3D(i - GRID_SIZE / 2., j - GRID_SIZE / 2., -k * 1.5), scale=.9, shader=material)
+            for i in range(GRID_SIZE) for j in range(GRID_SIZE) for k in range(LAYERS)]
+
+
+def set_lights(app, count):
+    random.seed(count)
+
+    app.lights = [Light(app, origin=Vector3D(random.uniform(-GRID_SIZE / 2., GRID_SIZE / 2.),
+                                             random.uniform(-GRID_SIZE / 2., GRID_SIZE / 2.),
+                                             random.uniform(-LAYERS * 1.5, 2.)),
+                        diffuse=random.choice(["red", "green", "blue", "white"]), radius=random.uniform(1., 3.))
+                  for _ in range(count)]
+    TransformStore.update()
+
+    app.light_clusters.build(app.camera, app.lights)
+    app.light_clusters.upload()
+    app.frame_uniforms.update(app)
+
+
+def main():
+    create_context(SIZE)
+
+    app = BenchmarkApp(ratio=SIZE[0] / SIZE[1])
+    app.camera.look_at(Vector3D.ZERO, new_origin=Vector3D.BACKWARD * 8.)
+    app.camera.update_frustum()
+
+    queue = RenderQueue()
+    queue.add_entities(build_scene(app), app.camera)
+    queue.build(app.camera.origin)
+
+    deferred = DeferredRenderer(SIZE)
+
+    rows = []
+    for count in LIGHT_COUNTS:
+        set_lights(app, count)
+
+        forward_ms = time_frames(lambda: queue.draw_pass(RenderQueue.OPAQUE_PASS))
+        deferred_ms = time_frames(lambda: deferred.draw_opaque(queue, app))
+
+        rows.append([count, f"{forward_ms:.3f}", f"{deferred_ms:.3f}", f"{forward_ms / deferred_ms:.2f}x"])
+
+    print()
+    print(f"{len(queue.sorted_items)} draws ({GRID_SIZE * GRID_SIZE * LAYERS} spheres), {SIZE[0]}x{SIZE[1]}")
+    print_table(["lights", "forward ms", "deferred ms", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    main()
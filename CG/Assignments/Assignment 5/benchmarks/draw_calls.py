@@ -0,0 +1,75 @@
+"""
+Compares the old one-glDrawArrays-per-face mesh drawing with the
+indexed single glDrawElements path, on the bundled OBJ models.
+
+Run from the assignment folder with:
+    python -m benchmarks.draw_calls
+"""
+import numpy as np
+from OpenGL.GL import *
+
+from benchmarks.common import create_context, bundled_models, BenchmarkApp, time_frames, print_table
+from oven_engine_3D.meshes import Mesh, OBJMesh
+from oven_engine_3D.shaders.mesh_shader import MeshShader
+from oven_engine_3D.utils.matrices import ModelMatrix
+from oven_engine_3D.utils.geometry import Vector3D
+from oven_engine_3D.utils.gl_state import GLState
+
+
+class PerFaceMesh:
+    """
+    Un-indexed copy of a mesh, drawn the way Mesh.draw used to: attributes linked on
+    every draw and one call per face
+    """
+    def __init__(self, mesh: Mesh):
+        idx = self.__read_indices(mesh)
+
+        self.vbo = Mesh.vbo_from_data(np.asarray(mesh.vertex_positions)[idx],
+                                      np.asarray(mesh.vertex_normals)[idx],
+                                      np.asarray(mesh.vertex_uvs)[idx])
+        self.attrib_order = mesh.attrib_order
+        self.face_count = mesh.triangle_count
+
+    @staticmethod
+    def __read_indices(mesh: Mesh):
+        GLState.bind_vertex_array(0)
+        GLState.bind_buffer(GL_ELEMENT_ARRAY_BUFFER, mesh.ebo)
+        data = glGetBufferSubData(GL_ELEMENT_ARRAY_BUFFER, 0, mesh.index_count * 4)
+
+        return np.frombuffer(data, dtype="uint32")
+
+    def draw(self, shader):
+        # Default vertex array, so the indexed meshes' ones are left untouched
+        GLState.bind_vertex_array(0)
+        shader.link_attrib_vbo(self.vbo, self.attrib_order)
+
+        for k in range(self.face_count):
+            glDrawArrays(GL_TRIANGLES, k * 3, 3)
+
+
+def main():
+    create_context()
+
+    app = BenchmarkApp()
+    shader = MeshShader()
+    model_matrix = ModelMatrix.from_transformations(Vector3D.ZERO)
+
+    rows = []
+    for path in bundled_models():
+        mesh = OBJMesh.load(path)
+        legacy = PerFaceMesh(mesh)
+
+        def frame(m):
+            return lambda: shader.draw(app=app, mesh=m, model_matrix=model_matrix)
+
+        before = time_frames(frame(legacy))
+        after = time_frames(frame(mesh))
+
+        rows.append([path, legacy.face_count, 1, f"{before:.3f}", f"{after:.3f}", f"{before / after:.1f}x"])
+
+    print()
+    print_table(["model", "calls before", "calls after", "ms before", "ms after", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Times the CPU binning of point lights into the clusters of the camera's frustum as the light count
+grows, along with how many lights a fragment goes through: all of them with a plain loop over the
+lights vs those of its cluster (average and worst cluster). Runs without an OpenGL context.
+
+Run from the assignment folder with:
+    python -m benchmarks.light_clusters
+"""
+import math
+import random
+import time
+
+from benchmarks.common import print_table
+from oven_engine_3D.camera import Camera
+from oven_engine_3D.light import Light
+from oven_engine_3D.light_clusters import LightClusters
+from oven_engine_3D.transforms import TransformStore
+from oven_engine_3D.utils.geometry import Vector3D
+
+LIGHT_COUNTS = [16, 64, 256, 1024]
+REPEATS = 20
+SCENE_SIZE = 40.
+
+
+def random_lights(count):
+    random.seed(count)
+
+    lights = [Light(None, origin=Vector3D(*[random.uniform(-SCENE_SIZE, SCENE_SIZE) for _ in range(3)]),
+                    diffuse=(1., .8, .6), ambient_color=(0., 0., 0.), radius=random.uniform(1., 4.))
+              for _ in range(count)]
+    TransformStore.update()
+
+    return lights
+
+
+def main():
+    camera = Camera(None, eye=Vector3D.BACKWARD * SCENE_SIZE, look_at=Vector3D.ZERO, fov=math.tau / 6.,
+                    near=.1, far=SCENE_SIZE * 3.)
+    clusters = LightClusters()
+
+    rows = []
+    for count in LIGHT_COUNTS:
+        lights = random_lights(count)
+
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            clusters.build(camera, lights)
+        build_time = (time.perf_counter() - start) * 1000. / REPEATS
+
+        per_cluster = clusters.cells[:, 1]
+        rows.append([count, f"{build_time:.3f}", count, f"{per_cluster.mean():.2f}", int(per_cluster.max())])
+
+    print()
+    print(f"{clusters.cluster_count} clusters {clusters.grid_size}")
+    print_table(["lights", "binning ms", "lights/fragment (loop)", "lights/fragment (avg cluster)",
+                 "worst cluster"], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Times the CPU side of the camera matrices each frame (filling the frame uniform block,
+extracting the frustum planes, the skybox's camera uniforms): the previous matrices,
+rebuilt as new float64 arrays on every read, vs the persistent float32 buffers whose
+version counters let the unchanged ones be skipped. Runs without an OpenGL context.
+
+Run from the assignment folder with:
+    python -m benchmarks.matrices
+"""
+import math
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table
+from oven_engine_3D.camera import Camera
+from oven_engine_3D.shaders.uniform_blocks import FRAME_DTYPE
+from oven_engine_3D.utils.geometry import Vector3D
+
+FRAMES = 20000
+
+
+def legacy_view(view):
+    return np.array([[view.u.x, view.u.y, view.u.z, -view.eye.dot(view.u)],
+                     [view.v.x, view.v.y, view.v.z, -view.eye.dot(view.v)],
+                     [view.n.x, view.n.y, view.n.z, -view.eye.dot(view.n)],
+                     [0,        0,        0,        1]])
+
+
+def legacy_projection(projection):
+    rl_inv_dist = 1. / (projection.right - projection.left)
+    tb_inv_dist = 1. / (projection.top - projection.bottom)
+    nf_inv_dist = 1. / (projection.near - projection.far)
+
+    return np.array([[2 * projection.near * rl_inv_dist, 0, 0, 0],
+                     [0, 2 * projection.near * tb_inv_dist, 0, 0],
+                     [0, 0, (projection.near + projection.far) * nf_inv_dist,
+                      2 * projection.near * projection.far * nf_inv_dist],
+                     [0, 0, -1, 0]])
+
+
+def frustum_planes(clip):
+    planes = np.stack([clip[3] + clip[0], clip[3] - clip[0], clip[3] + clip[1],
+                       clip[3] - clip[1], clip[3] + clip[2], clip[3] - clip[2]])
+
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def legacy_frame(camera, block, t):
+    # Every read builds the matrices again
+    data = block[0]
+    data["projection_matrix"] = legacy_projection(camera.projection_matrix)
+    data["view_matrix"] = legacy_view(camera.view_matrix)
+    data["camera_position"] = [*camera.view_matrix.eye, 1.]
+    data["time"] = t
+
+    frustum_planes(legacy_projection(camera.projection_matrix) @ legacy_view(camera.view_matrix))
+
+    sky_view = np.array(legacy_view(camera.view_matrix), dtype="float32")
+    sky_view[:3, 3] = 0
+    np.array(legacy_projection(camera.projection_matrix), dtype="float32")
+
+
+def versioned_frame(camera, block, t, state):
+    # Same checks as FrameUniforms.set_frame, Camera.update_frustum and SkyboxShader.set_camera_uniforms
+    data = block[0]
+    data["time"] = t
+
+    versions = (camera.projection_matrix, camera.projection_matrix.version,
+                camera.view_matrix, camera.view_matrix.version)
+    if versions != state.get("frame"):
+        data["projection_matrix"] = camera.projection_matrix.values
+        data["view_matrix"] = camera.view_matrix.values
+        data["camera_position"] = [*camera.view_matrix.eye, 1.]
+        state["frame"] = versions
+
+    camera.update_frustum()
+
+    if versions != state.get("sky"):
+        sky_view = np.array(camera.view_matrix.values, dtype="float32")
+        sky_view[:3, 3] = 0
+        state["sky"] = versions
+
+
+def timed(frame, moving):
+    camera = Camera(None, eye=Vector3D(0., 1., 5.), look_at=Vector3D.ZERO)
+    block = np.zeros(1, dtype=FRAME_DTYPE)
+
+    start = time.perf_counter()
+    for i in range(FRAMES):
+        if moving:
+            camera.view_matrix.rotate_global_y(.001)
+        frame(camera, block, i * .016)
+
+    return (time.perf_counter() - start) * 1e6 / FRAMES
+
+
+def main():
+    rows = []
+    for moving in [False, True]:
+        state = {}
+        before = timed(legacy_frame, moving)
+        after = timed(lambda camera, block, t: versioned_frame(camera, block, t, state), moving)
+
+        rows.append(["moving" if moving else "static", f"{before:.2f}", f"{after:.2f}",
+                     f"{before / after:.1f}x" if after > 0. else math.inf])
+
+    print()
+    print("Camera matrices, us/frame")
+    print_table(["camera", "rebuilt on read", "versioned buffers", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    main()
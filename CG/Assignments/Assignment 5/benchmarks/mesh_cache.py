@@ -0,0 +1,43 @@
+"""
+Measures cold (parse OBJ + write cache) vs warm (memory-mapped cache)
+mesh loading on the bundled OBJ models.
+
+Run from the assignment folder with:
+    python -m benchmarks.mesh_cache
+"""
+import os
+import time
+
+from benchmarks.common import create_context, bundled_models, print_table
+from oven_engine_3D.meshes import OBJMesh
+
+
+def timed_load(path):
+    OBJMesh.loaded.clear()
+
+    start = time.perf_counter()
+    OBJMesh.load(path)
+
+    return (time.perf_counter() - start) * 1000.
+
+
+def main():
+    create_context()
+
+    rows = []
+    for path in bundled_models():
+        cache = OBJMesh.cache_path(path)
+        if os.path.exists(cache):
+            os.remove(cache)
+
+        cold = timed_load(path)
+        warm = timed_load(path)
+
+        rows.append([path, f"{cold:.1f}", f"{warm:.1f}", f"{cold / warm:.0f}x"])
+
+    print()
+    print_table(["model", "cold ms", "warm ms", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    main()
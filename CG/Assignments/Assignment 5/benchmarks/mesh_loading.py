@@ -0,0 +1,59 @@
+"""
+Measures mesh load time on the bundled OBJ models, comparing the old
+per-vertex list interleaving with the vectorized Mesh.interleave.
+
+Run from the assignment folder with:
+    python -m benchmarks.mesh_loading
+"""
+import time
+from itertools import chain
+
+import numpy as np
+import pywavefront as pwf
+
+from benchmarks.common import create_context, bundled_models, print_table
+from oven_engine_3D.meshes import Mesh, OBJMesh
+
+
+def legacy_interleave(pos, nor, uv):
+    tmp = [(*p, *n, *u) for p, n, u in zip(pos, nor, uv)]
+    tmp = list(chain.from_iterable(tmp))
+
+    return np.array(tmp, dtype="float32")
+
+
+def timed(f, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f(*args)
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000.
+
+
+def main():
+    create_context()
+
+    rows = []
+    for path in bundled_models():
+        verts = np.array(pwf.Wavefront(path).mesh_list[0].materials[0].vertices, dtype="float32").reshape(-1, 8)
+        pos, nor, uv = verts[:, 5:8], verts[:, 2:5], verts[:, 0:2]
+
+        before = timed(legacy_interleave, pos, nor, uv)
+        after = timed(Mesh.interleave, pos, nor, uv)
+
+        def load():
+            OBJMesh.loaded.clear()
+            OBJMesh.load(path)
+
+        total = timed(load, repeat=1)
+
+        rows.append([path, len(verts), f"{before:.2f}", f"{after:.2f}", f"{before / after:.0f}x", f"{total:.1f}"])
+
+    print()
+    print_table(["model", "vertices", "interleave ms before", "interleave ms after", "speedup", "full load ms"], rows)
+
+
+if __name__ == '__main__':
+    main()
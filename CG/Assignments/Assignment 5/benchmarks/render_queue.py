@@ -0,0 +1,82 @@
+"""
+Counts the GL state changes per frame of a scene whose materials are interleaved,
+drawing it in insertion order vs through the sorted render queue.
+
+Run from the assignment folder with:
+    python -m benchmarks.render_queue
+"""
+from benchmarks.common import create_context, BenchmarkApp, time_frames, print_table
+from oven_engine_3D.entities import Cube, Sphere
+from oven_engine_3D.render_queue import RenderQueue
+from oven_engine_3D.shaders.mesh_shader import MeshShader
+from oven_engine_3D.utils.geometry import Vector3D
+from oven_engine_3D.utils.gl_state import GLState
+
+GRID_SIZE = 12
+COLORS = ["red", "green", "blue", "yellow", "cyan", "magenta"]
+TEXTURES = ["res/textures/uvgrid.jpg", "res/textures/img1.png", ""]
+
+
+def build_scene(app):
+    materials = [MeshShader(diffuse_color=c, diffuse_texture=t) for c in COLORS for t in TEXTURES]
+    entities = []
+
+    # Neighbours never share mesh or material, as bad as it gets for insertion order
+    for i in range(GRID_SIZE):
+        for j in range(GRID_SIZE):
+            k = i * GRID_SIZE + j
+            kind = Cube if k % 2 == 0 else Sphere
+            origin = Vector3D(i - GRID_SIZE / 2., j - GRID_SIZE / 2., -10. - (k % 5))
+
+            entities.append(kind(app, origin=origin, scale=.4, shader=materials[k % len(materials)]))
+
+    return entities
+
+
+def measure(app, entities, instancing, sort):
+    queue = RenderQueue(instancing=instancing, sort=sort)
+
+    def frame():
+        GLState.new_frame()
+
+        queue.clear()
+        for ent in entities:
+            queue.add_entity(ent)
+        queue.build(app.camera.origin)
+
+        queue.draw_pass(RenderQueue.OPAQUE_PASS)
+        queue.draw_pass(RenderQueue.TRANSPARENT_PASS)
+
+    ms = time_frames(frame)
+    # Let the counters of a whole frame land in GLState.stats()
+    frame()
+    GLState.new_frame()
+    stats = GLState.stats()
+
+    return ms, stats
+
+
+def main():
+    create_context()
+
+    app = BenchmarkApp()
+    entities = build_scene(app)
+
+    rows = []
+    for instancing in [False, True]:
+        for sort in [False, True]:
+            ms, stats = measure(app, entities, instancing, sort)
+            by_kind = stats["changes_by_kind"]
+
+            rows.append(["on" if instancing else "off", "sorted" if sort else "insertion",
+                         stats["changes"], by_kind.get("program", 0), by_kind.get("texture", 0),
+                         by_kind.get("vertex_array", 0), stats["avoided"], f"{ms:.3f}"])
+
+    print()
+    print(f"{len(entities)} entities, {len(COLORS) * len(TEXTURES)} materials")
+    print_table(["instancing", "order", "state changes", "programs", "textures", "vertex arrays", "avoided", "ms"],
+                rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Times the per-frame rotation updates of entities and cameras: Euler angles turned into
+three 4x4 matrices vs quaternions, and the camera's axes rotated through 4x4 matrices
+vs through a quaternion. Runs without an OpenGL context.
+
+Run from the assignment folder with:
+    python -m benchmarks.rotations
+"""
+import math
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table
+from oven_engine_3D.utils.geometry import Vector3D, Quaternion
+from oven_engine_3D.utils.matrices import ModelMatrix, ViewMatrix
+
+ITERATIONS = 20000
+BATCH_SIZE = 2000
+
+
+def legacy_model_update(matrix, angle):
+    matrix.load_identity()
+    matrix.add_translation(Vector3D(1., 2., 3.))
+    matrix.add_rotation(Vector3D(angle, angle * 2., 0.))
+
+
+def quaternion_model_update(matrix, angle):
+    rotation = Quaternion.from_axis_angle(Vector3D.UP, angle) * Quaternion.from_axis_angle(Vector3D.RIGHT, angle)
+    matrix.set_transformations(Vector3D(1., 2., 3.), rotation)
+
+
+def legacy_camera_turn(view, angle):
+    c, s = np.cos(angle), np.sin(angle)
+    view.rotate_with_matrix(np.array([[c, 0, s, 0], [0, 1, 0, 0], [-s, 0, c, 0], [0, 0, 0, 1]], dtype=np.float32))
+
+
+def quaternion_camera_turn(view, angle):
+    view.rotate_global_y(angle)
+
+
+def timed(f, target):
+    start = time.perf_counter()
+    for i in range(ITERATIONS):
+        f(target, i * .001)
+
+    return (time.perf_counter() - start) * 1e6 / ITERATIONS
+
+
+def batched_rows():
+    angles = np.linspace(0., math.tau, BATCH_SIZE)
+    axes = [Vector3D(math.cos(a), 1., math.sin(a)) for a in angles]
+
+    start = time.perf_counter()
+    for axis, angle in zip(axes, angles):
+        ModelMatrix.from_transformations(Vector3D.ZERO, axis * float(angle))
+    per_matrix = (time.perf_counter() - start) * 1000.
+
+    quaternions = np.array([tuple(Quaternion.from_axis_angle(axis, float(angle))) for axis, angle in zip(axes, angles)])
+    start = time.perf_counter()
+    Quaternion.arrays_to_matrices(Quaternion.compose_arrays(quaternions, quaternions))
+    batched = (time.perf_counter() - start) * 1000.
+
+    return [f"{BATCH_SIZE} rotation matrices", f"{per_matrix:.3f} ms", f"{batched:.3f} ms",
+            f"{per_matrix / batched:.1f}x"]
+
+
+def main():
+    rows = []
+    for name, legacy, quaternion, target in [
+        ("model matrix", legacy_model_update, quaternion_model_update, ModelMatrix),
+        ("camera turn", legacy_camera_turn, quaternion_camera_turn, ViewMatrix),
+    ]:
+        before = timed(legacy, target())
+        after = timed(quaternion, target())
+        rows.append([name, f"{before:.2f} us", f"{after:.2f} us", f"{before / after:.1f}x"])
+
+    rows.append(batched_rows())
+
+    print()
+    print_table(["update", "4x4 matrices", "quaternions", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    main()
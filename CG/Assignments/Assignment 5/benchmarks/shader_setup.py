@@ -0,0 +1,60 @@
+"""
+Times the creation of a scene's worth of materials, with and without injected code, and counts
+how many programs actually got compiled for them (materials with the same final sources share one).
+The first run starts from an empty program cache (cold), the second one loads the binaries the
+first one saved (warm), as the next launch of the app would.
+
+Run from the assignment folder with:
+    python -m benchmarks.shader_setup
+"""
+import time
+
+from benchmarks.common import create_context, print_table
+from oven_engine_3D.shaders import BaseShader
+from oven_engine_3D.shaders.mesh_shader import MeshShader
+from oven_engine_3D.shaders.program_cache import ProgramCache
+
+# Separate from the app's cache, which would otherwise be emptied for the cold run
+CACHE_DIR = "res/cache/benchmark_programs"
+
+INJECTED_FRAGS = ["", "shaders/injected/funky.frag", "shaders/injected/rotation.frag", "shaders/injected/uvwarp.frag"]
+INJECTED_VERTS = ["", "shaders/injected/vert_warp.vert"]
+COLORS = ["white", "red", "green", "blue"]
+
+
+def create_materials():
+    return [MeshShader(injected_frag=frag, injected_vert=vert, diffuse_color=color, unshaded=unshaded)
+            for frag in INJECTED_FRAGS for vert in INJECTED_VERTS for color in COLORS for unshaded in [False, True]]
+
+
+def timed_setup():
+    # As if the app was launched again
+    for lookup in [BaseShader.compiled_programs, BaseShader.compiled_vert_shaders,
+                   BaseShader.compiled_frag_shaders, BaseShader.program_users]:
+        lookup.clear()
+    ProgramCache.reset_stats()
+
+    start = time.perf_counter()
+    materials = create_materials()
+    setup_ms = (time.perf_counter() - start) * 1000.
+
+    return [len(materials), ProgramCache.stats["compiled"][0], ProgramCache.stats["cached"][0], f"{setup_ms:.1f}"]
+
+
+def main():
+    create_context()
+
+    ProgramCache.directory = CACHE_DIR
+    ProgramCache.clear()
+
+    cold = timed_setup()
+    warm = timed_setup()
+
+    print()
+    if not ProgramCache.supported():
+        print("Program binaries unsupported by the driver, both runs compile everything")
+    print_table(["run", "materials", "compiled", "from cache", "setup ms"], [["cold"] + cold, ["warm"] + warm])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Compares scene queries (frustum culling, radius query, ray picking) done with a linear
+scan of every entity vs through the loose octree, for growing scene sizes.
+Runs without an OpenGL context.
+
+Run from the assignment folder with:
+    python -m benchmarks.spatial_index
+"""
+import math
+import random
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table
+from oven_engine_3D.spatial import LooseOctree
+from oven_engine_3D.utils.geometry import Vector3D
+
+WORLD_SIZE = 400.
+SCENE_SIZES = [100, 1000, 10000]
+QUERIES = 50
+
+# Frustum-like box of side 40 around the origin
+PLANES = np.array([[1, 0, 0, 20], [-1, 0, 0, 20], [0, 1, 0, 20], [0, -1, 0, 20], [0, 0, 1, 20], [0, 0, -1, 20]],
+                  dtype="float64")
+
+
+class Bounded:
+    """
+    Stand-in for a DrawnEntity, only carrying its bounds
+    """
+    def __init__(self, center, radius):
+        self.bounding_sphere = (center, radius)
+
+
+def random_scene(count):
+    half = WORLD_SIZE / 2.
+    return [Bounded(Vector3D(*[random.uniform(-half, half) for _ in range(3)]), random.uniform(.5, 3.))
+            for _ in range(count)]
+
+
+def linear_frustum(objects):
+    return [o for o in objects if all(PLANES[:, :3] @ tuple(o.bounding_sphere[0]) + PLANES[:, 3] >= -o.bounding_sphere[1])]
+
+
+def linear_sphere(objects, center, radius):
+    return [o for o in objects if o.bounding_sphere[0].distance_to(center) <= radius + o.bounding_sphere[1]]
+
+
+def linear_pick(objects, origin, direction):
+    best, best_t = None, math.inf
+    for o in objects:
+        center, radius = o.bounding_sphere
+        along = (center - origin).dot(direction)
+        dist_sq = (center - origin).length_sq - along**2
+
+        if dist_sq <= radius**2 and 0. <= along < best_t:
+            best, best_t = o, along
+
+    return best
+
+
+def timed(f):
+    start = time.perf_counter()
+    for _ in range(QUERIES):
+        f()
+
+    return (time.perf_counter() - start) * 1000. / QUERIES
+
+
+def main():
+    random.seed(0)
+
+    rows = []
+    for count in SCENE_SIZES:
+        objects = random_scene(count)
+
+        tree = LooseOctree(size=WORLD_SIZE)
+        for o in objects:
+            tree.insert(o)
+
+        direction = Vector3D(1., .3, .2).normalized
+        queries = [
+            ("frustum", lambda: linear_frustum(objects), lambda: tree.query_frustum(PLANES)),
+            ("radius", lambda: linear_sphere(objects, Vector3D.ZERO, 10.),
+             lambda: tree.query_sphere(Vector3D.ZERO, 10.)),
+            ("pick", lambda: linear_pick(objects, Vector3D.ZERO, direction),
+             lambda: tree.pick(Vector3D.ZERO, direction)),
+        ]
+
+        for name, linear, indexed in queries:
+            before = timed(linear)
+            after = timed(indexed)
+            rows.append([count, name, f"{before:.3f}", f"{after:.3f}", f"{before / after:.1f}x"])
+
+    print()
+    print_table(["entities", "query", "linear ms", "octree ms", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Measures the CPU time spent per frame on model matrices, comparing the old
+rebuild-every-frame update, per-entity dirty-flag updates and the batched
+TransformStore update, for static and moving entities, then the normal matrices
+(inverse transpose) computed per entity every frame vs cached in the store.
+Runs without an OpenGL context.
+
+Run from the assignment folder with:
+    python -m benchmarks.transforms
+"""
+import math
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table
+from oven_engine_3D.entities import Entity
+from oven_engine_3D.transforms import TransformStore
+from oven_engine_3D.utils.geometry import Vector3D
+
+ENTITY_COUNT = 2000
+FRAMES = 20
+
+
+class Dummy(Entity):
+    def _update(self, delta):
+        pass
+
+    def handle_event(self, ev):
+        pass
+
+
+def legacy_update(ent: Entity):
+    ent.model_matrix.load_identity()
+    ent.model_matrix.add_translation(ent.origin)
+    ent.model_matrix.add_rotation(ent.rotation)
+    ent.model_matrix.add_scale(ent.scale)
+
+
+def per_entity(update):
+    def frame(entities):
+        for ent in entities:
+            update(ent)
+
+    return frame
+
+
+def batched(entities):
+    TransformStore.update()
+
+
+def per_entity_normals(entities):
+    TransformStore.update()
+    for ent in entities:
+        np.linalg.inv(ent.model_matrix.values[:3, :3]).T
+
+
+def cached_normals(entities):
+    TransformStore.update()
+    TransformStore.normals([ent.transform_index for ent in entities])
+
+
+def timed_frames(entities, frame, moving):
+    total = 0.
+
+    for _ in range(FRAMES):
+        if moving:
+            for ent in entities:
+                ent.rotate(.01)
+
+        # Only the matrix updates are timed, not the rotate calls
+        start = time.perf_counter()
+        frame(entities)
+        total += time.perf_counter() - start
+
+    return total * 1000. / FRAMES
+
+
+def main():
+    entities = [Dummy(None, origin=Vector3D(i, 0., 0.), rotation=Vector3D(0., i * .1, 0.), scale=Vector3D(1., 2., 1.))
+                for i in range(ENTITY_COUNT)]
+
+    rows = []
+    for moving in [False, True]:
+        before = timed_frames(entities, per_entity(legacy_update), moving)
+        dirty = timed_frames(entities, per_entity(lambda e: e.update_model_matrix()), moving)
+        store = timed_frames(entities, batched, moving)
+
+        rows.append(["moving" if moving else "static", f"{before:.3f}", f"{dirty:.3f}", f"{store:.3f}",
+                     f"{before / store:.1f}x" if store > 0. else math.inf])
+
+    print()
+    print(f"{ENTITY_COUNT} entities, ms/frame")
+    print_table(["entities", "rebuild all", "per-entity dirty", "batched store", "speedup"], rows)
+
+    rows = []
+    for moving in [False, True]:
+        before = timed_frames(entities, per_entity_normals, moving)
+        after = timed_frames(entities, cached_normals, moving)
+
+        rows.append(["moving" if moving else "static", f"{before:.3f}", f"{after:.3f}", f"{before / after:.1f}x"])
+
+    print()
+    print("Normal matrices, ms/frame")
+    print_table(["entities", "inverse per entity", "cached in store", "speedup"], rows)
+
+
+if __name__ == '__main__':
+    main()
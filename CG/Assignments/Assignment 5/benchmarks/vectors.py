@@ -0,0 +1,194 @@
+"""
+Times the vector operations used every frame (arithmetic, normalization, component and
+swizzle access) with the previous list-backed Vector3D vs the current __slots__ one,
+then bulk operations on many vectors done one Vector3D at a time vs with a Vector3DArray.
+Runs without an OpenGL context.
+
+Run from the assignment folder with:
+    python -m benchmarks.vectors
+"""
+import math
+import random
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table
+from oven_engine_3D.utils.bezier import BezierCurve, BezierPoint
+from oven_engine_3D.utils.geometry import Vector2D, Vector3D, Vector3DArray
+
+ITERATIONS = 100000
+BULK_COUNT = 10000
+BULK_REPEATS = 5
+
+
+class LegacyVector3D:
+    """
+    The hot paths of the previous Vector3D: components kept in a list next to x, y, z,
+    operators going through lists, and a __getattribute__ hook checking every access for swizzles
+    """
+    def __init__(self, x, y=None, z=None):
+        if y is None:
+            y = x
+        if z is None:
+            z = x
+
+        self.x, self.y, self.z = x, y, z
+        self.components = [x, y, z]
+        self.components_count = 3
+
+    def __getattribute__(self, item):
+        if len(item) in [2, 3]:
+            comps = {
+                "x": object.__getattribute__(self, "x"),
+                "y": object.__getattribute__(self, "y"),
+                "z": object.__getattribute__(self, "z"),
+                "0": 0.,
+            }
+
+            if all(c in comps for c in item):
+                if len(item) == 2:
+                    return Vector2D(comps[item[0]], comps[item[1]])
+                return LegacyVector3D(comps[item[0]], comps[item[1]], comps[item[2]])
+
+        return object.__getattribute__(self, item)
+
+    @staticmethod
+    def from_values(values):
+        return LegacyVector3D(values[0], values[1], values[2])
+
+    def __add__(self, other):
+        if type(other) in [int, float]:
+            return self.from_values([c + other for c in self.components])
+
+        if type(other) == type(self):
+            return self.from_values([c1 + c2 for c1, c2 in zip(self.components, other.components)])
+
+        return self
+
+    def __sub__(self, other):
+        return self + (other * -1.)
+
+    def __mul__(self, other):
+        if type(other) in [int, float]:
+            return self.from_values([c * other for c in self.components])
+
+        if type(other) == type(self):
+            return self.from_values([c1 * c2 for c1, c2 in zip(self.components, other.components)])
+
+        return self
+
+    @property
+    def length_sq(self):
+        return sum([c**2 for c in self.components])
+
+    @property
+    def length(self):
+        return math.sqrt(self.length_sq)
+
+    @property
+    def normalized(self):
+        l = self.length
+        if l == 0.:
+            return self
+
+        return self * (1. / l)
+
+    def dot(self, other):
+        return sum([c1 * c2 for c1, c2 in zip(self.components, other.components)])
+
+    def cross(self, other):
+        return LegacyVector3D(self.y * other.z - self.z * other.y,
+                              self.z * other.x - self.x * other.z,
+                              self.x * other.y - self.y * other.x)
+
+
+def timed(f, a, b):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        f(a, b)
+
+    return (time.perf_counter() - start) * 1e9 / ITERATIONS
+
+
+OPERATIONS = [
+    ("add", lambda a, b: a + b),
+    ("sub", lambda a, b: a - b),
+    ("scale", lambda a, b: a * 2.),
+    ("dot", lambda a, b: a.dot(b)),
+    ("cross", lambda a, b: a.cross(b)),
+    ("normalized", lambda a, b: a.normalized),
+    ("read x, y, z", lambda a, b: a.x + a.y + a.z),
+    ("swizzle xz", lambda a, b: a.xz),
+    ("swizzle x0z", lambda a, b: a.x0z),
+    ("move (a + b * dt)", lambda a, b: a + b * .016),
+]
+
+
+BULK_OPERATIONS = [
+    ("normalized", lambda vs, ws: [v.normalized for v in vs], lambda a, b: a.normalized),
+    ("dot", lambda vs, ws: [v.dot(w) for v, w in zip(vs, ws)], lambda a, b: a.dot(b)),
+    ("cross", lambda vs, ws: [v.cross(w) for v, w in zip(vs, ws)], lambda a, b: a.cross(b)),
+    ("rotate", lambda vs, ws: [v.rotate(Vector3D.UP, .5) for v in vs], lambda a, b: a.rotate(Vector3D.UP, .5)),
+    ("distance_sq_to", lambda vs, ws: [v.distance_sq_to(w) for v, w in zip(vs, ws)],
+     lambda a, b: a.distance_sq_to(b)),
+    ("lin_interpolate", lambda vs, ws: [v.lin_interpolate(w, .25) for v, w in zip(vs, ws)],
+     lambda a, b: a.lin_interpolate(b, .25)),
+    ("project_on_plane", lambda vs, ws: [v.project_on_plane(Vector3D.UP) for v in vs],
+     lambda a, b: a.project_on_plane(Vector3D.UP)),
+]
+
+
+def timed_bulk(f, a, b):
+    start = time.perf_counter()
+    for _ in range(BULK_REPEATS):
+        f(a, b)
+
+    return (time.perf_counter() - start) * 1000. / BULK_REPEATS
+
+
+def bezier_samples(curve, ts):
+    return [curve.interpolate_segment(0, t) for t in ts]
+
+
+def bulk_rows():
+    random.seed(0)
+    vs = [Vector3D(*[random.uniform(-10., 10.) for _ in range(3)]) for _ in range(BULK_COUNT)]
+    ws = [Vector3D(*[random.uniform(-10., 10.) for _ in range(3)]) for _ in range(BULK_COUNT)]
+    a, b = Vector3DArray.from_vectors(vs), Vector3DArray.from_vectors(ws)
+
+    rows = []
+    for name, per_vector, array in BULK_OPERATIONS:
+        before = timed_bulk(per_vector, vs, ws)
+        after = timed_bulk(array, a, b)
+        rows.append([name, f"{before:.3f}", f"{after:.3f}", f"{before / after:.1f}x"])
+
+    curve = BezierCurve([BezierPoint(Vector3D(0.), Vector3D.UP), BezierPoint(Vector3D(5., 0., 5.), Vector3D.LEFT)])
+    ts = np.linspace(.0001, .9999, BULK_COUNT)
+    before = timed_bulk(bezier_samples, curve, ts)
+    after = timed_bulk(lambda c, t: c.sample_segment(0, t), curve, ts)
+    rows.append(["bezier sampling", f"{before:.3f}", f"{after:.3f}", f"{before / after:.1f}x"])
+
+    return rows
+
+
+def main():
+    legacy = LegacyVector3D(1., 2., 3.), LegacyVector3D(4., 5., 6.)
+    current = Vector3D(1., 2., 3.), Vector3D(4., 5., 6.)
+
+    rows = []
+    for name, op in OPERATIONS:
+        before = timed(op, *legacy)
+        after = timed(op, *current)
+        rows.append([name, f"{before:.0f}", f"{after:.0f}", f"{before / after:.1f}x"])
+
+    print()
+    print_table(["operation", "legacy ns", "slots ns", "speedup"], rows)
+
+    print()
+    print(f"{BULK_COUNT} vectors")
+    print_table(["operation", "Vector3D ms", "Vector3DArray ms", "speedup"], bulk_rows())
+
+
+if __name__ == '__main__':
+    main()
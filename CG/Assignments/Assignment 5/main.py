@@ -81,7 +81,7 @@ class Assignment5(BaseApp3D):
 
         spec_light = self.add_light(origin=tmp + Vector3D(1.5, 0., -2.), radius=3., intensity=15., diffuse="green")
         light_cube_mat = MeshShader(unshaded=True, diffuse_color = "green")
-        self.add_entity(Cube(self, origin=spec_light.origin, scale=.1, shader=light_cube_mat))
+        self.add_entity(Cube(self, parent=spec_light, scale=.1, shader=light_cube_mat))
         ##############################
 
         ####### CUSTOM SHADERS
@@ -111,9 +111,9 @@ class Assignment5(BaseApp3D):
         self.add_entity(DrawnEntity(self, mesh="res/models/monke.obj", origin=tmp, rotation=Vector3D.UP*math.tau/4.))
         self.add_entity(Cube(self, origin = tmp + Vector3D.DOWN * 2., scale=Vector3D(3., .2, 3.), color="gray"))
         self.add_light(origin=tmp + Vector3D.BACKWARD * 1.5, diffuse="red", radius=3., intensity=20.)
-        self.add_entity(Cube(self, origin=self.lights[-1].origin, scale=.1, shader=light_cube_mat.variation(diffuse_color="red")))
+        self.add_entity(Cube(self, parent=self.lights[-1], scale=.1, shader=light_cube_mat.variation(diffuse_color="red")))
         self.add_light(origin=tmp - Vector3D.BACKWARD * 1.5, diffuse="cyan", radius=3., intensity=20.)
-        self.add_entity(Cube(self, origin=self.lights[-1].origin, scale=.1, shader=light_cube_mat.variation(diffuse_color="cyan")))
+        self.add_entity(Cube(self, parent=self.lights[-1], scale=.1, shader=light_cube_mat.variation(diffuse_color="cyan")))
         ##############################
 
         ###### BEZIER
@@ -3,14 +3,22 @@ from enum import Enum
 
 from pygame.locals import *
 
+from oven_engine_3D.deferred import DeferredRenderer
 from oven_engine_3D.environment import Environment
 from oven_engine_3D.light import Light
+from oven_engine_3D.light_clusters import LightClusters
+from oven_engine_3D.render_queue import RenderQueue
+from oven_engine_3D.spatial import LooseOctree
+from oven_engine_3D.transforms import TransformStore
 
 ctypes.windll.user32.SetProcessDPIAware()
 
 from oven_engine_3D.camera import *
 from oven_engine_3D.entities import DrawnEntity
 from oven_engine_3D.shaders import *
+from oven_engine_3D.shaders.program_cache import ProgramCache
+from oven_engine_3D.shaders.uniform_blocks import FrameUniforms
+from oven_engine_3D.utils.gl_state import GLState
 from oven_engine_3D.utils.geometry import Vector2D
 
 
@@ -20,6 +28,11 @@ class BaseApp3D(ABC):
         CLEAR_COLOR = 1
         SKYBOX = 2
 
+    class RenderMode(Enum):
+        FORWARD = 0
+        # Opaque entities shaded through a G-buffer, transparent ones still drawn forward
+        DEFERRED = 1
+
     def __init__(self,
                  win_title   = "BaseApp",
                  win_size    = Vector2D.ZERO,
@@ -30,6 +43,9 @@ class BaseApp3D(ABC):
                  sky_textures = None,
                  environment : Environment = None,
                  glob_ambient_mode = GlobalAmbientMode.CLEAR_COLOR,
+                 instancing = True,
+                 sort_draws = True,
+                 render_mode = RenderMode.FORWARD,
                  ):
 
         pg.init()
@@ -39,6 +55,11 @@ class BaseApp3D(ABC):
             flags |= pg.FULLSCREEN
             win_size *= 0.
 
+        if render_mode == BaseApp3D.RenderMode.DEFERRED:
+            # SDL defaults to a 16 bit depth buffer, the G-buffer's depth gets copied into it with a matching format
+            pg.display.gl_set_attribute(pg.GL_DEPTH_SIZE, 24)
+            pg.display.gl_set_attribute(pg.GL_STENCIL_SIZE, 8)
+
         screen = pg.display.set_mode(tuple(win_size), flags)
         self.win_size = Vector2D(screen.get_size())
 
@@ -53,6 +74,7 @@ class BaseApp3D(ABC):
         self.light = None
         self.lights = []
         self.face_culling = face_culling
+        self.instancing = instancing
         self.glob_ambient_mode = glob_ambient_mode
 
         self.clock = pg.time.Clock()
@@ -75,15 +97,26 @@ class BaseApp3D(ABC):
         self.target_fps = 60.
 
         self.environment = environment if environment is not None else Environment(clear_color = clear_color)
+        # Every shader compiled from now on is specialized for the environment's fog and tonemapping
+        BaseShader.global_defines.update(self.environment.shader_defines)
 
         if sky_textures is not None and type(sky_textures) is dict:
             self.environment.generate_skybox(self, sky_textures)
 
         glClearColor(*self.environment.clear_color.normalize())
 
+        self.frame_uniforms = FrameUniforms()
+        self.light_clusters = LightClusters()
+        self.render_queue = RenderQueue(instancing=instancing, sort=sort_draws)
+
+        self.render_mode = render_mode
+        self.deferred = DeferredRenderer(self.win_size) if render_mode == BaseApp3D.RenderMode.DEFERRED else None
+
         self.entities = []
         self.opaque = []
         self.transparent = []
+        # Drawn entities, for culling and scene queries
+        self.spatial_index = LooseOctree()
 
     @property
     def skybox(self):
@@ -94,13 +127,30 @@ class BaseApp3D(ABC):
         self.entities.append(ent)
 
         if isinstance(ent, DrawnEntity):
-            if ent.shader.transparent:
+            if ent.transparent:
                 self.transparent.append(ent)
             else:
                 self.opaque.append(ent)
 
+            # Bounds come from the world matrices, which must be up to date
+            TransformStore.update()
+            self.spatial_index.insert(ent)
+            ent.spatial_index = self.spatial_index
+
         return ent
 
+    def remove_entity(self, ent: Entity):
+        for lst in [self.entities, self.opaque, self.transparent]:
+            if ent in lst:
+                lst.remove(ent)
+
+        if isinstance(ent, DrawnEntity):
+            self.spatial_index.remove(ent)
+            ent.spatial_index = None
+
+        ent.release()
+        ent.parent_app = None
+
     def add_light(self, **kwargs):
         light = kwargs["light"] if "light" in kwargs.keys() else Light(parent_app=self, **kwargs)
 
@@ -117,36 +167,57 @@ class BaseApp3D(ABC):
         for ent in self.entities:
             ent.update(delta)
 
+        # All the model matrices that changed this frame in one go
+        changed = TransformStore.update()
+
+        # Only the entities that actually moved (themselves or through a parent) are re-indexed
+        for idx in changed:
+            ent = TransformStore.owners[idx]
+            if ent is not None and ent.spatial_index is not None:
+                ent.spatial_index.update(ent)
+
     @abstractmethod
     def update(self, delta):
         pass
 
     def _display(self):
-        glEnable(GL_DEPTH_TEST)
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        GLState.new_frame()
 
+        GLState.set_enabled(GL_DEPTH_TEST, True)
+        GLState.set_enabled(GL_BLEND, True)
+        GLState.blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+        GLState.set_enabled(GL_CULL_FACE, self.face_culling)
         if self.face_culling:
-            glEnable(GL_CULL_FACE)
-            glFrontFace(GL_CW)
-            glCullFace(GL_BACK)
-        else:
-            glDisable(GL_CULL_FACE)
+            GLState.front_face(GL_CW)
+            GLState.cull_face(GL_BACK)
 
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
         self.display()
 
-        for ent in self.opaque:
-            ent.draw()
+        # Lights are binned in the clusters of the camera's frustum before the frame block describes the grid
+        self.light_clusters.build(self.camera, self.lights)
+        self.light_clusters.upload()
+        self.frame_uniforms.update(self)
+
+        self.camera.update_frustum()
+
+        # Coarse culling against the index first, the queue then tests the survivors' actual bounds
+        self.render_queue.clear()
+        self.render_queue.add_entities(self.spatial_index.query_frustum(self.camera.frustum_planes), self.camera)
+        self.render_queue.build(self.camera.origin)
+
+        if self.deferred is not None:
+            self.deferred.draw_opaque(self.render_queue, self)
+        else:
+            self.render_queue.draw_pass(RenderQueue.OPAQUE_PASS)
 
         if self.skybox is not None:
             self.skybox.draw()
 
-        # Sort transparent entities by distance to camera
-        self.transparent.sort(key=lambda e: (e.origin - self.camera.origin).length_sq, reverse=True)
-        for ent in self.transparent:
-            ent.draw()
+        # Transparent draws come out of the queue sorted back to front
+        self.render_queue.draw_pass(RenderQueue.TRANSPARENT_PASS)
 
         pg.display.flip()
 
@@ -155,6 +226,8 @@ class BaseApp3D(ABC):
         pass
 
     def run(self):
+        # Everything created so far, cold (compiled) vs warm (loaded from the previous runs' binaries)
+        print(ProgramCache.report())
 
         print("######################### STARTING\n\n")
 
@@ -166,6 +239,9 @@ class BaseApp3D(ABC):
                 self._update()
                 self._display()
 
+        # Only drops the binaries no run loaded for a long time, the others may belong to other apps or drivers
+        ProgramCache.prune()
+
         pg.quit()
 
     def _handle_events(self):
@@ -216,6 +292,25 @@ class BaseApp3D(ABC):
     def get_mouse_pos(self):
         return Vector2D(pg.mouse.get_pos()) / self.win_size - Vector2D(0.5, 0.5)
 
+    def entities_in_radius(self, center: Vector3D, radius: float):
+        """
+        Drawn entities whose bounds are within radius of center
+        """
+        return self.spatial_index.query_sphere(center, radius)
+
+    def pick(self, origin: Vector3D, direction: Vector3D, max_distance=math.inf):
+        """
+        First drawn entity hit by a ray (tested against bounding spheres), None if there's none
+        """
+        return self.spatial_index.pick(origin, direction, max_distance)
+
+    @property
+    def gl_stats(self):
+        """
+        GL state changes issued and avoided during the last frame
+        """
+        return GLState.stats()
+
     @property
     def light_count(self):
         return len(self.lights)
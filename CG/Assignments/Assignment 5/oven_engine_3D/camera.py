@@ -4,7 +4,7 @@ import numpy as np
 import pygame as pg
 
 from oven_engine_3D.entities import Entity
-from oven_engine_3D.utils.geometry import Vector3D
+from oven_engine_3D.utils.geometry import Vector3D, Quaternion
 from oven_engine_3D.utils.matrices import ProjectionMatrix, ViewMatrix
 
 
@@ -17,10 +17,15 @@ class Camera(Entity):
 
         self.projection_matrix = ProjectionMatrix.perspective(fov, ratio, near=near, far=far)
         self.view_matrix = ViewMatrix()
+        # (6, 4) world space planes (left, right, bottom, top, near, far), normals pointing inside
+        self.frustum_planes = np.zeros((6, 4))
+        # Projection and view matrices, and their versions, the frustum planes were extracted from
+        self.__frustum_versions = None
 
-        look_at = eye + look_at if local_look_at else self.to_global(look_at)
+        look_at = self.to_global(look_at) if local_look_at else look_at
 
         self.look_at(look_at, up_vec)
+        self.update_frustum()
 
     def _update(self, delta):
         pass
@@ -34,6 +39,50 @@ class Camera(Entity):
 
         self.view_matrix.look_at(self.origin, target, up)
 
+    def update_frustum(self):
+        """
+        Extracts the frustum planes from the current projection and view matrices, if they changed
+        """
+        versions = (self.projection_matrix, self.projection_matrix.version,
+                    self.view_matrix, self.view_matrix.version)
+        if versions == self.__frustum_versions:
+            return
+        self.__frustum_versions = versions
+
+        clip = self.projection_matrix.values @ self.view_matrix.values
+
+        planes = np.stack([
+            clip[3] + clip[0],
+            clip[3] - clip[0],
+            clip[3] + clip[1],
+            clip[3] - clip[1],
+            clip[3] + clip[2],
+            clip[3] - clip[2],
+        ])
+
+        self.frustum_planes = planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+    def visible(self, centers, radii, extents=None):
+        """
+        Tests bounding volumes against the frustum all at once
+        :param centers: (N, 3) world space centers
+        :param radii: (N,) bounding sphere radii
+        :param extents: (N, 3) AABB half extents, to refine the spheres that pass
+        :return: (N,) bool mask of the volumes at least partially inside the frustum
+        """
+        normals = self.frustum_planes[:, :3]
+        # (N, 6) signed distances of the centers to each plane
+        dist = centers @ normals.T + self.frustum_planes[:, 3]
+
+        inside = np.all(dist >= -radii[:, None], axis=1)
+
+        if extents is not None:
+            # Largest extent of each box along each plane normal
+            reach = extents @ np.abs(normals).T
+            inside &= np.all(dist >= -reach, axis=1)
+
+        return inside
+
     def slide(self, offset):
         self.view_matrix.slide(*offset)
 
@@ -160,6 +209,12 @@ class FPCamera(Camera):
 
         return self
 
+    def look_at(self, target, up=Vector3D.UP, new_origin = None):
+        super().look_at(target, up, new_origin)
+        # The camera's rotation is kept as the entity's quaternion (taking the world axes to the view's u, v, n),
+        # and copied to the view matrix whenever it changes
+        self.orientation = self.view_matrix.orientation
+
     def move(self, delta):
         slide_dir = Vector3D.ZERO
         for key, _dir in self.slide_keys.items():
@@ -185,7 +240,9 @@ class FPCamera(Camera):
 
         angle = m_delta.y * self.sensitivity * delta
 
-        self.view_matrix.rotate_x(angle)
+        # Around the camera's own x axis, same as view_matrix.rotate_x(angle)
+        self.orientation = (self.orientation * Quaternion.from_axis_angle(Vector3D.RIGHT, -angle)).normalized
+        self.view_matrix.orientation = self.orientation
 
     def turn(self, delta):
         m_delta = self.parent_app.mouse_delta
@@ -194,7 +251,9 @@ class FPCamera(Camera):
 
         angle = -m_delta.x * delta * self.sensitivity
 
-        self.view_matrix.rotate_global_y(angle)
+        # Around the world's y axis
+        self.orientation = (Quaternion.from_axis_angle(Vector3D.UP, angle) * self.orientation).normalized
+        self.view_matrix.orientation = self.orientation
         self.y_rot += angle
 
     def handle_event(self, event):
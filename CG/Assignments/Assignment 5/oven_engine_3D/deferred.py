@@ -0,0 +1,132 @@
+from OpenGL.GL import *
+
+from oven_engine_3D.render_queue import RenderQueue
+from oven_engine_3D.shaders.deferred_shader import DeferredLightShader
+from oven_engine_3D.utils.gl_state import GLState
+
+
+class GBuffer:
+    """
+    Framebuffer the opaque geometry is drawn into by the deferred path: one texture per surface attribute
+    the light pass needs (see gbuffer.frag), plus depth
+    """
+    # name -> internal format, in the order of gbuffer.frag's outputs
+    TARGETS = {
+        "albedo": GL_RGBA16F,
+        "position": GL_RGBA32F,
+        "normal": GL_RGBA16F,
+        "specular": GL_RGBA16F,
+        "ambient": GL_RGBA16F,
+    }
+    # Texture unit of the first target, past those of the materials and of LightClusters
+    FIRST_UNIT = 7
+    # (depth bits, stencil bits) of the default framebuffer -> (matching internal format, attachment)
+    DEPTH_FORMATS = {
+        (16, 0): (GL_DEPTH_COMPONENT16, GL_DEPTH_ATTACHMENT),
+        (24, 0): (GL_DEPTH_COMPONENT24, GL_DEPTH_ATTACHMENT),
+        (32, 0): (GL_DEPTH_COMPONENT32, GL_DEPTH_ATTACHMENT),
+        (24, 8): (GL_DEPTH24_STENCIL8, GL_DEPTH_STENCIL_ATTACHMENT),
+        (32, 8): (GL_DEPTH32F_STENCIL8, GL_DEPTH_STENCIL_ATTACHMENT),
+    }
+
+    def __init__(self, size):
+        self.size = int(size[0]), int(size[1])
+
+        depth_format, depth_attachment = GBuffer.default_depth_format()
+
+        self.fbo = glGenFramebuffers(1)
+        GLState.bind_framebuffer(GL_FRAMEBUFFER, self.fbo)
+
+        # name -> (texture unit, texture id)
+        self.textures = {}
+        for idx, (name, internal_format) in enumerate(GBuffer.TARGETS.items()):
+            unit = GBuffer.FIRST_UNIT + idx
+            texture_id = glGenTextures(1)
+
+            GLState.bind_texture(GL_TEXTURE_2D, texture_id, unit=unit)
+            glTexImage2D(GL_TEXTURE_2D, 0, internal_format, *self.size, 0, GL_RGBA, GL_FLOAT, None)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0 + idx, GL_TEXTURE_2D, texture_id, 0)
+
+            self.textures[name] = (unit, texture_id)
+
+        # Same format as the default framebuffer's depth, so that it can be copied there
+        self.depth = glGenRenderbuffers(1)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth)
+        glRenderbufferStorage(GL_RENDERBUFFER, depth_format, *self.size)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, depth_attachment, GL_RENDERBUFFER, self.depth)
+
+        glDrawBuffers(len(GBuffer.TARGETS), [GL_COLOR_ATTACHMENT0 + idx for idx in range(len(GBuffer.TARGETS))])
+
+        assert glCheckFramebufferStatus(GL_FRAMEBUFFER) == GL_FRAMEBUFFER_COMPLETE, "Incomplete G-buffer"
+
+        GLState.bind_framebuffer(GL_FRAMEBUFFER, 0)
+
+    @staticmethod
+    def default_depth_format():
+        """
+        :return: (internal format, attachment) of a depth buffer with the same format as the default framebuffer's,
+        glBlitFramebuffer refuses to copy depth between different formats
+        """
+        GLState.bind_framebuffer(GL_FRAMEBUFFER, 0)
+
+        bits = (GBuffer.__default_bits(GL_DEPTH, GL_FRAMEBUFFER_ATTACHMENT_DEPTH_SIZE),
+                GBuffer.__default_bits(GL_STENCIL, GL_FRAMEBUFFER_ATTACHMENT_STENCIL_SIZE))
+
+        assert bits in GBuffer.DEPTH_FORMATS, f"No G-buffer depth format matching the window's (depth, stencil) {bits}"
+
+        return GBuffer.DEPTH_FORMATS[bits]
+
+    @staticmethod
+    def __default_bits(attachment, size_name):
+        # Missing buffers can only be queried for their type
+        if glGetFramebufferAttachmentParameteriv(GL_FRAMEBUFFER, attachment,
+                                                 GL_FRAMEBUFFER_ATTACHMENT_OBJECT_TYPE) == GL_NONE:
+            return 0
+
+        return int(glGetFramebufferAttachmentParameteriv(GL_FRAMEBUFFER, attachment, size_name))
+
+    def begin(self):
+        GLState.bind_framebuffer(GL_FRAMEBUFFER, self.fbo)
+        # The alpha channels hold attributes, not opacity
+        GLState.set_enabled(GL_BLEND, False)
+
+        # Zeroes everywhere, a position with w = 0 marks the pixels nothing was drawn on
+        for idx in range(len(GBuffer.TARGETS)):
+            glClearBufferfv(GL_COLOR, idx, (0., 0., 0., 0.))
+        glClear(GL_DEPTH_BUFFER_BIT)
+
+    def end(self):
+        # The depth goes to the default framebuffer, for what's drawn forward afterwards
+        GLState.bind_framebuffer(GL_DRAW_FRAMEBUFFER, 0)
+        glBlitFramebuffer(0, 0, *self.size, 0, 0, *self.size, GL_DEPTH_BUFFER_BIT, GL_NEAREST)
+
+        GLState.bind_framebuffer(GL_FRAMEBUFFER, 0)
+        GLState.set_enabled(GL_BLEND, True)
+
+
+class DeferredRenderer:
+    """
+    Deferred path for the opaque draws: they're written into a G-buffer, then shaded at once by a single light
+    pass going through the clustered lights, so that each light is only evaluated for the visible surfaces.
+    Draws without a G-buffer shader (custom draws, other shaders) are drawn forward after the light pass.
+    """
+    def __init__(self, size):
+        self.gbuffer = GBuffer(size)
+        self.light_shader = DeferredLightShader(self.gbuffer)
+
+    def draw_opaque(self, queue: RenderQueue, app):
+        """
+        Draws the opaque pass of the queue, build() must have been called first
+        """
+        self.gbuffer.begin()
+        queue.draw_pass(RenderQueue.OPAQUE_PASS, deferred=True)
+        self.gbuffer.end()
+
+        # The light pass covers the screen once, nothing to test it against
+        GLState.set_enabled(GL_DEPTH_TEST, False)
+        self.light_shader.draw(app=app)
+        GLState.set_enabled(GL_DEPTH_TEST, True)
+
+        queue.draw_pass(RenderQueue.OPAQUE_PASS, deferred=False)
@@ -1,51 +1,151 @@
 from abc import abstractmethod, ABC
 
+import numpy as np
 import shortuuid
 from OpenGL.GL import *
 
-from oven_engine_3D.meshes import CubeMesh, PlaneMesh, Mesh, OBJMesh, SphereMesh
+from oven_engine_3D.meshes import CubeMesh, PlaneMesh, Mesh, OBJMesh, SphereMesh, MeshRegistry
 from oven_engine_3D.shaders.mesh_shader import MeshShader
 from oven_engine_3D.shaders.skybox_shader import SkyboxShader
-from oven_engine_3D.utils.geometry import Vector3D, euler_from_vectors
-from oven_engine_3D.utils.matrices import ModelMatrix
+from oven_engine_3D.transforms import TransformStore, StoredModelMatrix
+from oven_engine_3D.utils.geometry import Vector3D, Quaternion, euler_from_vectors
+from oven_engine_3D.utils.gl_state import GLState
 from oven_engine_3D.utils.textures import TexturesManager
 
 
 class Entity(ABC):
-    def __init__(self, parent_app, origin=Vector3D.ZERO, rotation=Vector3D.ZERO, scale=Vector3D.ONE, _name="", to_follow : "Entity" = None, **kwargs):
-        self.origin = origin
-        self.rotation = rotation
-        self.scale = scale
-        self.model_matrix = ModelMatrix.from_transformations(origin, rotation, scale)
+    def __init__(self, parent_app, origin=Vector3D.ZERO, rotation=Vector3D.ZERO, scale=Vector3D.ONE, _name="", parent : "Entity" = None, **kwargs):
+        """
+        :param parent: entity this one is attached to, origin/rotation/scale are then relative to it
+        """
+        # Spatial index the entity is registered in, told whenever the entity moves or changes size
+        self.spatial_index = None
+
+        # The transform itself lives in the TransformStore, origin/rotation/scale are kept here as vectors too
+        self.transform_index = TransformStore.allocate(origin, rotation, scale, owner=self)
+        self._origin = origin
+        # Euler angles, None when the rotation was last set as a quaternion (then derived from it when needed)
+        self._rotation = rotation if type(rotation) is Vector3D else None
+        self._scale = scale
+        self.model_matrix = StoredModelMatrix(self.transform_index)
         self.name = shortuuid.uuid() if _name == "" else _name
         self.parent_app = parent_app
-        self.to_follow = to_follow
-        self.initial_follow_delta = None
-        if to_follow is not None:
-            self.initial_follow_delta = self.origin - to_follow.origin
 
-    def update(self, delta):
-        if self.to_follow is not None:
-            self.translate_to(self.to_follow.origin + self.initial_follow_delta)
+        self.parent = None
+        self.children = []
+        if parent is not None:
+            self.set_parent(parent)
+
+    @property
+    def origin(self):
+        return self._origin
+
+    @origin.setter
+    def origin(self, value):
+        self._origin = value
+        TransformStore.set_origin(self.transform_index, value)
+
+    @property
+    def rotation(self):
+        if self._rotation is None:
+            self._rotation = self.orientation.to_euler()
+
+        return self._rotation
+
+    @rotation.setter
+    def rotation(self, value: [Vector3D|Quaternion]):
+        self._rotation = value if type(value) is Vector3D else None
+        TransformStore.set_rotation(self.transform_index, value)
+
+    @property
+    def orientation(self):
+        """
+        Rotation as a quaternion, relative to the parent if there's one
+        """
+        return TransformStore.orientation(self.transform_index)
 
-        self.model_matrix.load_identity()
-        self.model_matrix.add_translation(self.origin)
-        self.model_matrix.add_rotation(self.rotation)
-        self.model_matrix.add_scale(self.scale)
+    @orientation.setter
+    def orientation(self, value: Quaternion):
+        self.rotation = value
 
+    @property
+    def scale(self):
+        return self._scale
+
+    @scale.setter
+    def scale(self, value):
+        self._scale = value
+        TransformStore.set_scale(self.transform_index, value)
+
+    @property
+    def world_origin(self):
+        """
+        Position in world space, as of the last TransformStore.update()
+        """
+        return TransformStore.world_origin(self.transform_index)
+
+    @property
+    def transform_dirty(self):
+        """
+        Whether the model matrix is out of date with origin/rotation/scale
+        """
+        return TransformStore.is_dirty(self.transform_index)
+
+    def set_parent(self, parent: "Entity" = None):
+        """
+        Attaches the entity to another one (or detaches it with None), its origin/rotation/scale
+        are kept as they are and become relative to the new parent
+        """
+        ancestor = parent
+        while ancestor is not None:
+            assert ancestor is not self, "An entity can't be its own ancestor"
+            ancestor = ancestor.parent
+
+        if self.parent is not None:
+            self.parent.children.remove(self)
+
+        self.parent = parent
+        if parent is not None:
+            parent.children.append(self)
+
+        TransformStore.set_parent(self.transform_index, parent.transform_index if parent is not None else -1)
+        return self
+
+    def update(self, delta):
+        # Model matrices are all rebuilt at once by TransformStore.update(), after every entity is updated
         self._update(delta)
 
+    def update_model_matrix(self):
+        """
+        Rebuilds the model matrices right away if the transform changed
+        """
+        if self.transform_dirty:
+            TransformStore.update()
+
+    def release(self):
+        """
+        Gives back the entity's slot in the TransformStore, the entity can't be used anymore afterwards.
+        Its children are detached.
+        """
+        for child in list(self.children):
+            child.set_parent(None)
+        if self.parent is not None:
+            self.parent.children.remove(self)
+            self.parent = None
+
+        TransformStore.free(self.transform_index)
+
     @property
     def forward(self):
-        return self.to_global(Vector3D.FORWARD).normalized
+        return self.model_matrix.transform_direction(Vector3D.FORWARD).normalized
 
     @property
     def right(self):
-        return self.to_global(Vector3D.RIGHT).normalized
+        return self.model_matrix.transform_direction(Vector3D.RIGHT).normalized
 
     @property
     def up(self):
-        return self.to_global(Vector3D.UP).normalized
+        return self.model_matrix.transform_direction(Vector3D.UP).normalized
 
     def translate_to(self, position: Vector3D):
         self.origin = position
@@ -66,17 +166,34 @@ class Entity(ABC):
         # self.model_matrix.add_rotation(angle * axis)
         return self
 
+    def turn(self, angle, axis=Vector3D.UP):
+        """
+        Rotates around one of the entity's own axes, composing quaternions
+        (unlike rotate, which adds to the Euler angles)
+        """
+        self.orientation = (self.orientation * Quaternion.from_axis_angle(axis, angle)).normalized
+        return self
+
     def look_at(self, target: Vector3D, up=Vector3D.UP):
-        #self.rotation = Vector3D(*euler_from_vectors(target - self.origin, up))
-        self.model_matrix.look_at(target, up)
+        """
+        Points the entity's forward (z) axis at the target, given in the same space as its origin
+        """
+        self.orientation = Quaternion.look_rotation(target - self.origin, up)
         return self
 
     def to_global(self, local_pos: Vector3D):
-        return self.model_matrix * local_pos
-
-    # TODO: Requires computing inverse of model matrix...
-    """def to_local(self, global_pos: Vector3D):
-        return self.model_matrix.inverse() * global_pos"""
+        """
+        World space position of a point given in the entity's space
+        """
+        self.update_model_matrix()
+        return self.model_matrix.transform_point(local_pos)
+
+    def to_local(self, global_pos: Vector3D):
+        """
+        Position in the entity's space of a world space point, through the model matrix's cached inverse
+        """
+        self.update_model_matrix()
+        return self.model_matrix.inverse_transform_point(global_pos)
 
     @abstractmethod
     def _update(self, delta):
@@ -92,22 +209,98 @@ class DrawnEntity(Entity):
     def __init__(self, parent_app, mesh: [str|Mesh], cull_distance=0., color="white", shader=None, **kwargs):
         super().__init__(parent_app, **kwargs)
 
-        if shader is None:
-            shader = MeshShader(material_params={"diffuse_color" : color})
-
-        self.cull_distance = abs(cull_distance)
-        self.shader = shader
-
         if type(mesh) is str:
             mesh = OBJMesh.load(mesh)
 
         self.mesh = mesh
 
+        # Without an explicit shader, meshes with materials of their own (e.g. from an .mtl) use one shader per submesh
+        if shader is not None:
+            self.shaders = [shader]
+        elif isinstance(mesh, OBJMesh) and mesh.has_materials:
+            self.shaders = mesh.material_shaders()
+        else:
+            self.shaders = [MeshShader(material_params={"diffuse_color" : color})]
+
+        self.cull_distance = abs(cull_distance)
+        self.shader = self.shaders[0]
+
+    @property
+    def transparent(self):
+        return any(s.transparent for s in self.shaders)
+
+    @property
+    def bounding_sphere(self):
+        """
+        Sphere around the entity's world origin enclosing its mesh whatever its rotation
+        """
+        # Largest scale of the world transform, parents included
+        scale = float(np.linalg.norm(self.model_matrix.values[:3, :3], axis=0).max())
+        radius = (float(np.linalg.norm(self.mesh.bounding_center)) + self.mesh.bounding_radius) * scale
+
+        return self.world_origin, radius
+
+    def release(self):
+        """
+        Gives back the entity's mesh if it came from the MeshRegistry
+        """
+        super().release()
+        MeshRegistry.release(self.mesh)
+
+    @property
+    def instanceable(self):
+        """
+        Whether the entity can be drawn together with others sharing its mesh and shader
+        """
+        return len(self.shaders) == 1 and self.shader.supports_instancing and type(self).draw is DrawnEntity.draw
+
+    def is_culled(self):
+        return 0. < self.cull_distance**2 < self.parent_app.camera.origin.distance_sq_to(self.world_origin)
+
+    @staticmethod
+    def world_bounds(entities: list["DrawnEntity"]):
+        """
+        Bounding volumes of the entities' meshes moved to world space by their model matrices, all at once
+        :return: (N, 3) centers, (N,) bounding sphere radii, (N, 3) AABB half extents
+        """
+        matrices = TransformStore.matrices[[e.transform_index for e in entities]]
+        linear = matrices[:, :3, :3]
+
+        local_centers = np.stack([e.mesh.bounding_center for e in entities])
+        local_extents = np.stack([e.mesh.bounding_extents for e in entities])
+        local_radii = np.array([e.mesh.bounding_radius for e in entities])
+
+        centers = np.einsum("nij,nj->ni", linear, local_centers) + matrices[:, :3, 3]
+        # Extents of the box enclosing the transformed box
+        extents = np.einsum("nij,nj->ni", np.abs(linear), local_extents)
+        # Spheres grow with the largest scale axis
+        radii = local_radii * np.linalg.norm(linear, axis=1).max(axis=1)
+
+        return centers, radii, extents
+
+    @staticmethod
+    def draw_instanced(entities: list["DrawnEntity"], shader=None):
+        """
+        Draws all entities with one instanced call, they must all share the same mesh and shader
+        :param shader: shader to draw with instead of theirs
+        """
+        first = entities[0]
+        instances = TransformStore.instance_data([e.transform_index for e in entities])
+        shader = first.shader if shader is None else shader
+
+        shader.draw(app=first.parent_app, mesh=first.mesh, instances=instances)
+
     def draw(self):
-        if 0. < self.cull_distance**2 < self.parent_app.camera.origin.distance_sq_to(self.origin):
+        if self.is_culled():
+            return
+
+        if len(self.shaders) == 1:
+            self.shader.draw(app=self.parent_app, mesh=self.mesh, model_matrix=self.model_matrix)
             return
 
-        self.shader.draw(app=self.parent_app, mesh=self.mesh, model_matrix=self.model_matrix)
+        # All material shaders share the same attribute layout, so the mesh is only actually bound once
+        for submesh, shader in zip(self.mesh.submeshes, self.shaders):
+            shader.draw(app=self.parent_app, mesh=self.mesh, model_matrix=self.model_matrix, submesh=submesh)
 
     def _update(self, delta):
         pass
@@ -119,7 +312,7 @@ class DrawnEntity(Entity):
 class Cube(DrawnEntity):
 
     def __init__(self, parent_app, uv_mode = CubeMesh.UVMode.SAME, **kwargs):
-        super().__init__(parent_app, mesh=CubeMesh(uv_mode=uv_mode), **kwargs)
+        super().__init__(parent_app, mesh=MeshRegistry.acquire(CubeMesh, uv_mode=uv_mode), **kwargs)
 
 
     def handle_event(self, ev):
@@ -144,11 +337,13 @@ class Skybox(DrawnEntity):
         return self.shader.cubemap_id
 
     def draw(self):
-        glDisable(GL_CULL_FACE)
-        glDepthFunc(GL_LEQUAL)
+        culling = GLState.is_enabled(GL_CULL_FACE)
+
+        GLState.set_enabled(GL_CULL_FACE, False)
+        GLState.depth_func(GL_LEQUAL)
         self.shader.draw(app=self.parent_app)
-        glDepthFunc(GL_LESS)
-        glEnable(GL_CULL_FACE)
+        GLState.depth_func(GL_LESS)
+        GLState.set_enabled(GL_CULL_FACE, culling)
 
     def handle_event(self, ev):
         pass
@@ -158,7 +353,7 @@ class Skybox(DrawnEntity):
 
 class Sphere(DrawnEntity):
     def __init__(self, parent_app, slices=32, stacks=0, **kwargs):
-        mesh = SphereMesh(n_slices=slices, n_stacks=stacks)
+        mesh = MeshRegistry.acquire(SphereMesh, n_slices=slices, n_stacks=stacks)
         super().__init__(parent_app, mesh=mesh, **kwargs)
 
 
@@ -173,7 +368,7 @@ class Plane(DrawnEntity):
     def __init__(self, parent_app, normal=Vector3D.UP, up_rotation = 0., **kwargs):
         rotation = Vector3D(*euler_from_vectors(normal)) + Vector3D.UP * up_rotation
 
-        super().__init__(parent_app, mesh=PlaneMesh(), rotation=rotation, **kwargs)
+        super().__init__(parent_app, mesh=MeshRegistry.acquire(PlaneMesh), rotation=rotation, **kwargs)
 
     def _update(self, delta):
         pass
@@ -66,6 +66,17 @@ class Environment:
             case Environment.GlobalAmbientMode.SKYBOX:
                 return self.sky_color
 
+    @property
+    def shader_defines(self):
+        """
+        #defines selecting the fog and tonemapping code compiled into the shaders,
+        changing the modes afterwards only affects shaders created after that
+        """
+        return {
+            "FOG_MODE": self.fog_mode.value,
+            "TONEMAP_MODE": self.tonemap.value,
+        }
+
     @property
     def fog_enabled(self):
         return self.fog_mode != Environment.FogMode.DISABLED
\ No newline at end of file
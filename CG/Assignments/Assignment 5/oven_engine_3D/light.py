@@ -22,6 +22,15 @@ class Light(Entity):
         self.intensity = intensity * BASE_INTENSITY
         self.attenuation = attenuation
 
+    def lit_entities(self):
+        """
+        Drawn entities within the light's radius (all of them for suns and lights without radius)
+        """
+        if self.sun or self.radius <= 0.:
+            return self.parent_app.opaque + self.parent_app.transparent
+
+        return self.parent_app.entities_in_radius(self.world_origin, self.radius)
+
     def _update(self, delta):
         pass
 
@@ -0,0 +1,199 @@
+import math
+
+import numpy as np
+from OpenGL.GL import *
+
+from oven_engine_3D.transforms import TransformStore
+from oven_engine_3D.utils.gl_state import GLState
+from oven_engine_3D.utils.misc import get_color
+
+
+class LightClusters:
+    """
+    Clustered forward lighting: the view frustum is split into a grid of clusters (tiles in screen space,
+    slices spaced exponentially in depth) and each cluster gets the list of the lights whose sphere overlaps it.
+    Lights are binned on the CPU each frame, and the fragment shader reads the lights and the lists from
+    texture buffers, so each fragment only goes through the lights that can actually reach it.
+
+    Lights without radius (suns included) reach everything: they're first in the light data and aren't binned.
+    """
+    # Tiles along x and y, slices in depth
+    GRID_SIZE = (16, 9, 24)
+
+    # Texture units the buffers are bound to, out of the way of the materials' textures
+    LIGHT_DATA_UNIT = 4
+    CLUSTER_CELLS_UNIT = 5
+    CLUSTER_LIGHTS_UNIT = 6
+
+    # vec4 texels per light in the light data: diffuse, specular, ambient, position, attenuation,
+    # then (intensity, radius, is_sun, unused), same as mesh.frag's fetch_light
+    LIGHT_TEXELS = 6
+
+    # Bytes allocated for each buffer at first, they grow as needed
+    INITIAL_BUFFER_SIZE = 4096
+
+    def __init__(self, grid_size=GRID_SIZE):
+        self.grid_size = tuple(grid_size)
+        self.near = 0.
+        self.far = 0.
+        # Slices per unit of log(depth / near)
+        self.depth_scale = 0.
+
+        self.light_count = 0
+        # Lights reaching everything, first in light_data
+        self.global_count = 0
+        # (lights, LIGHT_TEXELS, 4)
+        self.light_data = np.zeros((0, LightClusters.LIGHT_TEXELS, 4), dtype="float32")
+        # (clusters, 2) offset in light_indices and light count of every cluster
+        self.cells = np.zeros((self.cluster_count, 2), dtype="int32")
+        # Indices in light_data of each cluster's lights, one cluster after the other
+        self.light_indices = np.zeros(0, dtype="int32")
+
+        # name -> [buffer id, texture id, capacity in bytes], created on the first upload
+        self.buffers = {}
+
+    @property
+    def cluster_count(self):
+        return self.grid_size[0] * self.grid_size[1] * self.grid_size[2]
+
+    def build(self, camera, lights):
+        """
+        Packs the lights and bins them into the clusters of the camera's frustum
+        """
+        projection = camera.projection_matrix
+        assert 0. < projection.near < projection.far, "Clusters need a projection with 0 < near < far"
+
+        self.near, self.far = projection.near, projection.far
+        self.depth_scale = self.grid_size[2] / math.log(self.far / self.near)
+
+        unbounded = [l for l in lights if l.sun or l.radius <= 0.]
+        bounded = [l for l in lights if not (l.sun or l.radius <= 0.)]
+
+        self.light_data = LightClusters.pack_lights(unbounded + bounded)
+        self.light_count = len(self.light_data)
+        self.global_count = len(unbounded)
+
+        binned = self.light_data[self.global_count:]
+        self.cells, indices = LightClusters.bin_lights(binned[:, 3, :3], binned[:, 5, 1],
+                                                       camera.view_matrix.values, projection.values,
+                                                       self.near, self.far, self.grid_size)
+        self.light_indices = indices + self.global_count
+
+    @staticmethod
+    def pack_lights(lights):
+        data = np.array([[*get_color(l.diffuse), *get_color(l.specular), *get_color(l.ambient), 0., 0., 0., 1.,
+                          *l.attenuation, 0., l.intensity, l.radius, float(l.sun), 0.] for l in lights],
+                        dtype="float32").reshape(-1, LightClusters.LIGHT_TEXELS, 4)
+
+        # World positions straight from the store, all at once
+        data[:, 3, :3] = TransformStore.matrices[[l.transform_index for l in lights], :3, 3]
+
+        return data
+
+    @staticmethod
+    def bin_lights(centers, radii, view, projection, near, far, grid_size):
+        """
+        Finds the clusters overlapped by each light's bounding box, all lights at once
+        :param centers: (N, 3) world space positions
+        :param radii: (N,) light radii
+        :param view: 4x4 view matrix values
+        :param projection: 4x4 projection matrix values
+        :return: (clusters, 2) offset and count of every cluster, indices of the lights of each cluster in a row
+        """
+        gx, gy, gz = grid_size
+        cluster_count = gx * gy * gz
+
+        view_centers = centers @ view[:3, :3].T + view[:3, 3]
+        depths = -view_centers[:, 2]
+
+        # Depth range of each light, clamped to the frustum
+        z_min = np.maximum(depths - radii, near)
+        z_max = np.minimum(depths + radii, far)
+        visible = z_min <= z_max
+
+        log_ratio = math.log(far / near)
+        slices = [np.clip(np.floor(np.log(np.maximum(z, near) / near) * gz / log_ratio), 0, gz - 1).astype("int64")
+                  for z in (z_min, z_max)]
+
+        # Corners of the view space bounding box of each light, projected to NDC. Their depths are in front
+        # of the camera, so the box's projection is inside theirs
+        signs = np.array([-1., 1.])
+        corners = np.ones((len(centers), 2, 2, 2, 4))
+        corners[..., 0] = (view_centers[:, 0, None] + radii[:, None] * signs)[:, :, None, None]
+        corners[..., 1] = (view_centers[:, 1, None] + radii[:, None] * signs)[:, None, :, None]
+        corners[..., 2] = -np.stack([z_min, np.maximum(z_max, z_min)], axis=1)[:, None, None, :]
+
+        clip = corners.reshape(-1, 8, 4) @ np.asarray(projection, dtype="float64").T
+        ndc = clip[..., :2] / clip[..., 3:]
+        ndc_min, ndc_max = ndc.min(axis=1), ndc.max(axis=1)
+        visible &= np.all(ndc_max >= -1., axis=1) & np.all(ndc_min <= 1., axis=1)
+
+        tiles_count = np.array([gx, gy])
+        tile_min = np.clip(np.floor((ndc_min * .5 + .5) * tiles_count), 0, tiles_count - 1).astype("int64")
+        tile_max = np.clip(np.floor((ndc_max * .5 + .5) * tiles_count), 0, tiles_count - 1).astype("int64")
+
+        lights = np.flatnonzero(visible)
+        first = np.column_stack([tile_min[lights], slices[0][lights]])
+        extents = np.column_stack([tile_max[lights], slices[1][lights]]) - first + 1
+        counts = extents.prod(axis=1)
+
+        # One (light, cluster) pair per cluster each light overlaps
+        pair_lights = np.repeat(lights, counts)
+        k = np.arange(len(pair_lights)) - np.repeat(np.cumsum(counts) - counts, counts)
+        first, extents = np.repeat(first, counts, axis=0), np.repeat(extents, counts, axis=0)
+
+        x = first[:, 0] + k % extents[:, 0]
+        y = first[:, 1] + (k // extents[:, 0]) % extents[:, 1]
+        z = first[:, 2] + k // (extents[:, 0] * extents[:, 1])
+        clusters = (z * gy + y) * gx + x
+
+        order = np.argsort(clusters, kind="stable")
+        cluster_counts = np.bincount(clusters, minlength=cluster_count)
+
+        cells = np.empty((cluster_count, 2), dtype="int32")
+        cells[:, 0] = np.cumsum(cluster_counts) - cluster_counts
+        cells[:, 1] = cluster_counts
+
+        return cells, pair_lights[order].astype("int32")
+
+    def upload(self):
+        """
+        Copies the lights and the clusters into their texture buffers, and binds those to their units
+        """
+        if len(self.buffers) == 0:
+            self.__create_buffer("light_data", GL_RGBA32F, LightClusters.LIGHT_DATA_UNIT)
+            self.__create_buffer("cells", GL_RG32I, LightClusters.CLUSTER_CELLS_UNIT)
+            self.__create_buffer("light_indices", GL_R32I, LightClusters.CLUSTER_LIGHTS_UNIT)
+
+        self.__upload_buffer("light_data", self.light_data)
+        self.__upload_buffer("cells", self.cells)
+        self.__upload_buffer("light_indices", self.light_indices)
+
+        for name, unit in [("light_data", LightClusters.LIGHT_DATA_UNIT),
+                           ("cells", LightClusters.CLUSTER_CELLS_UNIT),
+                           ("light_indices", LightClusters.CLUSTER_LIGHTS_UNIT)]:
+            GLState.bind_texture(GL_TEXTURE_BUFFER, self.buffers[name][1], unit=unit)
+
+    def __create_buffer(self, name, internal_format, unit):
+        buffer = glGenBuffers(1)
+        GLState.bind_buffer(GL_TEXTURE_BUFFER, buffer)
+        glBufferData(GL_TEXTURE_BUFFER, LightClusters.INITIAL_BUFFER_SIZE, None, GL_STREAM_DRAW)
+
+        texture = glGenTextures(1)
+        GLState.bind_texture(GL_TEXTURE_BUFFER, texture, unit=unit)
+        glTexBuffer(GL_TEXTURE_BUFFER, internal_format, buffer)
+
+        self.buffers[name] = [buffer, texture, LightClusters.INITIAL_BUFFER_SIZE]
+
+    def __upload_buffer(self, name, data):
+        buffer, _, capacity = self.buffers[name]
+        GLState.bind_buffer(GL_TEXTURE_BUFFER, buffer)
+
+        if data.nbytes > capacity:
+            # The texture keeps pointing to the buffer when its storage is reallocated
+            capacity = max(data.nbytes, capacity * 2)
+            glBufferData(GL_TEXTURE_BUFFER, capacity, None, GL_STREAM_DRAW)
+            self.buffers[name][2] = capacity
+
+        if data.nbytes > 0:
+            glBufferSubData(GL_TEXTURE_BUFFER, 0, data.nbytes, np.ascontiguousarray(data))
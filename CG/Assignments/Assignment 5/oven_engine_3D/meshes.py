@@ -1,58 +1,293 @@
+import hashlib
+import json
 import math
 import os.path
+import re
+import struct
 from abc import ABC
 from enum import Enum
-from itertools import chain
 
 import numpy as np
 import pywavefront as pwf
 from OpenGL.GL import *
 
 from oven_engine_3D.shaders import BaseShader
+from oven_engine_3D.shaders.mesh_shader import MeshShader
 from oven_engine_3D.utils.geometry import Vector3D
+from oven_engine_3D.utils.gl_state import GLState
 
 
-class Mesh(ABC):
-    def __init__(self, positions, normals, uvs, verts_per_face, face_count, attrib_order = None):
-        self.__vbo = Mesh.vbo_from_data(positions, normals, uvs)
+class SubMesh:
+    """
+    Range of a mesh's index buffer drawn with the same material
+    """
+    def __init__(self, name: str, first: int, count: int, material_params: dict = None):
+        self.name = name
+        self.first = first
+        self.count = count
+        # MeshShader arguments, empty if the range has no material of its own
+        self.material_params = material_params if material_params is not None else {}
+
+    def to_dict(self):
+        return {"name": self.name, "first": self.first, "count": self.count, "material": self.material_params}
 
-        self.vertex_positions = positions
-        self.vertex_normals = normals
-        self.vertex_uvs = uvs
-        self.verts_per_face = verts_per_face
-        self.face_count = face_count
+    @staticmethod
+    def from_dict(data: dict):
+        return SubMesh(data["name"], data["first"], data["count"], data["material"])
 
+class Mesh(ABC):
+    ATTRIB_SIZES = {
+        BaseShader.POS_ATTRIB_ID: 3,
+        BaseShader.NORM_ATTRIB_ID: 3,
+        BaseShader.UV_ATTRIB_ID: 2,
+    }
+
+    def __init__(self, positions, normals, uvs, indices, attrib_order = None, submeshes = None):
+        """
+        :param positions: (N, 3) vertex positions, or an already interleaved (N, K) vertex array
+            laid out following attrib_order (in which case normals and uvs must be None)
+        :param normals: (N, 3) vertex normals
+        :param uvs: (N, 2) vertex uvs
+        :param indices: triangle list indices
+        :param attrib_order: order of the attributes in each vertex
+        :param submeshes: ranges of the index buffer with different materials, defaults to a single range
+        """
         self.attrib_order = attrib_order if attrib_order is not None else \
             [BaseShader.POS_ATTRIB_ID, BaseShader.NORM_ATTRIB_ID, BaseShader.UV_ATTRIB_ID]
 
+        self.vertices = Mesh.interleave(positions, normals, uvs)
+        self.__vbo = Mesh.vbo_from_data(self.vertices)
+        self.__ebo = Mesh.ebo_from_indices(indices)
+
+        views = Mesh.split_vertices(self.vertices, self.attrib_order)
+        self.vertex_positions = views.get(BaseShader.POS_ATTRIB_ID)
+        self.vertex_normals = views.get(BaseShader.NORM_ATTRIB_ID)
+        self.vertex_uvs = views.get(BaseShader.UV_ATTRIB_ID)
+        self.index_count = len(indices)
+
+        # Local space bounding volumes, used for culling
+        self.aabb_min = self.vertex_positions.min(axis=0)
+        self.aabb_max = self.vertex_positions.max(axis=0)
+        self.bounding_center = (self.aabb_min + self.aabb_max) / 2.
+        self.bounding_extents = (self.aabb_max - self.aabb_min) / 2.
+        self.bounding_radius = float(np.linalg.norm(self.vertex_positions - self.bounding_center, axis=1).max())
+        self.vaos = {}
+        self.instance_vbo = 0
+
+        self.submeshes = submeshes if submeshes is not None else [SubMesh("", 0, self.index_count)]
+
     @staticmethod
-    def vbo_from_data(pos, nor, uv):
-        if not(nor is None and uv is None):
-            tmp = [(*p, *n, *u) for p, n, u in zip(pos, nor, uv)]
-            tmp = list(chain.from_iterable(tmp))
-        else:
-            tmp = pos
+    def interleave(*attributes):
+        """
+        Packs per-vertex attribute arrays side by side into a single (N, K) float32 array.
+        A single attribute that is already a C-contiguous float32 array is returned as is, without copying.
+        :param attributes: (N, k) arrays (or anything numpy can turn into one), None values are skipped
+        """
+        arrays = [np.asarray(a, dtype="float32") for a in attributes if a is not None]
+
+        if len(arrays) == 1:
+            return np.ascontiguousarray(arrays[0])
+
+        widths = [a.shape[1] for a in arrays]
+        output = np.empty((len(arrays[0]), sum(widths)), dtype="float32")
+
+        offset = 0
+        for a, w in zip(arrays, widths):
+            output[:, offset:offset + w] = a
+            offset += w
+
+        return output
 
+    @staticmethod
+    def split_vertices(vertices, attrib_order):
+        """
+        Returns views (no copies) of each attribute's columns in an interleaved vertex array
+        """
+        views = {}
+
+        offset = 0
+        for atype in attrib_order:
+            size = Mesh.ATTRIB_SIZES[atype]
+            views[atype] = vertices[:, offset:offset + size]
+            offset += size
+
+        return views
+
+    @staticmethod
+    def vbo_from_data(pos, nor=None, uv=None):
         vbo_id = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, vbo_id)
-        glBufferData(GL_ARRAY_BUFFER, np.array(tmp, dtype="float32"), GL_STATIC_DRAW)
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        GLState.bind_buffer(GL_ARRAY_BUFFER, vbo_id)
+        glBufferData(GL_ARRAY_BUFFER, Mesh.interleave(pos, nor, uv), GL_STATIC_DRAW)
 
         return vbo_id
 
-    def draw(self):
-        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+    @staticmethod
+    def ebo_from_indices(indices):
+        ebo_id = glGenBuffers(1)
+        # The element buffer binding is part of the bound vertex array, don't overwrite some other mesh's
+        GLState.bind_vertex_array(0)
+        GLState.bind_buffer(GL_ELEMENT_ARRAY_BUFFER, ebo_id)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, np.ascontiguousarray(indices, dtype="uint32"), GL_STATIC_DRAW)
+
+        return ebo_id
 
-        for k in range(self.face_count):
-            mode = GL_TRIANGLES if self.verts_per_face == 3 else GL_TRIANGLE_FAN
-            glDrawArrays(mode, k * self.verts_per_face, self.verts_per_face)
+    @staticmethod
+    def triangulate(verts_per_face, face_count):
+        """
+        Computes the triangle list indices for a sequence of convex faces (quads, fans...)
+        laid out one after the other in the vertex buffer
+        :param verts_per_face: number of vertices of each face
+        :param face_count: number of faces
+        :return: array of indices, 3 per triangle
+        """
+        # Same triangles GL_TRIANGLE_FAN would produce: (0, i, i+1) for each face
+        fan = np.array([[0, i, i + 1] for i in range(1, verts_per_face - 1)], dtype="uint32")
+        starts = np.arange(face_count, dtype="uint32") * verts_per_face
+
+        return (starts[:, None, None] + fan[None, :, :]).flatten()
+
+    def vao_for(self, shader: BaseShader, instanced=False):
+        """
+        Returns the vertex array object recording this mesh's buffers with the shader's attribute layout,
+        creating it the first time that layout is seen.
+        Instanced VAOs also read a model and normal matrix per instance from the mesh's instance buffer.
+        """
+        layout = shader.attrib_layout(self.attrib_order)
+        if instanced:
+            layout = layout, shader.instance_matrix_loc, shader.instance_normal_loc
+
+        if layout in self.vaos:
+            return self.vaos[layout]
+
+        vao_id = glGenVertexArrays(1)
+        GLState.bind_vertex_array(vao_id)
+
+        shader.link_attrib_vbo(self.vbo, self.attrib_order)
+        GLState.bind_buffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+
+        if instanced:
+            if self.instance_vbo == 0:
+                self.instance_vbo = glGenBuffers(1)
+
+            shader.link_instance_vbo(self.instance_vbo)
+
+        self.vaos[layout] = vao_id
+
+        return vao_id
+
+    def bind(self, shader: BaseShader, instanced=False):
+        GLState.bind_vertex_array(self.vao_for(shader, instanced))
+
+    def draw_range(self, first, count):
+        """
+        Draws part of the index buffer, assumes the mesh is already bound
+        """
+        glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, ctypes.c_void_p(first * 4))
+
+    def draw(self, shader: BaseShader):
+        self.bind(shader)
+        self.draw_range(0, self.index_count)
+
+    def draw_instanced(self, shader: BaseShader, instances):
+        """
+        Draws the whole mesh once per instance with a single call
+        :param instances: (N, 25) float32 array of per-instance data, as TransformStore.instance_data
+        """
+        self.bind(shader, instanced=True)
+
+        GLState.bind_buffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        glBufferData(GL_ARRAY_BUFFER, instances, GL_STREAM_DRAW)
+
+        glDrawElementsInstanced(GL_TRIANGLES, self.index_count, GL_UNSIGNED_INT, None, len(instances))
+
+    def delete(self):
+        """
+        Frees the mesh's GPU buffers, the mesh can't be drawn anymore afterwards
+        """
+        if len(self.vaos) > 0:
+            GLState.delete_vertex_arrays(list(self.vaos.values()))
+        GLState.delete_buffers([b for b in [self.vbo, self.ebo, self.instance_vbo] if b != 0])
+
+        self.vaos = {}
+        self.instance_vbo = 0
 
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
+    @property
+    def has_materials(self):
+        return any(len(sm.material_params) > 0 for sm in self.submeshes)
 
     @property
     def vbo(self):
         return self.__vbo
 
+    @property
+    def ebo(self):
+        return self.__ebo
+
+    @property
+    def triangle_count(self):
+        return self.index_count // 3
+
+class MeshRegistry:
+    """
+    Shares procedurally generated meshes between entities: meshes of the same type built with
+    the same parameters are only created (and uploaded to the GPU) once, and freed when the last
+    user releases them
+    """
+    meshes = {}
+    ref_counts = {}
+
+    @staticmethod
+    def make_key(mesh_type, params: dict):
+        return mesh_type, tuple(sorted(params.items()))
+
+    @staticmethod
+    def acquire(mesh_type, **params) -> Mesh:
+        key = MeshRegistry.make_key(mesh_type, params)
+
+        if key not in MeshRegistry.meshes:
+            mesh = mesh_type(**params)
+            mesh.registry_key = key
+
+            MeshRegistry.meshes[key] = mesh
+            MeshRegistry.ref_counts[key] = 0
+
+        MeshRegistry.ref_counts[key] += 1
+
+        return MeshRegistry.meshes[key]
+
+    @staticmethod
+    def is_registered(mesh: Mesh):
+        key = getattr(mesh, "registry_key", None)
+        return key is not None and MeshRegistry.meshes.get(key) is mesh
+
+    @staticmethod
+    def release(mesh: Mesh):
+        """
+        Gives back a mesh obtained with acquire, deleting it once nobody uses it anymore
+        :return: True if the mesh was deleted
+        """
+        if not MeshRegistry.is_registered(mesh):
+            return False
+
+        key = mesh.registry_key
+        MeshRegistry.ref_counts[key] -= 1
+
+        if MeshRegistry.ref_counts[key] > 0:
+            return False
+
+        del MeshRegistry.meshes[key]
+        del MeshRegistry.ref_counts[key]
+        mesh.delete()
+
+        return True
+
+    @staticmethod
+    def ref_count(mesh: Mesh):
+        if not MeshRegistry.is_registered(mesh):
+            return 0
+
+        return MeshRegistry.ref_counts[mesh.registry_key]
+
 class CubeMesh(Mesh):
     CUBE_POSITION_ARRAY = np.array(
         # back
@@ -139,14 +374,12 @@ class CubeMesh(Mesh):
         pos = CubeMesh.CUBE_POSITION_ARRAY
         nor = CubeMesh.CUBE_NORMAL_ARRAY
 
-        super().__init__(pos, nor, uvs,
-                         4, 6)
+        super().__init__(pos, nor, uvs, Mesh.triangulate(4, 6))
 
 class SkyboxMesh(Mesh):
     def __init__(self):
-        super().__init__(CubeMesh.CUBE_POSITION_ARRAY, None, None,
-                         4, 6)
-        self.attrib_order = [BaseShader.POS_ATTRIB_ID]
+        super().__init__(CubeMesh.CUBE_POSITION_ARRAY, None, None, Mesh.triangulate(4, 6),
+                         attrib_order=[BaseShader.POS_ATTRIB_ID])
 
 class PlaneMesh(Mesh):
     PLANE_POSITION_ARRAY = np.array([[-1, 0, -1],
@@ -160,14 +393,11 @@ class PlaneMesh(Mesh):
                                [1., 0.]])
 
     def __init__(self):
-        super().__init__(PlaneMesh.PLANE_POSITION_ARRAY, PlaneMesh.PLANE_NORMAL_ARRAY, PlaneMesh.PLANE_UV_ARRAY, 4, 1)
+        super().__init__(PlaneMesh.PLANE_POSITION_ARRAY, PlaneMesh.PLANE_NORMAL_ARRAY, PlaneMesh.PLANE_UV_ARRAY,
+                         Mesh.triangulate(4, 1))
 
 class SphereMesh(Mesh):
     def __init__(self, n_slices, n_stacks = 0):
-        pos_tmp = []
-        nor_tmp = []
-        uv_tmp = []
-
         if n_stacks == 0:
             n_stacks = n_slices
         else:
@@ -176,77 +406,257 @@ class SphereMesh(Mesh):
         slice_step = math.tau / n_slices
         stack_step = math.tau / n_stacks
 
-        for i in range(n_stacks+1):
-            stack_angle = (math.tau / 4.) - i * stack_step
-            xy = math.cos(stack_angle)
-            z = math.sin(stack_angle)
+        # One row per stack, one column per slice
+        i, j = np.meshgrid(np.arange(n_stacks + 1, dtype="float32"),
+                           np.arange(n_slices + 1, dtype="float32"), indexing="ij")
 
-            for j in range(n_slices + 1):
-                slice_angle = j * slice_step
+        stack_angle = (math.tau / 4.) - i * stack_step
+        slice_angle = j * slice_step
 
-                x = xy * math.cos(slice_angle)
-                y = xy * math.sin(slice_angle)
+        xy = np.cos(stack_angle)
 
-                pos_tmp.append([x, z, y])
-                nor_tmp.append([x, z, y])
+        positions = np.stack([xy * np.cos(slice_angle), np.sin(stack_angle), xy * np.sin(slice_angle)], axis=-1)
+        positions = positions.reshape(-1, 3)
 
-                # LMAO THIS WORKS FOR REAL????? LOOOOOOOL
-                s = - float(j) / n_slices
-                t = 2. * float(i) / n_stacks
+        # LMAO THIS WORKS FOR REAL????? LOOOOOOOL
+        uvs = np.stack([-j / n_slices, 2. * i / n_stacks], axis=-1).reshape(-1, 2)
 
-                uv_tmp.append([s, t])
+        i, j = np.meshgrid(np.arange(n_stacks, dtype="uint32"),
+                           np.arange(n_slices, dtype="uint32"), indexing="ij")
+        k1 = i * (n_slices + 1) + j
+        k2 = k1 + n_slices + 1
 
-        indices = []
-        for i in range(n_stacks):
-            k1 = i * (n_slices + 1)
-            k2 = k1 + n_slices + 1
+        upper = np.stack([k1 + 1, k2, k1], axis=-1)[i[:, 0] != 0]
+        lower = np.stack([k2 + 1, k2, k1 + 1], axis=-1)[i[:, 0] != (n_slices - 1)]
+        indices = np.concatenate([upper.reshape(-1), lower.reshape(-1)])
 
-            for j in range(n_slices):
-                if i != 0:
-                    indices += [k1+1, k2, k1]
+        super().__init__(positions, positions, uvs, indices)
 
-                if i != (n_slices - 1):
-                    indices += [k2+1, k2, k1+1]
+class OBJMesh(Mesh):
+    __create_key = object()
 
-                k1 += 1
-                k2 += 1
+    loaded = {}
 
-        positions = [pos_tmp[i] for i in indices]
-        normals = [nor_tmp[i] for i in indices]
-        uvs = [uv_tmp[i] for i in indices]
+    CACHE_DIR = "res/cache/meshes"
+    CACHE_EXT = ".mesh"
+    CACHE_MAGIC = b"OVNM"
+    CACHE_VERSION = 2
+    # magic, version, source mtime (ns), source size, vertex count, floats per vertex, index count, submeshes json size
+    CACHE_HEADER = struct.Struct("<4sIqqIIII")
+    # Keep the arrays after the header 16-bytes aligned
+    CACHE_HEADER_SIZE = 64
 
-        face_count = n_stacks * n_slices * 2
+    # Name given by pywavefront to the material of faces without a usemtl
+    DEFAULT_MATERIAL_PATTERN = re.compile(r"default\d+")
 
-        super().__init__(positions, normals, uvs, 3, face_count)
+    def __init__(self, file_name, key, use_cache=True):
+        assert (key == OBJMesh.__create_key), "OBJMesh objects must be created using OBJMesh.load"
 
-class OBJMesh(Mesh):
-    __create_key = object()
+        cached = OBJMesh.read_cache(file_name) if use_cache else None
 
-    loaded = {}
+        if cached is not None:
+            verts, indices, submeshes = cached
+        else:
+            verts, indices, submeshes = OBJMesh.parse(file_name)
 
-    def __init__(self, file_name, key):
-        assert (key == OBJMesh.__create_key), "OBJMesh objects must be created using OBJMesh.load"
+            if use_cache:
+                OBJMesh.write_cache(file_name, verts, indices, submeshes)
+
+        super().__init__(verts, None, None, indices, submeshes=submeshes)
+
+        self.__material_shaders = None
 
+        print("done" if cached is None else "done (from cache)")
+
+    @staticmethod
+    def parse(file_name):
+        """
+        Reads all meshes and materials of an OBJ file into a single interleaved (positions, normals, uvs)
+        vertex array and triangle index buffer, with one submesh range per material
+        """
         scene = pwf.Wavefront(file_name, collect_faces=True)
-        # ASSUME 1 MESH
-        face_count = len(scene.mesh_list[0].faces)
-        # ASSUME 1 MATERIAL
-        material = scene.mesh_list[0].materials[0]
-        # ASSUME T2F_N3F_V3F FORMAT
-        verts = material.vertices
-        verts = [verts[i:i + 8] for i in range(0, len(verts), 8)]
-        verts = [[(v[0], v[1]), (v[4], v[3], v[2]), (v[7], v[6], v[5])] for v in verts]
 
-        positions = np.array([v[2] for v in verts])
-        normals = np.array([v[1] for v in verts])
-        uvs = np.array([v[0] for v in verts])
+        # pywavefront groups vertices by material across all meshes of the file,
+        # so each material shows up once even if several meshes use it
+        materials = []
+        for mesh in scene.mesh_list:
+            materials += [m for m in mesh.materials if m not in materials and len(m.vertices) > 0]
+
+        all_verts = []
+        all_indices = []
+        submeshes = []
+        vert_count = 0
+        index_count = 0
+
+        for material in materials:
+            verts = OBJMesh.vertices_from_format(material.vertex_format, material.vertices)
+
+            # pywavefront gives back one vertex per face corner, merge the duplicates
+            # so that shared corners are only stored once and referenced by index
+            verts, indices = np.unique(verts, axis=0, return_inverse=True)
+            indices = indices.flatten().astype("uint32") + vert_count
+
+            all_verts.append(verts)
+            all_indices.append(indices)
+            submeshes.append(SubMesh(material.name, index_count, len(indices), OBJMesh.material_params(material)))
+
+            vert_count += len(verts)
+            index_count += len(indices)
+
+        return np.concatenate(all_verts), np.concatenate(all_indices), submeshes
+
+    @staticmethod
+    def vertices_from_format(vertex_format: str, vertices):
+        """
+        Turns pywavefront's flat vertex list into an interleaved (positions, normals, uvs) array,
+        filling in zeros for whatever the format does not have
+        :param vertex_format: pywavefront format string, e.g. T2F_N3F_V3F
+        :param vertices: flat list of vertex data
+        """
+        components = vertex_format.split("_")
+        widths = [int(c[1]) for c in components]
+
+        data = np.array(vertices, dtype="float32").reshape(-1, sum(widths))
+        count = len(data)
+
+        parts = {}
+        offset = 0
+        for c, w in zip(components, widths):
+            parts[c[0]] = data[:, offset:offset + w]
+            offset += w
+
+        positions = parts["V"][:, [2, 1, 0]]
+        normals = parts["N"][:, [2, 1, 0]] if "N" in parts else np.zeros((count, 3), dtype="float32")
+        uvs = parts["T"][:, :2] if "T" in parts else np.zeros((count, 2), dtype="float32")
+
+        return Mesh.interleave(positions, normals, uvs)
+
+    @staticmethod
+    def material_params(material):
+        """
+        MeshShader arguments matching a pywavefront material (empty for materials pywavefront made up)
+        """
+        if OBJMesh.DEFAULT_MATERIAL_PATTERN.fullmatch(material.name or "") is not None:
+            return {}
+
+        params = {
+            "diffuse_color": material.diffuse[:3] + [material.transparency],
+            "specular_color": material.specular[:3],
+            "ambient_color": material.ambient[:3],
+            "shininess": material.shininess,
+            "diffuse_texture": OBJMesh.texture_path(material.texture),
+            "specular_texture": OBJMesh.texture_path(material.texture_specular_color),
+        }
+
+        if material.transparency < 1.:
+            params["transparency_mode"] = MeshShader.TransparencyMode.ALPHA_BLEND.name
+
+        return params
+
+    @staticmethod
+    def texture_path(texture):
+        if texture is None:
+            return ""
+
+        try:
+            return texture.find()
+        except FileNotFoundError:
+            # Let the textures manager complain about it
+            return texture.path
+
+    def material_shaders(self):
+        """
+        One MeshShader per submesh, built from the OBJ's materials the first time they're needed
+        """
+        if self.__material_shaders is None:
+            self.__material_shaders = []
+
+            for sm in self.submeshes:
+                params = dict(sm.material_params)
+                if "transparency_mode" in params:
+                    params["transparency_mode"] = MeshShader.TransparencyMode[params["transparency_mode"]]
+
+                self.__material_shaders.append(MeshShader(**params))
+
+        return self.__material_shaders
+
+    @staticmethod
+    def cache_path(file_name, cache_dir=CACHE_DIR):
+        file_name = os.path.abspath(file_name)
+        digest = hashlib.sha1(file_name.encode()).hexdigest()[:16]
+        pure_name = os.path.splitext(os.path.basename(file_name))[0]
+
+        return os.path.join(cache_dir, f"{pure_name}_{digest}{OBJMesh.CACHE_EXT}")
+
+    @staticmethod
+    def read_cache(file_name, cache_dir=CACHE_DIR):
+        """
+        Memory-maps the cached vertex and index arrays of an OBJ file
+        :return: (vertices, indices, submeshes) or None if there is no valid cache for the current version of the file
+        """
+        path = OBJMesh.cache_path(file_name, cache_dir)
+
+        if not os.path.exists(path):
+            return None
+
+        stat = os.stat(file_name)
+
+        with open(path, "rb") as file:
+            header = file.read(OBJMesh.CACHE_HEADER.size)
+
+        if len(header) < OBJMesh.CACHE_HEADER.size:
+            return None
+
+        magic, version, mtime, size, vert_count, vert_width, index_count, meta_size = OBJMesh.CACHE_HEADER.unpack(header)
+
+        if magic != OBJMesh.CACHE_MAGIC or version != OBJMesh.CACHE_VERSION:
+            return None
+
+        if mtime != stat.st_mtime_ns or size != stat.st_size:
+            return None
+
+        verts_offset = OBJMesh.CACHE_HEADER_SIZE
+        indices_offset = verts_offset + vert_count * vert_width * 4
+        meta_offset = indices_offset + index_count * 4
+
+        if os.path.getsize(path) != meta_offset + meta_size:
+            return None
+
+        verts = np.memmap(path, dtype="float32", mode="r", offset=verts_offset, shape=(vert_count, vert_width))
+        indices = np.memmap(path, dtype="uint32", mode="r", offset=indices_offset, shape=(index_count,))
+
+        with open(path, "rb") as file:
+            file.seek(meta_offset)
+            submeshes = [SubMesh.from_dict(d) for d in json.loads(file.read(meta_size))]
+
+        return verts, indices, submeshes
+
+    @staticmethod
+    def write_cache(file_name, verts, indices, submeshes, cache_dir=CACHE_DIR):
+        path = OBJMesh.cache_path(file_name, cache_dir)
+        stat = os.stat(file_name)
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        meta = json.dumps([sm.to_dict() for sm in submeshes]).encode()
+
+        header = OBJMesh.CACHE_HEADER.pack(OBJMesh.CACHE_MAGIC, OBJMesh.CACHE_VERSION,
+                                           stat.st_mtime_ns, stat.st_size,
+                                           len(verts), verts.shape[1], len(indices), len(meta))
 
-        super().__init__(positions, normals, uvs, 3, face_count)
+        # Write next to the final file and swap, so a crash never leaves a half-written cache behind
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(header.ljust(OBJMesh.CACHE_HEADER_SIZE, b"\0"))
+            file.write(np.ascontiguousarray(verts, dtype="float32").tobytes())
+            file.write(np.ascontiguousarray(indices, dtype="uint32").tobytes())
+            file.write(meta)
 
-        print("done")
+        os.replace(tmp_path, path)
 
     @staticmethod
-    def load(file_name):
+    def load(file_name, use_cache=True):
         print(f"Loading mesh from {file_name}...", end="")
 
         file_name = os.path.abspath(file_name)
@@ -255,7 +665,7 @@ class OBJMesh(Mesh):
             print("done (mesh already loaded)")
             return OBJMesh.loaded[file_name]
 
-        mesh = OBJMesh(file_name, OBJMesh.__create_key)
+        mesh = OBJMesh(file_name, OBJMesh.__create_key, use_cache=use_cache)
         OBJMesh.loaded[file_name] = mesh
 
         return mesh
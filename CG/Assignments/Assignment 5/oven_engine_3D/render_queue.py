@@ -0,0 +1,221 @@
+import numpy as np
+
+from oven_engine_3D.entities import DrawnEntity
+from oven_engine_3D.transforms import TransformStore
+
+
+class RenderQueue:
+    """
+    Collects the draws of a frame and submits them sorted, so that draws sharing a program, material,
+    textures and mesh end up next to each other and redundant state changes get skipped.
+
+    Sort order of each pass, from the most significant key:
+        opaque:      program | material | texture set | mesh | depth, front to back
+        transparent: depth, back to front | program | material | texture set | mesh
+    Materials with the same sources share a program but set their own uniforms into it (see BaseShader.apply_uniforms),
+    their draws are kept together so that it happens once per material.
+    Transparent draws must stay sorted by depth for blending to be correct, so there the state only breaks ties.
+    """
+    OPAQUE_PASS = 0
+    TRANSPARENT_PASS = 1
+
+    class DrawItem:
+        """
+        One draw call: either a submesh of an entity, a whole entity, or a group of instances
+        """
+        def __init__(self, render_pass, shader, mesh, entities, submesh=None, custom=False):
+            """
+            :param custom: the entity draws itself in a special way, through its own draw()
+            """
+            self.render_pass = render_pass
+            self.shader = shader
+            self.mesh = mesh
+            self.entities = entities
+            self.submesh = submesh
+            self.custom = custom
+
+        @property
+        def deferrable(self):
+            """
+            Whether the draw can go through the G-buffer of the deferred path
+            """
+            return not self.custom and self.shader.gbuffer_shader is not None
+
+        def draw(self, shader=None):
+            """
+            :param shader: shader to draw with instead of the item's own (e.g. its G-buffer version)
+            """
+            first = self.entities[0]
+            shader = self.shader if shader is None else shader
+
+            if self.custom:
+                first.draw()
+            elif len(self.entities) > 1:
+                DrawnEntity.draw_instanced(self.entities, shader)
+            else:
+                # Culling already happened when the draw was queued
+                shader.draw(app=first.parent_app, mesh=self.mesh, model_matrix=first.model_matrix,
+                            submesh=self.submesh)
+
+    def __init__(self, instancing=True, sort=True):
+        """
+        :param instancing: whether entities sharing mesh and shader are drawn with one instanced call
+        :param sort: False submits the draws in insertion order, for comparison
+        """
+        self.instancing = instancing
+        self.sort = sort
+
+        self.items = []
+        # Sorted passes and the matching items, set by build()
+        self.passes = np.zeros(0, dtype="int64")
+        self.sorted_items = []
+
+    @staticmethod
+    def dense_ids(keys):
+        """
+        Numbers the distinct keys of a frame from 0, in order of first appearance, so that they can be sorted on
+        """
+        ids = {}
+
+        return np.fromiter((ids.setdefault(k, len(ids)) for k in keys), dtype="int64", count=len(keys))
+
+    @staticmethod
+    def texture_set(shader):
+        return tuple(sorted((unit, t["id"]) for unit, t in shader.textures.items()))
+
+    def clear(self):
+        self.items = []
+
+    @staticmethod
+    def draws_itself(ent: DrawnEntity):
+        return type(ent).draw is not DrawnEntity.draw
+
+    def add_entities(self, entities: list[DrawnEntity], camera=None):
+        """
+        Queues the entities that survive culling, tested all at once
+        :param camera: camera whose frustum is used for culling, None to only cull by distance
+        """
+        # Entities drawing themselves are left alone, they handle culling on their own
+        tested = [e for e in entities if not RenderQueue.draws_itself(e)]
+        for ent in entities:
+            if RenderQueue.draws_itself(ent):
+                self.__queue(ent)
+
+        if len(tested) == 0:
+            return
+
+        centers, radii, extents = DrawnEntity.world_bounds(tested)
+        visible = np.ones(len(tested), dtype=bool)
+
+        if camera is not None:
+            visible = camera.visible(centers, radii, extents)
+
+            eye = np.array(tuple(camera.origin))
+            cull_dist = np.array([e.cull_distance for e in tested])
+            visible &= (cull_dist == 0.) | (np.sum((centers - eye)**2, axis=1) <= cull_dist**2)
+
+        for ent in np.array(tested, dtype=object)[visible]:
+            self.__queue(ent)
+
+    def add_entity(self, ent: DrawnEntity):
+        if ent.is_culled():
+            return
+
+        self.__queue(ent)
+
+    def __queue(self, ent: DrawnEntity):
+        # Entities drawing themselves in a special way are kept as a single opaque draw
+        if RenderQueue.draws_itself(ent):
+            self.items.append(RenderQueue.DrawItem(RenderQueue.OPAQUE_PASS, ent.shader, ent.mesh, [ent], custom=True))
+            return
+
+        if len(ent.shaders) == 1:
+            render_pass = RenderQueue.TRANSPARENT_PASS if ent.shader.transparent else RenderQueue.OPAQUE_PASS
+            self.items.append(RenderQueue.DrawItem(render_pass, ent.shader, ent.mesh, [ent]))
+            return
+
+        for submesh, shader in zip(ent.mesh.submeshes, ent.shaders):
+            render_pass = RenderQueue.TRANSPARENT_PASS if shader.transparent else RenderQueue.OPAQUE_PASS
+            self.items.append(RenderQueue.DrawItem(render_pass, shader, ent.mesh, [ent], submesh))
+
+    def __group_instances(self):
+        # Opaque entities sharing the same mesh and material are drawn together with one instanced call
+        groups = {}
+        items = []
+
+        for item in self.items:
+            ent = item.entities[0]
+
+            if item.render_pass == RenderQueue.OPAQUE_PASS and not item.custom and item.submesh is None \
+                    and ent.instanceable:
+                group = groups.get((item.mesh, item.shader), None)
+                if group is None:
+                    groups[(item.mesh, item.shader)] = item
+                    items.append(item)
+                else:
+                    group.entities.append(ent)
+            else:
+                items.append(item)
+
+        return items
+
+    def build(self, eye):
+        """
+        Sorts the queued draws
+        :param eye: camera position, for depth sorting
+        """
+        items = self.__group_instances() if self.instancing else self.items
+        count = len(items)
+
+        passes = np.fromiter((item.render_pass for item in items), dtype="int64", count=count)
+        # Ids only valid for this frame, so nothing accumulates and deleted GL names can't leave stale ids behind
+        programs = RenderQueue.dense_ids([item.shader.renderingProgramID for item in items])
+        materials = RenderQueue.dense_ids([item.shader for item in items])
+        textures = RenderQueue.dense_ids([RenderQueue.texture_set(item.shader) for item in items])
+        meshes = RenderQueue.dense_ids([item.mesh for item in items])
+
+        origins = []
+        owners = []
+        for idx, item in enumerate(items):
+            origins.extend(TransformStore.matrices[e.transform_index, :3, 3] for e in item.entities)
+            owners.extend([idx] * len(item.entities))
+
+        # Distance of the nearest entity of each draw, so that an instanced group is drawn as early as its closest member
+        dist = np.full(count, np.inf, dtype="float32")
+        if count > 0:
+            ent_dist = np.linalg.norm(np.array(origins, dtype="float32") - np.array(tuple(eye), dtype="float32"), axis=1)
+            np.minimum.at(dist, np.array(owners), ent_dist)
+
+        # One sort per pass on separate id columns, so there's no limit on the number of distinct states.
+        # np.lexsort is stable and sorts on its last key first
+        order = []
+        for render_pass in [RenderQueue.OPAQUE_PASS, RenderQueue.TRANSPARENT_PASS]:
+            idx = np.flatnonzero(passes == render_pass)
+
+            if render_pass == RenderQueue.TRANSPARENT_PASS:
+                state = (meshes[idx], textures[idx], materials[idx], programs[idx]) if self.sort else ()
+                idx = idx[np.lexsort(state + (-dist[idx],))]
+            elif self.sort:
+                idx = idx[np.lexsort((dist[idx], meshes[idx], textures[idx], materials[idx], programs[idx]))]
+            # else insertion order for opaque draws, for comparison
+
+            order.extend(idx)
+
+        self.passes = passes[order]
+        self.sorted_items = [items[i] for i in order]
+
+    def draw_pass(self, render_pass, deferred=None):
+        """
+        Submits the sorted draws of one pass, build() must have been called first
+        :param deferred: None for all the draws, True for only those that can be deferred (drawn with
+        their G-buffer shaders), False for only those that can't
+        """
+        # Draws of a pass are contiguous, the passes are sorted one after the other
+        first = np.searchsorted(self.passes, render_pass, side="left")
+        last = np.searchsorted(self.passes, render_pass, side="right")
+
+        for item in self.sorted_items[first:last]:
+            if deferred is None:
+                item.draw()
+            elif item.deferrable == deferred:
+                item.draw(item.shader.gbuffer_shader if deferred else None)
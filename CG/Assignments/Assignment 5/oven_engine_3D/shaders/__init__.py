@@ -1,3 +1,6 @@
+import hashlib
+import os.path
+import time
 from abc import abstractmethod, ABC
 from typing import Collection, Literal
 
@@ -7,20 +10,39 @@ from OpenGL.GLU import *
 from OpenGL.error import GLError
 from pygame import Color
 
+from oven_engine_3D.light_clusters import LightClusters
+from oven_engine_3D.shaders.program_cache import ProgramCache
 from oven_engine_3D.utils.geometry import Vector3D, Vector2D
+from oven_engine_3D.utils.gl_state import GLState
 from oven_engine_3D.utils.misc import is_collection, add_missing, get_color
 
 DEFAULT_SHADER_DIR = "shaders"
 
 
 class BaseShader(ABC):
+    # hash of the final source -> shader id
     compiled_vert_shaders = {}
     compiled_frag_shaders = {}
+    # hash of both final sources -> (program id, vertex shader id, fragment shader id)
+    compiled_programs = {}
+    # program id -> shader whose uniform values the program currently holds
+    program_users = {}
+    # path -> contents of the shader files read so far
+    shader_files = {}
+
+    # Marker followed by the name of a file of DEFAULT_SHADER_DIR to splice in its place
+    INCLUDE_ID = "//--INCLUDE"
+
+    # #defines added to every shader compiled from now on (e.g. the environment's fog and tonemapping modes)
+    global_defines = {}
 
     POS_ATTRIB_ID = 0
     NORM_ATTRIB_ID = 1
     UV_ATTRIB_ID = 2
 
+    # Floats per instance in instance buffers: column-major mat4 model matrix, then mat3 normal matrix
+    INSTANCE_FLOATS = 16 + 9
+
     LAST_USED = []
 
     class ShaderAttribute:
@@ -39,23 +61,38 @@ class BaseShader(ABC):
         def attrib_size(self):
             return self.elem_count * self.elem_size
 
-    def __init__(self, vert_shader_path, frag_shader_path, transparent=False, **kwargs):
-        self.renderingProgramID, self.vert_id, self.frag_id = BaseShader.get_shader_program(vert_shader_path, frag_shader_path)
+    def __init__(self, vert_shader_path, frag_shader_path, transparent=False, defines=None,
+                 vert_source=None, frag_source=None, **kwargs):
+        """
+        :param defines: name -> value of the #defines the shader variant is compiled with
+        :param vert_source: source compiled instead of the vertex shader file's (e.g. with injected code)
+        :param frag_source: source compiled instead of the fragment shader file's
+        """
+        self.defines = {**BaseShader.global_defines, **(defines if defines is not None else {})}
+
+        if vert_source is None:
+            vert_source = BaseShader.read_shader_file(vert_shader_path)
+        if frag_source is None:
+            frag_source = BaseShader.read_shader_file(frag_shader_path)
+
+        self.renderingProgramID, self.vert_id, self.frag_id = BaseShader.get_shader_program(
+            vert_source, frag_source, self.defines, names=(vert_shader_path, frag_shader_path))
 
         self.transparent = transparent
 
         self.uniform_locations = {}
         self.attributes = {}
         self.total_attrib_size = 0
+        # Location of the per-instance model matrix attribute, -1 if the shader can't be instanced
+        self.instance_matrix_loc = -1
+        # Location of the per-instance normal matrix attribute, -1 if the shader doesn't read one
+        self.instance_normal_loc = -1
         self.textures = {}
 
-        def_params = self.__class__.get_default_params()
-
-        self.material_params = {k: v for k, v in kwargs.items() if k in def_params}
-        add_missing(self.material_params, def_params)
+        self.material_params = self.merged_params(kwargs)
 
     def __enter__(self):
-        BaseShader.LAST_USED.append(glGetIntegerv(GL_CURRENT_PROGRAM))
+        BaseShader.LAST_USED.append(GLState.program)
         self.use()
 
         return self
@@ -65,13 +102,18 @@ class BaseShader(ABC):
         if len(BaseShader.LAST_USED) > 0:
             to_restore = BaseShader.LAST_USED.pop()
 
-        glUseProgram(to_restore)
+        # No need to go back to "no program" after a draw, whoever draws next binds its own
+        if to_restore:
+            GLState.use_program(to_restore)
 
     def add_attribute(self, name, elem_count, dtype, atype):
         if atype in self.attributes:
             return
 
-        loc = self.enable_attrib_array(name)
+        loc = self.get_attrib_loc(name)
+
+        assert loc != -1, "Attribute not found!"
+
         attr = BaseShader.ShaderAttribute(name, loc, elem_count, dtype, atype)
 
         self.attributes[atype] = attr
@@ -79,21 +121,95 @@ class BaseShader(ABC):
 
         return loc
 
+    def bind_uniform_blocks(self, bindings: dict):
+        """
+        Connects the shader's uniform blocks to their buffer binding points
+        :param bindings: block name -> binding point, blocks the shader doesn't declare are skipped
+        """
+        for name, binding in bindings.items():
+            idx = glGetUniformBlockIndex(self.renderingProgramID, name)
+
+            if idx != GL_INVALID_INDEX:
+                glUniformBlockBinding(self.renderingProgramID, idx, binding)
+
+    def set_instance_matrix_attribute(self, name, normal_name=""):
+        self.instance_matrix_loc = self.get_attrib_loc(name)
+        if normal_name != "":
+            self.instance_normal_loc = self.get_attrib_loc(normal_name)
+
+    @property
+    def supports_instancing(self):
+        return self.instance_matrix_loc != -1
+
+    @property
+    def gbuffer_shader(self):
+        """
+        Shader writing this material into the G-buffer of the deferred path, None if it can only be drawn forward
+        """
+        return None
+
     @property
     def compiled(self):
         return self.renderingProgramID > 0
 
+    def apply_uniforms(self):
+        """
+        Sets the uniforms this shader keeps in its program, called again whenever another shader
+        sharing the program (same sources) has overwritten them with its own.
+        Uniforms set anywhere else only last until another user of the program sets its own: those that
+        must persist belong here, the others have to be set again before each draw (like the model matrix).
+        """
+        pass
+
     @staticmethod
     @abstractmethod
     def get_default_params():
         return {}
 
+    @classmethod
+    def merged_params(cls, params: dict):
+        """
+        :return: the material parameters among params, completed with the defaults
+        """
+        def_params = cls.get_default_params()
+
+        merged = {k: v for k, v in params.items() if k in def_params}
+        add_missing(merged, def_params)
+
+        return merged
+
     @staticmethod
-    def get_shader_program(vert_path: str, frag_path: str):
-        print("Creating shader program...")
+    def get_shader_program(vert_source: str, frag_source: str, defines: dict = None, names=("vertex", "fragment")):
+        """
+        :param names: what to call the vertex and fragment shaders in the log
+        :return: program id, vertex shader id, fragment shader id, shared by every shader with the same final sources
+        """
+        defines = defines if defines is not None else {}
+        vert_source = BaseShader.source_with_defines(BaseShader.resolve_includes(vert_source), defines)
+        frag_source = BaseShader.source_with_defines(BaseShader.resolve_includes(frag_source), defines)
+        key = BaseShader.source_hash(vert_source, frag_source)
+
+        print("Creating shader program...", end="")
+
+        if key in BaseShader.compiled_programs:
+            print("done (same sources already linked)")
+            return BaseShader.compiled_programs[key]
+
+        start = time.perf_counter()
+
+        progID = ProgramCache.load(key)
+        if progID != 0:
+            # No shader objects, the program comes linked already
+            BaseShader.compiled_programs[key] = progID, 0, 0
+            ProgramCache.record("cached", time.perf_counter() - start)
+
+            print("done (from the program cache)")
+            return BaseShader.compiled_programs[key]
 
-        vert_shader = BaseShader.compile_shader_file(vert_path, GL_VERTEX_SHADER)
-        frag_shader = BaseShader.compile_shader_file(frag_path, GL_FRAGMENT_SHADER)
+        print()
+
+        vert_shader = BaseShader.compile_shader_source(vert_source, GL_VERTEX_SHADER, names[0])
+        frag_shader = BaseShader.compile_shader_source(frag_source, GL_FRAGMENT_SHADER, names[1])
 
         progID = glCreateProgram()
 
@@ -101,59 +217,148 @@ class BaseShader(ABC):
 
         glAttachShader(progID, vert_shader)
         glAttachShader(progID, frag_shader)
+        if ProgramCache.supported():
+            glProgramParameteri(progID, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
         glLinkProgram(progID)
 
         assert glGetProgramiv(progID, GL_LINK_STATUS) == 1, "Failed to link"
 
+        ProgramCache.save(progID, key)
+        ProgramCache.record("compiled", time.perf_counter() - start)
+
+        BaseShader.compiled_programs[key] = progID, vert_shader, frag_shader
+
         return progID, vert_shader, frag_shader
 
     @staticmethod
-    def compile_shader_file(shader_file: str, shader_type: int):
+    def compile_shader_source(source: str, shader_type: int, name=""):
         assert shader_type in [GL_VERTEX_SHADER, GL_FRAGMENT_SHADER], "Invalid shader type"
 
-        shader_path = shader_file
+        # Each variant or injection of a file is a different source
+        key = BaseShader.source_hash(source)
 
-        print(f"\tCompiling shader file {shader_path}...", end="")
+        print(f"\tCompiling shader {name}...", end="")
 
         lookup: dict = BaseShader.compiled_vert_shaders if shader_type == GL_VERTEX_SHADER else BaseShader.compiled_frag_shaders
 
-        if shader_path in lookup:
+        if key in lookup:
             print("done (already compiled)")
-            return lookup[shader_path]
+            return lookup[key]
 
         shader_id = glCreateShader(shader_type)
 
         assert shader_id != 0, "Couldn't create shader"
 
-        try:
-            with open(shader_path) as shader_file:
-                glShaderSource(shader_id, shader_file.read())
-        except FileNotFoundError:
-            assert False, f"Shader file '{shader_file}' not found"
+        glShaderSource(shader_id, source)
 
         glCompileShader(shader_id)
         result = glGetShaderiv(shader_id, GL_COMPILE_STATUS)
-        assert result == 1, (f"Couldn't compile shader {shader_file.name} \n"
+        assert result == 1, (f"Couldn't compile shader {name} \n"
                              "Shader compilation Log:\n"
                              f"{BaseShader.shader_log(shader_id)}")
 
-        lookup[shader_path] = shader_id
+        lookup[key] = shader_id
 
         print("done")
 
         return shader_id
 
+    @staticmethod
+    def read_shader_file(path: str):
+        """
+        :return: the contents of the shader file, only read from the disk the first time
+        """
+        if path not in BaseShader.shader_files:
+            try:
+                with open(path) as shader_file:
+                    BaseShader.shader_files[path] = shader_file.read()
+            except FileNotFoundError:
+                assert False, f"Shader file '{path}' not found"
+
+        return BaseShader.shader_files[path]
+
+    @staticmethod
+    def resolve_includes(source: str, shader_dir=DEFAULT_SHADER_DIR):
+        """
+        Replaces each INCLUDE_ID line of the source with the contents of the file it names, in memory
+        """
+        if BaseShader.INCLUDE_ID not in source:
+            return source
+
+        lines = source.split("\n")
+        for idx, line in enumerate(lines):
+            if not line.startswith(BaseShader.INCLUDE_ID):
+                continue
+
+            included = BaseShader.read_shader_file(os.path.join(shader_dir, line[len(BaseShader.INCLUDE_ID):].strip()))
+            # Compilation logs count the included lines from 1, then go back to the source's numbering
+            lines[idx] = f"#line 1\n{included.rstrip()}\n#line {idx + 2}"
+
+        return "\n".join(lines)
+
+    @staticmethod
+    def source_hash(*sources: str):
+        return hashlib.sha1("\0".join(sources).encode()).hexdigest()
+
+    @staticmethod
+    def source_with_defines(source: str, defines: dict):
+        """
+        Adds a #define for each entry of defines right after the #version line
+        """
+        if len(defines) == 0:
+            return source
+
+        version, _, body = source.partition("\n") if source.startswith("#version") else ("", "", source)
+        lines = [f"#define {name} {int(value) if isinstance(value, bool) else value}" for name, value in sorted(defines.items())]
+        # Keeps the line numbers of the compilation log matching the file
+        first_line = 2 if version != "" else 1
+
+        return "\n".join([version] + lines + [f"#line {first_line}", body])
+
+    def attrib_layout(self, ordering):
+        """
+        Hashable description of how this shader reads a vertex buffer laid out with the given attribute ordering.
+        Shaders with the same layout can share the same vertex array object.
+        """
+        return tuple((self.attributes[atype].loc, self.attributes[atype].elem_count) for atype in ordering), \
+            self.total_attrib_size
+
     def link_attrib_vbo(self, vbo, ordering):
-        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        GLState.bind_buffer(GL_ARRAY_BUFFER, vbo)
 
         offset_size = 0
         for atype in ordering:
             a = self.attributes[atype]
+            glEnableVertexAttribArray(a.loc)
             glVertexAttribPointer(a.loc, a.elem_count, GL_FLOAT, False, self.total_attrib_size,
                                   ctypes.c_void_p(offset_size))
             offset_size += a.attrib_size
 
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
+    def link_instance_vbo(self, vbo):
+        """
+        Reads a mat4 model matrix and a mat3 normal matrix per instance from vbo (laid out as
+        TransformStore.instance_data) into the instance attributes.
+        Matrix attributes take consecutive locations, one per column, so the buffer must be column-major.
+        """
+        GLState.bind_buffer(GL_ARRAY_BUFFER, vbo)
+
+        float_size = sizeof(GLfloat)
+        stride = BaseShader.INSTANCE_FLOATS * float_size
+
+        for col in range(4):
+            loc = self.instance_matrix_loc + col
+            glEnableVertexAttribArray(loc)
+            glVertexAttribPointer(loc, 4, GL_FLOAT, False, stride, ctypes.c_void_p(col * 4 * float_size))
+            glVertexAttribDivisor(loc, 1)
+
+        if self.instance_normal_loc == -1:
+            return
+
+        for col in range(3):
+            loc = self.instance_normal_loc + col
+            glEnableVertexAttribArray(loc)
+            glVertexAttribPointer(loc, 3, GL_FLOAT, False, stride, ctypes.c_void_p((16 + col * 3) * float_size))
+            glVertexAttribDivisor(loc, 1)
 
     @property
     def program_log(self):
@@ -177,11 +382,18 @@ class BaseShader(ABC):
 
     def use(self):
         try:
-            glUseProgram(self.renderingProgramID)
+            GLState.use_program(self.renderingProgramID)
         except OpenGL.error.GLError:
             print(f"Failed to use shader - {self.program_log}")
             raise
 
+        # Shaders with the same sources share their program, but not their uniform values
+        user = BaseShader.program_users.get(self.renderingProgramID, None)
+        BaseShader.program_users[self.renderingProgramID] = self
+
+        if user is not None and user is not self:
+            self.apply_uniforms()
+
     @abstractmethod
     def _ondraw(self, *args, **kwargs):
         pass
@@ -190,7 +402,6 @@ class BaseShader(ABC):
         with self:
             self.toggle_textures()
             self._ondraw(*args, **kwargs)
-            self.toggle_textures(bind=False)
 
     def get_uniform_loc(self, uniform_name):
         if uniform_name in self.uniform_locations:
@@ -238,6 +449,10 @@ class BaseShader(ABC):
         loc = self.get_uniform_loc(uniform_name)
         glUniformMatrix4fv(loc, 1, True, matrix)
 
+    def set_uniform_matrix3(self, matrix, uniform_name):
+        loc = self.get_uniform_loc(uniform_name)
+        glUniformMatrix3fv(loc, 1, True, matrix)
+
     def set_uniform_color(self, color, uniform_name):
         loc = self.get_uniform_loc(uniform_name)
         color = get_color(color)
@@ -293,11 +508,16 @@ class BaseShader(ABC):
         loc = self.get_uniform_loc(uniform_name)
         glUniform1i(loc, texture_slot)
 
+    def set_light_buffers(self):
+        # The buffers themselves are bound once per frame by LightClusters.upload
+        self.set_uniform_sampler2D(LightClusters.LIGHT_DATA_UNIT, "u_light_data")
+        self.set_uniform_sampler2D(LightClusters.CLUSTER_CELLS_UNIT, "u_cluster_cells")
+        self.set_uniform_sampler2D(LightClusters.CLUSTER_LIGHTS_UNIT, "u_cluster_lights")
+
     def toggle_textures(self, bind=True):
         for idx, tex_data in self.textures.items():
             if tex_data["id"] <= 0:
                 continue
 
-            glActiveTexture(GL_TEXTURE0 + idx)
-            glBindTexture(tex_data["type"], tex_data["id"] if bind else 0)
+            GLState.bind_texture(tex_data["type"], tex_data["id"] if bind else 0, unit=idx)
 
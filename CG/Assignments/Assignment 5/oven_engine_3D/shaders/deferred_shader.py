@@ -0,0 +1,41 @@
+import os.path
+
+from OpenGL.GL import *
+
+from oven_engine_3D.shaders import BaseShader, DEFAULT_SHADER_DIR
+from oven_engine_3D.shaders.uniform_blocks import FrameUniforms
+from oven_engine_3D.utils.gl_state import GLState
+
+
+class DeferredLightShader(BaseShader):
+    """
+    Light pass of the deferred path: shades the G-buffer with one triangle covering the screen
+    """
+    LIGHT_VERTEX = os.path.join(DEFAULT_SHADER_DIR, "fullscreen.vert")
+    LIGHT_FRAG = os.path.join(DEFAULT_SHADER_DIR, "deferred_light.frag")
+
+    def __init__(self, gbuffer: "GBuffer"):
+        super().__init__(vert_shader_path=DeferredLightShader.LIGHT_VERTEX,
+                         frag_shader_path=DeferredLightShader.LIGHT_FRAG)
+
+        self.gbuffer = gbuffer
+        # The triangle comes from gl_VertexID, but a vertex array must still be bound to draw
+        self.vao = glGenVertexArrays(1)
+
+        self.bind_uniform_blocks(FrameUniforms.BINDINGS)
+
+        with self:
+            self.apply_uniforms()
+
+    def apply_uniforms(self):
+        for name, (unit, texture_id) in self.gbuffer.textures.items():
+            self.set_texture(unit, texture_id, f"u_gbuffer_{name}")
+        self.set_light_buffers()
+
+    def _ondraw(self, *args, **kwargs):
+        GLState.bind_vertex_array(self.vao)
+        glDrawArrays(GL_TRIANGLES, 0, 3)
+
+    @staticmethod
+    def get_default_params():
+        return {}
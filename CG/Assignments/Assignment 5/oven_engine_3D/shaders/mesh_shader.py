@@ -1,12 +1,11 @@
 import os.path
-from enum import Enum
-from typing import Collection
+from enum import Enum, IntFlag
 
-import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
 from oven_engine_3D.shaders import BaseShader, DEFAULT_SHADER_DIR
+from oven_engine_3D.shaders.uniform_blocks import FrameUniforms
 from oven_engine_3D.utils.geometry import Vector2D
 from oven_engine_3D.utils.misc import add_missing
 from oven_engine_3D.utils.textures import TexturesManager
@@ -15,81 +14,142 @@ from oven_engine_3D.utils.textures import TexturesManager
 class MeshShader(BaseShader):
     INJECTION_BEGIN_ID = "//--INJECTION-BEGIN"
     INJECTION_END_ID = "//--INJECTION-END"
-    INJECTED_CACHE_DIR = "shaders/cache"
-    INJECTED_PREFIX = "tmp_"
     DEFAULT_VERTEX = os.path.join(DEFAULT_SHADER_DIR, "mesh.vert")
     DEFAULT_FRAG = os.path.join(DEFAULT_SHADER_DIR, "mesh.frag")
+    GBUFFER_FRAG = os.path.join(DEFAULT_SHADER_DIR, "gbuffer.frag")
 
     class TransparencyMode(Enum):
         NONE = 0
         ALPHA_DISCARD = 1
         ALPHA_BLEND = 2
 
-    def __init__(self, diffuse_texture: [int | str] = "", specular_texture: [int | str] = "",
-                 injected_frag="", injected_vert="", **kwargs):
+    class Feature(IntFlag):
+        """
+        Material features each shader variant is specialized for, compiled in with #defines
+        instead of being checked in every fragment
+        """
+        DIFFUSE_TEXTURE = 1
+        SPECULAR_TEXTURE = 2
+        UNSHADED = 4
+        ALPHA_DISCARD = 8
+        ALPHA_BLEND = 16
+
+    # Feature -> #define enabling it in mesh.frag/gbuffer.frag
+    FEATURE_DEFINES = {
+        Feature.DIFFUSE_TEXTURE: "USE_DIFF_TEXTURE",
+        Feature.SPECULAR_TEXTURE: "USE_SPEC_TEXTURE",
+        Feature.UNSHADED: "UNSHADED",
+        Feature.ALPHA_DISCARD: "ALPHA_DISCARD",
+        Feature.ALPHA_BLEND: "ALPHA_BLEND",
+    }
 
+    def __init__(self, diffuse_texture: [int | str] = "", specular_texture: [int | str] = "",
+                 injected_frag="", injected_vert="", gbuffer=False, **kwargs):
+        """
+        :param gbuffer: whether the shader writes into the G-buffer of the deferred path instead of shading
+        """
         v_path = MeshShader.DEFAULT_VERTEX
-        f_path = MeshShader.DEFAULT_FRAG
+        f_path = MeshShader.GBUFFER_FRAG if gbuffer else MeshShader.DEFAULT_FRAG
+
+        # Without injection, the files' own sources are used
+        v_source = MeshShader.inject_code(injected_vert, v_path) if injected_vert != "" else None
+        f_source = MeshShader.inject_code(injected_frag, f_path) if injected_frag != "" else None
 
-        if injected_vert != "":
-            v_path = MeshShader.inject_code(injected_vert, MeshShader.DEFAULT_VERTEX)
-        if injected_frag != "":
-            f_path = MeshShader.inject_code(injected_frag, MeshShader.DEFAULT_FRAG)
+        # Textures and parameters are needed first, they decide which variant gets compiled
+        self.diff_tex_id = TexturesManager.load_texture(diffuse_texture, filtering=GL_LINEAR)
+        self.spec_tex_id = TexturesManager.load_texture(specular_texture, filtering=GL_LINEAR)
+        self.features = MeshShader.material_features(self.merged_params(kwargs), self.diff_tex_id, self.spec_tex_id)
 
         super().__init__(transparent=False,
                          vert_shader_path=v_path,
                          frag_shader_path=f_path,
+                         vert_source=v_source,
+                         frag_source=f_source,
+                         defines=MeshShader.feature_defines(self.features),
                          **kwargs)
 
-        self.diff_tex_id = TexturesManager.load_texture(diffuse_texture, filtering=GL_LINEAR)
-        self.spec_tex_id = TexturesManager.load_texture(specular_texture, filtering=GL_LINEAR)
         self.transparent = self.material_params["transparency_mode"] == MeshShader.TransparencyMode.ALPHA_BLEND
+        self.injected_frag = injected_frag
+        self.injected_vert = injected_vert
+        self.writes_gbuffer = gbuffer
+        # G-buffer version of this material, compiled the first time the deferred path needs it
+        self.__gbuffer_shader = None
+        # (matrix, version) last set as u_model_matrix, to skip setting it again for the same unchanged matrix
+        self.__model_matrix_version = None
 
         self.add_attribute("a_position", 3, GLfloat, BaseShader.POS_ATTRIB_ID)
         self.add_attribute("a_normal", 3, GLfloat, BaseShader.NORM_ATTRIB_ID)
         self.add_attribute("a_uv", 2, GLfloat, BaseShader.UV_ATTRIB_ID)
+        self.set_instance_matrix_attribute("a_model_matrix", "a_normal_matrix")
+        self.bind_uniform_blocks(FrameUniforms.BINDINGS)
 
         with self:
-            self.set_diffuse_texture()
-            self.set_specular_texture()
-            self.set_material_uniforms()
+            self.apply_uniforms()
+
+    def apply_uniforms(self):
+        self.set_diffuse_texture()
+        self.set_specular_texture()
+        if not self.writes_gbuffer:
+            self.set_light_buffers()
+        self.set_material_uniforms()
+        # Overwritten as well by the other shader, set again at the next draw
+        self.__model_matrix_version = None
 
     @staticmethod
-    def inject_code(inject_source, inject_target,
-                    injection_start=INJECTION_BEGIN_ID, injection_end=INJECTION_END_ID,
-                    tmp_shader_dir=INJECTED_CACHE_DIR, tmp_shader_prefix=INJECTED_PREFIX, overwrite=False):
-        with open(inject_source) as file:
-            injected_lines = file.readlines()
+    def material_features(params: dict, diff_tex_id: int, spec_tex_id: int):
+        features = MeshShader.Feature(0)
 
-        with open(inject_target) as file:
-            source_lines = file.readlines()
+        if diff_tex_id > 0:
+            features |= MeshShader.Feature.DIFFUSE_TEXTURE
+        if spec_tex_id > 0:
+            features |= MeshShader.Feature.SPECULAR_TEXTURE
+        if params["unshaded"]:
+            features |= MeshShader.Feature.UNSHADED
 
-        inj_start = source_lines.index(f"{injection_start}\n")
-        inj_end = source_lines.index(f"{injection_end}\n")
+        match params["transparency_mode"]:
+            case MeshShader.TransparencyMode.ALPHA_DISCARD:
+                features |= MeshShader.Feature.ALPHA_DISCARD
+            case MeshShader.TransparencyMode.ALPHA_BLEND:
+                features |= MeshShader.Feature.ALPHA_BLEND
 
-        assert inj_start != -1 and inj_end != -1, "Unable to find injection points"
+        return features
 
-        src_head = source_lines[:inj_start + 1]
-        src_tail = source_lines[inj_end:]
-        source_lines = src_head + injected_lines + src_tail
+    @staticmethod
+    def feature_defines(features: "MeshShader.Feature"):
+        return {name: 1 for feature, name in MeshShader.FEATURE_DEFINES.items() if feature in features}
 
-        # Write to temp file
-        if not os.path.exists(tmp_shader_dir):
-            os.makedirs(tmp_shader_dir)
+    @staticmethod
+    def inject_code(inject_source, inject_target,
+                    injection_start=INJECTION_BEGIN_ID, injection_end=INJECTION_END_ID):
+        """
+        Replaces the code between the injection markers of the target shader file with the code of another file
+        :return: the resulting source, assembled in memory
+        """
+        injected = BaseShader.read_shader_file(inject_source)
+        source = BaseShader.read_shader_file(inject_target)
+
+        inj_start = source.find(f"{injection_start}\n")
+        inj_end = source.find(f"{injection_end}\n", max(inj_start, 0))
+
+        assert inj_start != -1 and inj_end != -1, "Unable to find injection points"
 
-        pure_injected_name = os.path.basename(inject_source)
-        pure_injected_name = os.path.splitext(pure_injected_name)[0]
+        if not injected.endswith("\n"):
+            injected += "\n"
 
-        tmp_file = inject_target
-        if not overwrite:
-            tmp_file = os.path.join(tmp_shader_dir, f"{tmp_shader_prefix}{pure_injected_name}")
+        return source[:inj_start + len(injection_start) + 1] + injected + source[inj_end:]
 
-        open_mode = "w" if os.path.exists(tmp_file) else "x"
+    @property
+    def gbuffer_shader(self):
+        # Blended materials can't be deferred, they're drawn forward over the lit scene
+        if self.writes_gbuffer or self.transparent:
+            return None
 
-        with open(tmp_file, open_mode) as file:
-            file.writelines(source_lines)
+        if self.__gbuffer_shader is None:
+            self.__gbuffer_shader = MeshShader(diffuse_texture=self.diff_tex_id, specular_texture=self.spec_tex_id,
+                                               injected_frag=self.injected_frag, injected_vert=self.injected_vert,
+                                               gbuffer=True, **self.material_params)
 
-        return tmp_file
+        return self.__gbuffer_shader
 
     def duplicate(self):
         return self.variation()
@@ -124,20 +184,25 @@ class MeshShader(BaseShader):
     def _ondraw(self, *args, **kwargs):
         mesh = kwargs["mesh"]
         app = kwargs["app"]
-        model_matrix = kwargs["model_matrix"]
-
-        self.link_attrib_vbo(mesh.vbo, mesh.attrib_order)
-        self.set_model_matrix(model_matrix)
-
-        self.set_light_uniforms(app.lights)
-        self.set_camera_uniforms(app.camera)
-        self.set_environment_uniforms(app.environment)
-        self.set_skybox_texture(app.skybox.cubemap_id)
-
-        time = np.float32(app.ticks / 1000.)
-        self.set_time(time)
-
-        mesh.draw()
+        submesh = kwargs.get("submesh", None)
+        # (N, 4, 4) column-major model matrices when drawing several instances at once
+        instances = kwargs.get("instances", None)
+
+        self.set_uniform_bool(instances is not None, "u_instanced")
+        if instances is None:
+            self.set_model_matrix(kwargs["model_matrix"])
+
+        # Camera, environment, lights and time come from the per-frame uniform blocks
+        if not self.writes_gbuffer:
+            self.set_skybox_texture(app.skybox.cubemap_id)
+
+        if instances is not None:
+            mesh.draw_instanced(self, instances)
+        elif submesh is None:
+            mesh.draw(self)
+        else:
+            mesh.bind(self)
+            mesh.draw_range(submesh.first, submesh.count)
 
     def set_material_uniforms(self, params=None):
         if params is None:
@@ -156,39 +221,15 @@ class MeshShader(BaseShader):
         self.set_uniform_bool(params["use_distance_fade"], "u_material.use_distance_fade")
         self.set_uniform_float(params["distance_fade"], "u_material.distance_fade")
 
-    def set_camera_uniforms(self, camera: 'Camera'):
-        self.set_uniform_matrix(camera.projection_matrix.values, "u_projection_matrix")
-        self.set_uniform_matrix(camera.view_matrix.values, "u_view_matrix")
-        self.set_uniform_vec3D(camera.view_matrix.eye, "u_camera_position")
-
-    def set_environment_uniforms(self, env: "Environment"):
-        self.set_uniform_color(env.global_ambient, "u_env.global_ambient")
-        self.set_uniform_float(env.global_ambient_strength, "u_env.ambient_strength")
-        self.set_uniform_color(env.fog_color, "u_env.fog_color")
-        self.set_uniform_float(env.start_fog, "u_env.start_fog")
-        self.set_uniform_float(env.end_fog, "u_env.end_fog")
-        self.set_uniform_float(env.fog_density, "u_env.fog_density")
-        self.set_uniform_int  (env.fog_mode.value, "u_env.fog_mode")
-        self.set_uniform_int  (env.tonemap.value, "u_env.tonemap_mode")
-
-    def set_light_uniforms(self, lights: ["Light" | Collection]):
-        if not isinstance(lights, Collection):
-            lights = [lights]
-
-        self.set_uniform_int(len(lights), "u_light_count")
-
-        for idx, l in enumerate(lights):
-            self.set_uniform_vec3D(l.origin, f"u_lights[{idx}].position")
-            self.set_uniform_float(l.radius, f"u_lights[{idx}].radius")
-            self.set_uniform_float(l.intensity, f"u_lights[{idx}].intensity")
-            self.set_uniform_bool(l.sun, f"u_lights[{idx}].is_sun")
-            self.set_uniform_float(l.attenuation, f"u_lights[{idx}].attenuation")
-            self.set_uniform_color(l.diffuse, f"u_lights[{idx}].diffuse")
-            self.set_uniform_color(l.specular, f"u_lights[{idx}].specular")
-            self.set_uniform_color(l.ambient, f"u_lights[{idx}].ambient")
-
     def set_model_matrix(self, matrix):
+        version = (matrix, matrix.version)
+        if self.__model_matrix_version is not None and self.__model_matrix_version[0] is matrix \
+                and self.__model_matrix_version[1] == version[1]:
+            return
+
+        self.__model_matrix_version = version
         self.set_uniform_matrix(matrix.values, "u_model_matrix")
+        self.set_uniform_matrix3(matrix.normal_matrix, "u_normal_matrix")
 
     def set_diffuse_texture(self):
         self.set_texture(0, self.diff_tex_id,
@@ -201,6 +242,3 @@ class MeshShader(BaseShader):
     def set_skybox_texture(self, skybox_tex_id):
         self.set_texture(1, skybox_tex_id,
                          "u_skybox", texture_type=GL_TEXTURE_CUBE_MAP)
-
-    def set_time(self, value: float):
-        self.set_uniform_float(value, "u_time")
\ No newline at end of file
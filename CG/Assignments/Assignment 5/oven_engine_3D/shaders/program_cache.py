@@ -0,0 +1,185 @@
+import glob
+import hashlib
+import os.path
+import struct
+import time
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GL.ARB.get_program_binary import glInitGetProgramBinaryARB
+from OpenGL.error import GLError
+
+
+class ProgramCache:
+    """
+    Linked programs saved to the disk (glGetProgramBinary), so that the following runs load them back
+    (glProgramBinary) instead of compiling and linking their shaders again.
+    Binaries are only valid for the driver that produced them: they're keyed by the hash of the sources and
+    the GL vendor, renderer and version, and those the driver rejects anyway are compiled again.
+    Loading a binary touches its file, prune() deletes those left untouched for MAX_AGE (edited shaders, old drivers).
+    """
+    CACHE_DIR = "res/cache/programs"
+    CACHE_EXT = ".program"
+    CACHE_MAGIC = b"OVNP"
+    CACHE_VERSION = 1
+    # magic, version, binary format
+    CACHE_HEADER = struct.Struct("<4sII")
+    # Seconds a binary can go without being loaded before prune() deletes it
+    MAX_AGE = 30 * 24 * 60 * 60.
+
+    # Directory used when none is given, changed by the benchmarks not to touch the app's cache
+    directory = CACHE_DIR
+
+    # Programs compiled from their sources and loaded from the cache so far: kind -> [count, seconds]
+    stats = {"compiled": [0, 0.], "cached": [0, 0.]}
+
+    __supported = None
+    __driver = None
+
+    @staticmethod
+    def supported():
+        """
+        Whether the driver can give and take program binaries, checked once
+        """
+        if ProgramCache.__supported is None:
+            ProgramCache.__supported = bool(glInitGetProgramBinaryARB()) \
+                                       and int(glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS)) > 0
+
+        return ProgramCache.__supported
+
+    @staticmethod
+    def driver():
+        if ProgramCache.__driver is None:
+            ProgramCache.__driver = "\n".join(glGetString(name).decode(errors="replace")
+                                              for name in [GL_VENDOR, GL_RENDERER, GL_VERSION])
+
+        return ProgramCache.__driver
+
+    @staticmethod
+    def cache_path(key, cache_dir=None):
+        cache_dir = ProgramCache.directory if cache_dir is None else cache_dir
+        digest = hashlib.sha1(f"{key}\n{ProgramCache.driver()}".encode()).hexdigest()
+
+        return os.path.join(cache_dir, f"{digest}{ProgramCache.CACHE_EXT}")
+
+    @staticmethod
+    def load(key, cache_dir=None):
+        """
+        :param key: hash of the program's sources
+        :return: the id of the program loaded from the cache, 0 if there's no valid binary for it
+        """
+        if not ProgramCache.supported():
+            return 0
+
+        path = ProgramCache.cache_path(key, cache_dir)
+
+        if not os.path.exists(path):
+            return 0
+
+        with open(path, "rb") as file:
+            data = file.read()
+
+        if len(data) <= ProgramCache.CACHE_HEADER.size:
+            return 0
+
+        magic, version, binary_format = ProgramCache.CACHE_HEADER.unpack_from(data)
+
+        if magic != ProgramCache.CACHE_MAGIC or version != ProgramCache.CACHE_VERSION:
+            return 0
+
+        binary = np.frombuffer(data, dtype="uint8", offset=ProgramCache.CACHE_HEADER.size)
+
+        prog_id = glCreateProgram()
+
+        try:
+            glProgramBinary(prog_id, binary_format, binary, len(binary))
+            loaded = glGetProgramiv(prog_id, GL_LINK_STATUS) == 1
+        except GLError:
+            loaded = False
+
+        if not loaded:
+            # Happens after a driver update that kept the same version string, it gets compiled and saved again
+            glDeleteProgram(prog_id)
+            os.remove(path)
+            return 0
+
+        # Marks it as recently used, modification time since access times are often not updated
+        os.utime(path)
+
+        return prog_id
+
+    @staticmethod
+    def save(prog_id, key, cache_dir=None):
+        """
+        Writes the binary of a linked program, which must have been linked with GL_PROGRAM_BINARY_RETRIEVABLE_HINT
+        """
+        if not ProgramCache.supported():
+            return
+
+        length = int(glGetProgramiv(prog_id, GL_PROGRAM_BINARY_LENGTH))
+        if length == 0:
+            return
+
+        binary = np.empty(length, dtype="uint8")
+        written = np.zeros(1, dtype="int32")
+        binary_format = np.zeros(1, dtype="uint32")
+        glGetProgramBinary(prog_id, length, written, binary_format, binary)
+
+        path = ProgramCache.cache_path(key, cache_dir)
+
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        # Write next to the final file and swap, so a crash never leaves a half-written cache behind
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(ProgramCache.CACHE_HEADER.pack(ProgramCache.CACHE_MAGIC, ProgramCache.CACHE_VERSION,
+                                                      int(binary_format[0])))
+            file.write(binary[:written[0]].tobytes())
+
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def clear(cache_dir=None):
+        cache_dir = ProgramCache.directory if cache_dir is None else cache_dir
+
+        for path in glob.glob(os.path.join(cache_dir, f"*{ProgramCache.CACHE_EXT}")):
+            os.remove(path)
+
+    @staticmethod
+    def prune(max_age=None, cache_dir=None):
+        """
+        Deletes the binaries that weren't loaded nor saved for a while. Not being used by one run says nothing,
+        other apps, define sets and drivers share the directory, but after long enough they're most likely stale.
+        :param max_age: in seconds, MAX_AGE if None
+        """
+        cache_dir = ProgramCache.directory if cache_dir is None else cache_dir
+        max_age = ProgramCache.MAX_AGE if max_age is None else max_age
+        oldest = time.time() - max_age
+
+        for path in glob.glob(os.path.join(cache_dir, f"*{ProgramCache.CACHE_EXT}")):
+            if os.path.getmtime(path) < oldest:
+                os.remove(path)
+
+    @staticmethod
+    def record(kind, seconds):
+        """
+        :param kind: "compiled" or "cached", how the program was obtained
+        """
+        ProgramCache.stats[kind][0] += 1
+        ProgramCache.stats[kind][1] += seconds
+
+    @staticmethod
+    def reset_stats():
+        for kind in ProgramCache.stats:
+            ProgramCache.stats[kind] = [0, 0.]
+
+    @staticmethod
+    def report():
+        compiled, compiled_time = ProgramCache.stats["compiled"]
+        cached, cached_time = ProgramCache.stats["cached"]
+
+        return (f"Shader setup: {(compiled_time + cached_time) * 1000.:.1f} ms - "
+                f"{compiled} programs compiled (cold, {compiled_time * 1000.:.1f} ms), "
+                f"{cached} loaded from the cache (warm, {cached_time * 1000.:.1f} ms)"
+                + ("" if ProgramCache.supported() else ", program binaries unsupported by the driver"))
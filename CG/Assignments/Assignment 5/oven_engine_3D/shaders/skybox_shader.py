@@ -5,7 +5,7 @@ import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
-from oven_engine_3D.meshes import SkyboxMesh
+from oven_engine_3D.meshes import SkyboxMesh, MeshRegistry
 from oven_engine_3D.shaders import DEFAULT_SHADER_DIR, BaseShader
 
 
@@ -18,28 +18,34 @@ class SkyboxShader(BaseShader):
         super().__init__(vert_shader_path=SkyboxShader.SKY_VERTEX,
                          frag_shader_path=SkyboxShader.SKY_FRAG)
 
-        self.sky_mesh = SkyboxMesh()
+        self.sky_mesh = MeshRegistry.acquire(SkyboxMesh)
         self.cubemap_id = cubemap_id
+        # Camera matrices and their versions last set as uniforms
+        self.__camera_versions = None
 
         # No need for on_compile since we're never deferring compilation for a skybox shader
 
         self.add_attribute("a_position", 3, GLfloat, BaseShader.POS_ATTRIB_ID)
 
         self.use()
+        self.apply_uniforms()
+
+    def apply_uniforms(self):
         self.set_rotation(self.material_params["rotation"])
         self.set_cubemap()
+        # Set again at the next draw
+        self.__camera_versions = None
 
     def _ondraw(self, *args, **kwargs):
         app = kwargs["app"]
 
-        self.link_attrib_vbo(self.sky_mesh.vbo, self.sky_mesh.attrib_order)
         self.set_camera_uniforms(app.camera)
         self.set_uniform_int(app.environment.tonemap.value, "u_tonemap_mode")
 
         time = np.float32(app.ticks / 1000.)
         self.set_time(time)
 
-        self.sky_mesh.draw()
+        self.sky_mesh.draw(self)
 
     def set_rotation(self, angle):
         self.set_uniform_float(angle, "u_rotation")
@@ -49,6 +55,12 @@ class SkyboxShader(BaseShader):
                          "u_material.u_cubemap", texture_type=GL_TEXTURE_CUBE_MAP)
 
     def set_camera_uniforms(self, camera: 'Camera'):
+        versions = (camera.projection_matrix, camera.projection_matrix.version,
+                    camera.view_matrix, camera.view_matrix.version)
+        if versions == self.__camera_versions:
+            return
+        self.__camera_versions = versions
+
         self.set_uniform_matrix(camera.projection_matrix.values, "u_projection_matrix")
 
         v = camera.view_matrix.values
@@ -0,0 +1,144 @@
+import numpy as np
+from OpenGL.GL import *
+
+from oven_engine_3D.utils.gl_state import GLState
+from oven_engine_3D.utils.misc import get_color
+
+# numpy mirrors of the std140 blocks declared in mesh.vert/mesh.frag,
+# offsets must match the std140 rules (vec4 and mat4 rows aligned to 16 bytes)
+
+# Matrices are declared row_major in the shaders, so they can be copied as they are
+FRAME_DTYPE = np.dtype({
+    "names":    ["projection_matrix", "view_matrix", "camera_position", "time"],
+    "formats":  [("f4", (4, 4)), ("f4", (4, 4)), ("f4", 4), "f4"],
+    "offsets":  [0, 64, 128, 144],
+    "itemsize": 160,
+})
+
+ENVIRONMENT_DTYPE = np.dtype({
+    "names":    ["global_ambient", "fog_color", "ambient_strength", "start_fog", "end_fog", "fog_density",
+                 "fog_mode", "tonemap_mode"],
+    "formats":  [("f4", 4), ("f4", 4), "f4", "f4", "f4", "f4", "i4", "i4"],
+    "offsets":  [0, 16, 32, 36, 40, 44, 48, 52],
+    "itemsize": 64,
+})
+
+# The lights themselves are in LightClusters' texture buffers, the block describes the cluster grid
+LIGHTS_DTYPE = np.dtype({
+    "names":    ["cluster_grid", "cluster_depth", "count"],
+    "formats":  [("i4", 4), ("f4", 4), "i4"],
+    "offsets":  [0, 16, 32],
+    "itemsize": 48,
+})
+
+
+class UniformBlock:
+    """
+    Uniform buffer object bound to a fixed binding point, with a CPU-side copy of its contents
+    """
+    def __init__(self, name: str, binding: int, dtype: np.dtype):
+        self.name = name
+        self.binding = binding
+        self.data = np.zeros(1, dtype=dtype)
+        # Contents as of the last upload, to skip uploading them again when nothing changed
+        self.uploaded = None
+
+        self.ubo = glGenBuffers(1)
+        GLState.bind_buffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferData(GL_UNIFORM_BUFFER, dtype.itemsize, None, GL_DYNAMIC_DRAW)
+
+        GLState.bind_buffer_base(GL_UNIFORM_BUFFER, binding, self.ubo)
+
+    def upload(self, start=0, end=None):
+        """
+        Uploads the bytes of the block in [start, end), unless they're the same as last time
+        """
+        data = self.data.view(np.uint8)
+
+        if self.uploaded is None:
+            # Nothing is on the GPU yet, the whole block goes up the first time
+            start, end = 0, self.data.nbytes
+            self.uploaded = np.empty_like(data)
+        else:
+            end = self.data.nbytes if end is None else end
+            if np.array_equal(data[start:end], self.uploaded[start:end]):
+                return
+
+        GLState.bind_buffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, start, end - start, data[start:end])
+        self.uploaded[start:end] = data[start:end]
+
+
+class FrameUniforms:
+    """
+    Data shared by every draw in a frame (camera, environment, lights), uploaded once per frame
+    and read by the shaders through uniform blocks
+    """
+    FRAME_BLOCK = "FrameBlock"
+    ENVIRONMENT_BLOCK = "EnvironmentBlock"
+    LIGHTS_BLOCK = "LightsBlock"
+
+    # Block name -> binding point
+    BINDINGS = {
+        FRAME_BLOCK: 0,
+        ENVIRONMENT_BLOCK: 1,
+        LIGHTS_BLOCK: 2,
+    }
+
+    def __init__(self):
+        self.frame = UniformBlock(FrameUniforms.FRAME_BLOCK,
+                                  FrameUniforms.BINDINGS[FrameUniforms.FRAME_BLOCK], FRAME_DTYPE)
+        self.environment = UniformBlock(FrameUniforms.ENVIRONMENT_BLOCK,
+                                        FrameUniforms.BINDINGS[FrameUniforms.ENVIRONMENT_BLOCK], ENVIRONMENT_DTYPE)
+        self.lights = UniformBlock(FrameUniforms.LIGHTS_BLOCK,
+                                   FrameUniforms.BINDINGS[FrameUniforms.LIGHTS_BLOCK], LIGHTS_DTYPE)
+
+        # (projection matrix, its version, view matrix, its version) last copied into the frame block
+        self.matrix_versions = None
+
+    def update(self, app):
+        self.set_frame(app.camera, app.ticks / 1000.)
+        self.set_environment(app.environment)
+        self.set_lights(app.light_clusters)
+
+    def set_frame(self, camera, time: float):
+        data = self.frame.data[0]
+
+        # Matrices are only copied when their version says they changed
+        versions = (camera.projection_matrix, camera.projection_matrix.version,
+                    camera.view_matrix, camera.view_matrix.version)
+        data["time"] = time
+
+        if versions != self.matrix_versions:
+            data["projection_matrix"] = camera.projection_matrix.values
+            data["view_matrix"] = camera.view_matrix.values
+            data["camera_position"] = [*camera.view_matrix.eye, 1.]
+            self.matrix_versions = versions
+
+            self.frame.upload()
+        else:
+            # Only the time is new, leave the matrices already on the GPU alone
+            self.frame.upload(FRAME_DTYPE.fields["time"][1])
+
+    def set_environment(self, env: "Environment"):
+        data = self.environment.data[0]
+
+        data["global_ambient"] = get_color(env.global_ambient)
+        data["fog_color"] = get_color(env.fog_color)
+        data["ambient_strength"] = env.global_ambient_strength
+        data["start_fog"] = env.start_fog
+        data["end_fog"] = env.end_fog
+        data["fog_density"] = env.fog_density
+        data["fog_mode"] = env.fog_mode.value
+        data["tonemap_mode"] = env.tonemap.value
+
+        self.environment.upload()
+
+    def set_lights(self, clusters: "LightClusters"):
+        data = self.lights.data[0]
+
+        data["cluster_grid"] = [*clusters.grid_size, clusters.global_count]
+        data["cluster_depth"] = [clusters.near, clusters.far, clusters.depth_scale, 0.]
+        data["count"] = clusters.light_count
+
+        self.lights.upload()
@@ -0,0 +1,272 @@
+import math
+
+import numpy as np
+
+from oven_engine_3D.utils.geometry import Vector3D
+
+
+class LooseOctree:
+    """
+    Dynamic spatial index of bounding spheres. Each object is stored in a single node, the deepest one
+    whose cell is at least as big as the object: since nodes are loose (their bounds are looseness times
+    their cell), an object always fits in the node of the cell containing its center, so moving it only
+    means finding that node again, and nothing has to be split or rebalanced.
+
+    Objects must have a bounding_sphere property giving (center: Vector3D, radius: float).
+    """
+
+    class Node:
+        def __init__(self, center, half_size, depth):
+            self.center = center
+            self.half_size = half_size
+            self.depth = depth
+            self.children = [None] * 8
+            self.objects = []
+
+        def child_index(self, point):
+            return (point[0] >= self.center[0]) | (point[1] >= self.center[1]) << 1 | (point[2] >= self.center[2]) << 2
+
+        def child(self, idx, create=False):
+            if self.children[idx] is None and create:
+                quarter = self.half_size / 2.
+                offset = [quarter if idx & (1 << axis) else -quarter for axis in range(3)]
+                center = tuple(c + o for c, o in zip(self.center, offset))
+
+                self.children[idx] = LooseOctree.Node(center, quarter, self.depth + 1)
+
+            return self.children[idx]
+
+        @property
+        def is_empty(self):
+            return len(self.objects) == 0 and all(c is None for c in self.children)
+
+    def __init__(self, center=Vector3D.ZERO, size=512., max_depth=8, looseness=2.):
+        """
+        :param center: center of the indexed volume
+        :param size: side of the indexed volume, objects outside of it still work but are always tested
+        :param max_depth: depth of the smallest cells
+        :param looseness: how much bigger than its cell a node's bounds are, must be at least 2
+        """
+        assert looseness >= 2., "Looseness must be at least 2 for objects to always fit their cell's node"
+
+        self.size = size
+        self.max_depth = max_depth
+        self.looseness = looseness
+
+        self.root = LooseOctree.Node(tuple(center), size / 2., 0)
+        # Objects outside of the root's cell
+        self.outside = []
+        # object -> (node or None if outside, center, radius)
+        self.locations = {}
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __contains__(self, obj):
+        return obj in self.locations
+
+    def __depth_for(self, radius):
+        if radius <= 0.:
+            return self.max_depth
+
+        # Deepest level whose cells are still at least as big as the object
+        return max(0, min(self.max_depth, int(math.floor(math.log2(self.size / (2. * radius))))))
+
+    def __in_root(self, point):
+        return all(abs(p - c) <= self.root.half_size for p, c in zip(point, self.root.center))
+
+    def __find_node(self, center, radius, create):
+        if not self.__in_root(center):
+            return None
+
+        node = self.root
+        depth = self.__depth_for(radius)
+
+        while node.depth < depth:
+            child = node.child(node.child_index(center), create)
+            if child is None:
+                break
+            node = child
+
+        return node
+
+    def insert(self, obj):
+        if obj in self.locations:
+            self.update(obj)
+            return
+
+        center, radius = obj.bounding_sphere
+        center = tuple(center)
+
+        node = self.__find_node(center, radius, create=True)
+
+        (node.objects if node is not None else self.outside).append(obj)
+        self.locations[obj] = (node, center, radius)
+
+    def remove(self, obj):
+        if obj not in self.locations:
+            return
+
+        node, _, _ = self.locations.pop(obj)
+
+        if node is None:
+            self.outside.remove(obj)
+        else:
+            node.objects.remove(obj)
+            self.__prune(node)
+
+    def update(self, obj):
+        """
+        Moves an object whose bounding sphere changed to its new node
+        """
+        if obj not in self.locations:
+            return
+
+        old_node, _, _ = self.locations[obj]
+
+        center, radius = obj.bounding_sphere
+        center = tuple(center)
+
+        node = self.__find_node(center, radius, create=True)
+
+        if node is not old_node:
+            # Added to the new node first, so pruning the old one can't drop it if it's still empty
+            (node.objects if node is not None else self.outside).append(obj)
+
+            if old_node is None:
+                self.outside.remove(obj)
+            else:
+                old_node.objects.remove(obj)
+                self.__prune(old_node)
+
+        self.locations[obj] = (node, center, radius)
+
+    def __prune(self, node):
+        # Drops empty leaves, walking up from the node that lost an object
+        path = self.__path_to(node)
+
+        for parent, child in zip(reversed(path[:-1]), reversed(path[1:])):
+            if not child.is_empty:
+                break
+            parent.children[parent.children.index(child)] = None
+
+    def __path_to(self, node):
+        path = [self.root]
+
+        while path[-1] is not node:
+            nxt = path[-1].child(path[-1].child_index(node.center))
+            if nxt is None:
+                break
+            path.append(nxt)
+
+        return path
+
+    def __loose_half_size(self, node):
+        return node.half_size * self.looseness
+
+    def __walk(self, node_test, object_test):
+        """
+        Visits the nodes passing node_test and returns the objects passing object_test
+        """
+        found = [o for o in self.outside if object_test(*self.locations[o][1:])]
+
+        stack = [self.root]
+        while len(stack) > 0:
+            node = stack.pop()
+
+            if not node_test(node.center, self.__loose_half_size(node)):
+                continue
+
+            found += [o for o in node.objects if object_test(*self.locations[o][1:])]
+            stack += [c for c in node.children if c is not None]
+
+        return found
+
+    def query_frustum(self, planes):
+        """
+        :param planes: (6, 4) normalized planes with normals pointing inside, as Camera.frustum_planes
+        :return: objects whose bounding sphere is at least partially inside
+        """
+        planes = np.asarray(planes, dtype="float64")
+        normals = planes[:, :3]
+        offsets = planes[:, 3]
+        # Projection of a cube of half size 1 on each plane normal
+        reach = np.abs(normals).sum(axis=1)
+
+        def node_test(center, half_size):
+            return bool(np.all(normals @ center + offsets >= -reach * half_size))
+
+        def object_test(center, radius):
+            return bool(np.all(normals @ center + offsets >= -radius))
+
+        return self.__walk(node_test, object_test)
+
+    def query_sphere(self, center: Vector3D, radius: float):
+        """
+        :return: objects whose bounding sphere intersects the sphere
+        """
+        center = tuple(center)
+
+        def node_test(node_center, half_size):
+            # Distance from the sphere's center to the node's box
+            dist_sq = sum(max(0., abs(c - n) - half_size)**2 for c, n in zip(center, node_center))
+            return dist_sq <= radius**2
+
+        def object_test(obj_center, obj_radius):
+            dist_sq = sum((c - o)**2 for c, o in zip(center, obj_center))
+            return dist_sq <= (radius + obj_radius)**2
+
+        return self.__walk(node_test, object_test)
+
+    def raycast(self, origin: Vector3D, direction: Vector3D, max_distance=math.inf):
+        """
+        :return: (distance, object) pairs of the bounding spheres hit by the ray, nearest first
+        """
+        origin = tuple(origin)
+        direction = tuple(direction.normalized)
+        inv_dir = tuple(1. / d if d != 0. else math.inf for d in direction)
+        hits = {}
+
+        def node_test(center, half_size):
+            # Slab test against the node's box
+            t_near, t_far = 0., max_distance
+            for o, inv, c in zip(origin, inv_dir, center):
+                if inv == math.inf:
+                    if abs(o - c) > half_size:
+                        return False
+                    continue
+
+                t1 = (c - half_size - o) * inv
+                t2 = (c + half_size - o) * inv
+                t_near = max(t_near, min(t1, t2))
+                t_far = min(t_far, max(t1, t2))
+
+            return t_near <= t_far
+
+        def object_test(center, radius):
+            to_center = [c - o for c, o in zip(center, origin)]
+            along = sum(t * d for t, d in zip(to_center, direction))
+            dist_sq = sum(t**2 for t in to_center) - along**2
+
+            if dist_sq > radius**2:
+                return False
+
+            # Distance to the entry point, 0 if the ray starts inside
+            t = max(0., along - math.sqrt(radius**2 - dist_sq))
+            if along + radius < 0. or t > max_distance:
+                return False
+
+            hits[center, radius] = t
+            return True
+
+        found = self.__walk(node_test, object_test)
+
+        return sorted(((hits[self.locations[o][1:]], o) for o in found), key=lambda h: h[0])
+
+    def pick(self, origin: Vector3D, direction: Vector3D, max_distance=math.inf):
+        """
+        :return: the object whose bounding sphere the ray hits first, None if there's none
+        """
+        hits = self.raycast(origin, direction, max_distance)
+
+        return hits[0][1] if len(hits) > 0 else None
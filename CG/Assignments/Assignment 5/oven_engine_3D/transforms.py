@@ -0,0 +1,291 @@
+import numpy as np
+
+from oven_engine_3D.utils.geometry import Vector3D, Quaternion
+from oven_engine_3D.utils.matrices import ModelMatrix
+
+
+class TransformStore:
+    """
+    Origins and scales of every entity in contiguous (N, 3) float32 arrays, their rotations as (N, 4) quaternions,
+    with their model matrices in (N, 4, 4) float32 buffers. Entities only hold their index in it, and all the
+    matrices that changed are recomputed at once by update().
+
+    Transforms can have a parent: their origin/rotation/scale are then relative to it, and their world
+    matrix (what `matrices` holds) is the parent's world matrix times their local one. Changes propagate
+    down the changed subtrees only, a level of the hierarchy at a time.
+    """
+    INITIAL_CAPACITY = 256
+    # Floats per instance in instance_data(), same layout as BaseShader.INSTANCE_FLOATS
+    INSTANCE_FLOATS = 16 + 9
+
+    capacity = 0
+    count = 0
+    origins = np.zeros((0, 3), dtype="float32")
+    # (w, x, y, z) unit quaternions
+    orientations = np.zeros((0, 4), dtype="float32")
+    scales = np.zeros((0, 3), dtype="float32")
+    # Transform relative to the parent
+    local_matrices = np.zeros((0, 4, 4), dtype="float32")
+    # World space transform, used for drawing
+    matrices = np.zeros((0, 4, 4), dtype="float32")
+    # Index of the parent transform, -1 for none
+    parents = np.zeros(0, dtype="int32")
+    # Number of ancestors
+    depths = np.zeros(0, dtype="int32")
+    max_depth = 0
+    # Local transforms changed since the last update
+    dirty = np.zeros(0, dtype=bool)
+    # Incremented whenever a world matrix changes
+    versions = np.zeros(0, dtype="int64")
+    # Normal matrices (inverse transpose of the world matrices' 3x3 part), computed when first needed
+    normal_matrices = np.zeros((0, 3, 3), dtype="float32")
+    # Version of the world matrix each normal matrix was computed from
+    normal_versions = np.zeros(0, dtype="int64")
+    # Object owning each transform (e.g. its entity)
+    owners = []
+    # Indices given back by freed entities, reused first
+    free_indices = []
+
+    @staticmethod
+    def __grow(capacity):
+        def resized(array, fill=0.):
+            out = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            out[:len(array)] = array
+            return out
+
+        TransformStore.origins = resized(TransformStore.origins)
+        TransformStore.orientations = resized(TransformStore.orientations, (1., 0., 0., 0.))
+        TransformStore.scales = resized(TransformStore.scales, 1.)
+        TransformStore.local_matrices = resized(TransformStore.local_matrices)
+        TransformStore.matrices = resized(TransformStore.matrices)
+        TransformStore.parents = resized(TransformStore.parents, -1)
+        TransformStore.depths = resized(TransformStore.depths, 0)
+        TransformStore.dirty = resized(TransformStore.dirty, False)
+        TransformStore.versions = resized(TransformStore.versions, 0)
+        TransformStore.normal_matrices = resized(TransformStore.normal_matrices)
+        TransformStore.normal_versions = resized(TransformStore.normal_versions, -1)
+        TransformStore.owners += [None] * (capacity - TransformStore.capacity)
+        TransformStore.capacity = capacity
+
+    @staticmethod
+    def allocate(origin=Vector3D.ZERO, rotation=Vector3D.ZERO, scale=Vector3D.ONE, owner=None):
+        """
+        :return: index of a new transform without parent, its matrix already computed
+        """
+        if len(TransformStore.free_indices) > 0:
+            idx = TransformStore.free_indices.pop()
+        else:
+            if TransformStore.count == TransformStore.capacity:
+                TransformStore.__grow(max(TransformStore.INITIAL_CAPACITY, TransformStore.capacity * 2))
+
+            idx = TransformStore.count
+            TransformStore.count += 1
+
+        TransformStore.set_origin(idx, origin)
+        TransformStore.set_rotation(idx, rotation)
+        TransformStore.set_scale(idx, scale)
+        TransformStore.parents[idx] = -1
+        TransformStore.depths[idx] = 0
+        TransformStore.owners[idx] = owner
+
+        # No parent, so its world matrix is its local one
+        TransformStore.local_matrices[idx] = TransformStore.compose(TransformStore.origins[idx:idx + 1],
+                                                                    TransformStore.orientations[idx:idx + 1],
+                                                                    TransformStore.scales[idx:idx + 1])[0]
+        TransformStore.matrices[idx] = TransformStore.local_matrices[idx]
+        TransformStore.dirty[idx] = False
+        TransformStore.versions[idx] += 1
+
+        return idx
+
+    @staticmethod
+    def free(idx):
+        """
+        Gives back a transform, it must not have children anymore
+        """
+        TransformStore.dirty[idx] = False
+        TransformStore.parents[idx] = -1
+        TransformStore.depths[idx] = 0
+        TransformStore.owners[idx] = None
+        TransformStore.free_indices.append(idx)
+
+    @staticmethod
+    def set_parent(idx, parent_idx):
+        """
+        :param parent_idx: index of the new parent, -1 to detach the transform
+        """
+        TransformStore.parents[idx] = parent_idx
+        TransformStore.dirty[idx] = True
+        TransformStore.__update_depths()
+
+    @staticmethod
+    def __update_depths():
+        # Re-derives every depth from the parents, a level at a time (reparenting is rare)
+        parents = TransformStore.parents[:TransformStore.count]
+        has_parent = parents >= 0
+        depths = np.zeros(TransformStore.count, dtype="int32")
+
+        while True:
+            new_depths = np.where(has_parent, depths[parents] + 1, 0)
+            if np.array_equal(new_depths, depths):
+                break
+            depths = new_depths
+
+        TransformStore.depths[:TransformStore.count] = depths
+        TransformStore.max_depth = int(depths.max()) if len(depths) > 0 else 0
+
+    @staticmethod
+    def set_origin(idx, origin: Vector3D):
+        TransformStore.origins[idx] = tuple(origin)
+        TransformStore.dirty[idx] = True
+
+    @staticmethod
+    def set_rotation(idx, rotation: [Vector3D|Quaternion]):
+        """
+        :param rotation: Euler angles or a quaternion
+        """
+        TransformStore.orientations[idx] = tuple(rotation if type(rotation) is Quaternion else
+                                                 Quaternion.from_euler(rotation))
+        TransformStore.dirty[idx] = True
+
+    @staticmethod
+    def set_scale(idx, scale: [float|Vector3D]):
+        TransformStore.scales[idx] = tuple(scale) if type(scale) is Vector3D else (scale, scale, scale)
+        TransformStore.dirty[idx] = True
+
+    @staticmethod
+    def orientation(idx):
+        return Quaternion(*TransformStore.orientations[idx].tolist())
+
+    @staticmethod
+    def is_dirty(idx):
+        return bool(TransformStore.dirty[idx])
+
+    @staticmethod
+    def compose(origins, orientations, scales):
+        """
+        translation * rotation * scale for every row, same as ModelMatrix.set_transformations
+        :return: (N, 4, 4) matrices
+        """
+        m = np.zeros((len(origins), 4, 4), dtype="float32")
+        # Scaling the columns of the rotation is the same as multiplying by the scale matrix
+        m[:, :3, :3] = Quaternion.arrays_to_matrices(orientations) * scales[:, np.newaxis, :]
+        m[:, :3, 3] = origins
+        m[:, 3, 3] = 1.
+
+        return m
+
+    @staticmethod
+    def update():
+        """
+        Recomputes the local matrices of the dirty transforms, then the world matrices of
+        those and of all their descendants
+        :return: indices of the transforms whose world matrix changed
+        """
+        count = TransformStore.count
+        changed = np.flatnonzero(TransformStore.dirty[:count])
+
+        if len(changed) == 0:
+            return changed
+
+        TransformStore.local_matrices[changed] = TransformStore.compose(TransformStore.origins[changed],
+                                                                        TransformStore.orientations[changed],
+                                                                        TransformStore.scales[changed])
+        TransformStore.dirty[changed] = False
+
+        world_dirty = np.zeros(count, dtype=bool)
+        world_dirty[changed] = True
+
+        if TransformStore.max_depth == 0:
+            TransformStore.matrices[changed] = TransformStore.local_matrices[changed]
+            TransformStore.versions[changed] += 1
+            return changed
+
+        parents = TransformStore.parents[:count]
+        has_parent = parents >= 0
+        depths = TransformStore.depths[:count]
+
+        # Children of changed transforms change too, one more level per pass
+        for _ in range(TransformStore.max_depth):
+            world_dirty |= has_parent & world_dirty[parents]
+
+        for depth in range(TransformStore.max_depth + 1):
+            level = np.flatnonzero(world_dirty & (depths == depth))
+
+            if depth == 0:
+                TransformStore.matrices[level] = TransformStore.local_matrices[level]
+            else:
+                TransformStore.matrices[level] = TransformStore.matrices[parents[level]] @ TransformStore.local_matrices[level]
+
+        changed = np.flatnonzero(world_dirty)
+        TransformStore.versions[changed] += 1
+
+        return changed
+
+    @staticmethod
+    def world_origin(idx):
+        return Vector3D(*(float(c) for c in TransformStore.matrices[idx, :3, 3]))
+
+    @staticmethod
+    def instance_matrices(indices):
+        """
+        Model matrices transposed so that each one is column-major in memory, as mat4 attributes expect
+        """
+        return np.ascontiguousarray(TransformStore.matrices[indices].transpose(0, 2, 1))
+
+    @staticmethod
+    def normals(indices):
+        """
+        :return: (N, 3, 3) normal matrices, only recomputing those whose world matrix changed since last time
+        """
+        indices = np.asarray(indices, dtype="int64")
+        stale = indices[TransformStore.normal_versions[indices] != TransformStore.versions[indices]]
+
+        if len(stale) > 0:
+            inverse = ModelMatrix.inverse_linear_parts(TransformStore.matrices[stale, :3, :3])
+            TransformStore.normal_matrices[stale] = inverse.transpose(0, 2, 1)
+            TransformStore.normal_versions[stale] = TransformStore.versions[stale]
+
+        return TransformStore.normal_matrices[indices]
+
+    @staticmethod
+    def instance_data(indices):
+        """
+        Per-instance attributes of the transforms: the column-major model matrix (16 floats)
+        followed by the column-major normal matrix (9 floats)
+        """
+        data = np.empty((len(indices), TransformStore.INSTANCE_FLOATS), dtype="float32")
+        data[:, :16] = TransformStore.matrices[indices].transpose(0, 2, 1).reshape(-1, 16)
+        data[:, 16:] = TransformStore.normals(indices).transpose(0, 2, 1).reshape(-1, 9)
+
+        return data
+
+
+class StoredModelMatrix(ModelMatrix):
+    """
+    ModelMatrix whose values live in the TransformStore's world matrix buffer
+    """
+    def __init__(self, index):
+        self.index = index
+
+        # The base constructor loads the identity, keep what the store already computed
+        values = np.copy(TransformStore.matrices[index])
+        super().__init__()
+        self._matrix = values
+
+    @property
+    def _matrix(self):
+        # Looked up every time, the store's buffer is reallocated when it grows
+        return TransformStore.matrices[self.index]
+
+    @_matrix.setter
+    def _matrix(self, value):
+        TransformStore.matrices[self.index] = value
+        self._changed()
+
+    @property
+    def version(self):
+        return int(TransformStore.versions[self.index])
+
+    def _changed(self):
+        TransformStore.versions[self.index] += 1
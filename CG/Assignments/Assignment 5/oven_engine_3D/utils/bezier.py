@@ -1,7 +1,9 @@
 from enum import Enum
 from typing import Collection
 
-from oven_engine_3D.utils.geometry import Vector3D
+import numpy as np
+
+from oven_engine_3D.utils.geometry import Vector3D, Vector3DArray
 
 
 class BezierPoint:
@@ -52,7 +54,22 @@ class BezierCurve:
     def __len__(self):
         return len(self.points)
 
-    def interpolate_segment(self, start_idx: int, t: float):
+    @staticmethod
+    def __weights(t):
+        """
+        Weights of the 4 control points in the position and in the derivative at t,
+        works the same for a single t and for an array of them
+        """
+        t_cube = t**3
+        t_square = t**2
+
+        # Bernstein polynomials
+        weights = [-t_cube + 3*t_square - 3*t + 1, 3*t_cube - 6*t_square + 3*t, -3*t_cube + 3*t_square, t_cube]
+        deriv_weights = [-t_square - 2*t + 1, 3*t_square - 4*t + 1, -3*t_square + 2*t, 3*t_square]
+
+        return weights, deriv_weights
+
+    def __control_points(self, start_idx: int):
         start = self.points[start_idx]
         end = self.points[start_idx + 1]
 
@@ -62,30 +79,41 @@ class BezierCurve:
         if start_idx != 0:
             p2 = 2*p1 - p2
 
+        return p1, p2, end.handle, end.position
+
+    def interpolate_segment(self, start_idx: int, t: float):
+        p1, p2, p3, p4 = self.__control_points(start_idx)
+
         if t <= 0.:
             return p1, p2
 
-        p3, p4 = end.handle, end.position
         if t >= 1.:
             return p4, p3
 
-        t_cube = t**3
-        t_square = t**2
+        (w1, w2, w3, w4), (d1, d2, d3, d4) = BezierCurve.__weights(t)
 
-        # Bernstein polynomials
-        output = p1 * (-t_cube + 3*t_square - 3*t + 1) + \
-               p2 * (3*t_cube - 6*t_square + 3*t) + \
-               p3 * (-3*t_cube + 3*t_square) + \
-               p4 * t_cube
+        output = p1 * w1 + p2 * w2 + p3 * w3 + p4 * w4
 
         # Compute derivative
-        output_deriv = (p1 * (-t_square - 2*t + 1) +
-                        p2 * (3*t_square - 4*t + 1) +
-                        p3 * (-3*t_square + 2*t) +
-                        p4 * (3*t_square)) * 3
+        output_deriv = (p1 * d1 + p2 * d2 + p3 * d3 + p4 * d4) * 3
 
         return output, output_deriv.normalized
 
+    def sample_segment(self, start_idx: int, ts):
+        """
+        Same as interpolate_segment for many values of t at once (all in [0, 1])
+        :return: positions and normalized derivatives, as Vector3DArrays
+        """
+        ts = np.asarray(ts, dtype="float32")
+        control_points = np.array([tuple(p) for p in self.__control_points(start_idx)], dtype="float32")
+
+        weights, deriv_weights = BezierCurve.__weights(ts)
+
+        positions = np.stack(weights, axis=-1) @ control_points
+        derivs = np.stack(deriv_weights, axis=-1) @ control_points * 3
+
+        return Vector3DArray(positions), Vector3DArray(derivs).normalized
+
     """def add_point(self, point: BezierPoint, index: int = -1):
         if index == -1:
             self.points.append(point)
@@ -108,14 +136,10 @@ class BezierCurve:
         self.__lengths[point_idx] = self.segment_length(point_idx)"""
 
     def segment_length(self, start_idx: int, epsilon=.001):
-        last_p = self.interpolate_segment(start_idx, 0.)
-        total_dist = 0.
-
-        for t in range(0, int(1./epsilon)):
-            next_p = self.interpolate_segment(start_idx, t * epsilon)
-            total_dist += (next_p - last_p).length
+        positions, _ = self.sample_segment(start_idx, np.linspace(0., 1., int(1./epsilon) + 1))
 
-        return total_dist
+        # Sum of the distances between consecutive samples
+        return float(positions[1:].distance_to(positions[:-1]).sum())
 
     def reset(self):
         self.current_t = 0.
@@ -1,4 +1,6 @@
 import math
+from itertools import product
+from operator import attrgetter
 from abc import ABC, abstractmethod
 from typing import Self
 
@@ -10,71 +12,59 @@ class classproperty(property):
         return classmethod(self.fget).__get__(None, owner)()
 
 class AbstractVector(ABC):
-    def __init__(self, components : list):
-        self.components = components
+    """
+    Base of the vector types. Components are __slots__ fields of the subclasses (listed in FIELDS),
+    the generic implementations here go through iteration, subclasses override the hot ones.
+    Swizzles (v.xy, v.zyx, v.x0z...) are properties generated once for each class, see _add_swizzles.
+    """
+    __slots__ = ()
+
+    FIELDS = ()
+
+    @property
+    def components(self) -> list:
+        return list(self)
 
     @property
     def components_count(self) -> int:
-        return len(self.components)
+        return len(self.FIELDS)
 
     def __neg__(self) -> Self:
-        return self.__class__.from_values([-c for c in self.components])
+        return self.__class__.from_values([-c for c in self])
 
     def __eq__(self, other):
         if type(other) != type(self):
             return False
 
-        return all([c1 == c2 for c1, c2 in zip(self.components, other.components)])
+        return tuple(self) == tuple(other)
 
     def __gt__(self, other):
         if type(other) != type(self):
             return False
 
-        return all([c1 > c2 for c1, c2 in zip(self.components, other.components)])
+        return all(c1 > c2 for c1, c2 in zip(self, other))
 
     def __lt__(self, other):
         if type(other) != type(self):
             return False
 
-        return all([c1 < c2 for c1, c2 in zip(self.components, other.components)])
+        return all(c1 < c2 for c1, c2 in zip(self, other))
 
     def __str__(self) -> str:
-        return f"({', '.join([str(c) for c in self.components])})"
+        return f"({', '.join([str(c) for c in self])})"
 
     def __repr__(self) -> str:
-        return f"({', '.join([str(c) for c in self.components])})"
+        return f"({', '.join([str(c) for c in self])})"
 
     def __getitem__(self, item):
-        return self.components[item]
-
-    def __getattribute__(self, item: str):
-        if len(item) in [2,3]:
-            comps = {
-                "x": self[0],
-                "y": self[1],
-                "0": 0.,
-            }
-
-            if self.components_count >= 3:
-                comps.update({"z": self[2]})
-
-            if all(item[i] in comps for i in range(len(item))):
-                if len(item) == 2:
-                    return Vector2D(comps[item[0]], comps[item[1]])
-                elif len(item) == 3:
-                    return Vector3D(comps[item[0]], comps[item[1]], comps[item[2]])
-
-        return super().__getattribute__(item)
-
-    def __iter__(self):
-        return iter(self.components)
+        return tuple(self)[item]
 
     def __abs__(self):
-        return self.from_values([math.fabs(c) for c in self.components])
+        return self.from_values([math.fabs(c) for c in self])
 
     @property
     def length_sq(self):
-        return sum([c**2 for c in self.components])
+        return sum(c * c for c in self)
 
     @property
     def length(self):
@@ -84,11 +74,11 @@ class AbstractVector(ABC):
         return self.length_sq > 0.
 
     def __add__(self, other):
-        if type(other) in [int, float]:
-            other = self.from_values([other for _ in range(self.components_count)])
+        if isinstance(other, (int, float)):
+            return self.from_values([c + other for c in self])
 
         if type(other) == type(self):
-            return self.from_values([c1 + c2 for c1, c2 in zip(self.components, other.components)])
+            return self.from_values([c1 + c2 for c1, c2 in zip(self, other)])
 
         return self
 
@@ -96,11 +86,11 @@ class AbstractVector(ABC):
         return self + (other * -1.)
 
     def __mul__(self, other):
-        if type(other) in [int, float]:
-            other = self.from_values([other for _ in range(self.components_count)])
+        if isinstance(other, (int, float)):
+            return self.from_values([c * other for c in self])
 
         if type(other) == type(self):
-            return self.from_values([c1 * c2 for c1, c2 in zip(self.components, other.components)])
+            return self.from_values([c1 * c2 for c1, c2 in zip(self, other)])
 
         return self
 
@@ -108,28 +98,28 @@ class AbstractVector(ABC):
         return self.__mul__(other)
 
     def __truediv__(self, other):
-        if type(other) in [int, float]:
-            other = self.from_values([other for _ in range(self.components_count)])
+        if isinstance(other, (int, float)):
+            return self.from_values([c / other for c in self])
 
         if type(other) == type(self):
-            return self.from_values([c1 / c2 for c1, c2 in zip(self.components, other.components)])
+            return self.from_values([c1 / c2 for c1, c2 in zip(self, other)])
 
         return self
 
     def __floordiv__(self, other):
-        if type(other) in [int, float]:
-            other = self.from_values([other for _ in range(self.components_count)])
+        if isinstance(other, (int, float)):
+            return self.from_values([c // other for c in self])
 
         if type(other) == type(self):
-            return self.from_values([c1 // c2 for c1, c2 in zip(self.components, other.components)])
+            return self.from_values([c1 // c2 for c1, c2 in zip(self, other)])
 
         return self
 
     def __pow__(self, exponent):
-        return self.from_values([c**exponent for c in self.components])
+        return self.from_values([c**exponent for c in self])
 
     def map(self, f, *args, **kwargs):
-        return self.from_values([f(c, *args, **kwargs) for c in self.components])
+        return self.from_values([f(c, *args, **kwargs) for c in self])
 
     def __floor__(self):
         return self.map(math.floor)
@@ -141,7 +131,7 @@ class AbstractVector(ABC):
         return self.map(round, n)
 
     def __hash__(self):
-        return hash(tuple(self.components))
+        return hash(tuple(self))
 
     def snap(self, step: float):
         def s(val, st):
@@ -187,13 +177,13 @@ class AbstractVector(ABC):
         if type(max_value) in [int, float]:
             max_value = self.from_values([max_value] * self.components_count)
 
-        return self.from_values([min(max_value[i], max(min_value[i], self.components[i])) for i in range(self.components_count)])
+        return self.from_values([min(mx, max(mn, c)) for c, mn, mx in zip(self, min_value, max_value)])
 
     def is_longer_than(self, other):
         return self.length_sq > other.length_sq
 
     def dot(self, other):
-        return sum([c1 * c2 for c1, c2 in zip(self.components, other.components)])
+        return sum(c1 * c2 for c1, c2 in zip(self, other))
 
     def distance_sq_to(self, other: Self):
         return (self - other).length_sq
@@ -224,7 +214,7 @@ class AbstractVector(ABC):
         return math.acos(cos_angle)
 
     def to_homogenous(self):
-        return self.components + [1.]
+        return [*self, 1.]
 
     @staticmethod
     @abstractmethod
@@ -236,6 +226,9 @@ class AbstractVector(ABC):
         return None
 
 class Vector2D(AbstractVector):
+    __slots__ = ("x", "y")
+
+    FIELDS = ("x", "y")
 
     def __init__(self, x: [tuple|list|float], y : [float|None] = None):
         if y is None:
@@ -246,7 +239,79 @@ class Vector2D(AbstractVector):
         else:
             self.x, self.y = x, y
 
-        super().__init__([self.x, self.y])
+    def __iter__(self):
+        yield self.x
+        yield self.y
+
+    def __neg__(self):
+        return Vector2D(-self.x, -self.y)
+
+    def __eq__(self, other):
+        if type(other) != Vector2D:
+            return False
+
+        return self.x == other.x and self.y == other.y
+
+    def __hash__(self):
+        return hash((self.x, self.y))
+
+    @property
+    def length_sq(self):
+        return self.x * self.x + self.y * self.y
+
+    def __add__(self, other):
+        if type(other) == Vector2D:
+            return Vector2D(self.x + other.x, self.y + other.y)
+
+        if isinstance(other, (int, float)):
+            return Vector2D(self.x + other, self.y + other)
+
+        if isinstance(other, AbstractVectorArray):
+            # Broadcast over the array's rows by its reflected operator
+            return NotImplemented
+
+        return self
+
+    def __sub__(self, other):
+        if type(other) == Vector2D:
+            return Vector2D(self.x - other.x, self.y - other.y)
+
+        if isinstance(other, (int, float)):
+            return Vector2D(self.x - other, self.y - other)
+
+        if isinstance(other, AbstractVectorArray):
+            return NotImplemented
+
+        return self
+
+    def __mul__(self, other):
+        if isinstance(other, (int, float)):
+            return Vector2D(self.x * other, self.y * other)
+
+        if type(other) == Vector2D:
+            return Vector2D(self.x * other.x, self.y * other.y)
+
+        if isinstance(other, AbstractVectorArray):
+            return NotImplemented
+
+        return self
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, (int, float)):
+            return Vector2D(self.x / other, self.y / other)
+
+        if type(other) == Vector2D:
+            return Vector2D(self.x / other.x, self.y / other.y)
+
+        if isinstance(other, AbstractVectorArray):
+            return NotImplemented
+
+        return self
+
+    def dot(self, other):
+        return self.x * other.x + self.y * other.y
 
     @staticmethod
     def from_polar(angle: float, radius = 1.):
@@ -369,6 +434,9 @@ class Vector2D(AbstractVector):
         return Vector2D(a*line_dist, b*line_dist)
 
 class Vector3D(AbstractVector):
+    __slots__ = ("x", "y", "z")
+
+    FIELDS = ("x", "y", "z")
 
     def __init__(self, x: [tuple|list|float], y : [float|None] = None, z : [float|None] = None):
         if y is None:
@@ -381,7 +449,91 @@ class Vector3D(AbstractVector):
         else:
             self.x, self.y, self.z = x, y, z
 
-        super().__init__([self.x, self.y, self.z])
+    def __iter__(self):
+        yield self.x
+        yield self.y
+        yield self.z
+
+    def __neg__(self):
+        return Vector3D(-self.x, -self.y, -self.z)
+
+    def __eq__(self, other):
+        if type(other) != Vector3D:
+            return False
+
+        return self.x == other.x and self.y == other.y and self.z == other.z
+
+    def __hash__(self):
+        return hash((self.x, self.y, self.z))
+
+    @property
+    def length_sq(self):
+        return self.x * self.x + self.y * self.y + self.z * self.z
+
+    @property
+    def length(self):
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    @property
+    def normalized(self):
+        l = math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+        if l == 0.0:
+            return self
+
+        return Vector3D(self.x / l, self.y / l, self.z / l)
+
+    def __add__(self, other):
+        if type(other) == Vector3D:
+            return Vector3D(self.x + other.x, self.y + other.y, self.z + other.z)
+
+        if isinstance(other, (int, float)):
+            return Vector3D(self.x + other, self.y + other, self.z + other)
+
+        if isinstance(other, AbstractVectorArray):
+            return NotImplemented
+
+        return self
+
+    def __sub__(self, other):
+        if type(other) == Vector3D:
+            return Vector3D(self.x - other.x, self.y - other.y, self.z - other.z)
+
+        if isinstance(other, (int, float)):
+            return Vector3D(self.x - other, self.y - other, self.z - other)
+
+        if isinstance(other, AbstractVectorArray):
+            return NotImplemented
+
+        return self
+
+    def __mul__(self, other):
+        if isinstance(other, (int, float)):
+            return Vector3D(self.x * other, self.y * other, self.z * other)
+
+        if type(other) == Vector3D:
+            return Vector3D(self.x * other.x, self.y * other.y, self.z * other.z)
+
+        if isinstance(other, AbstractVectorArray):
+            return NotImplemented
+
+        return self
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, (int, float)):
+            return Vector3D(self.x / other, self.y / other, self.z / other)
+
+        if type(other) == Vector3D:
+            return Vector3D(self.x / other.x, self.y / other.y, self.z / other.z)
+
+        if isinstance(other, AbstractVectorArray):
+            return NotImplemented
+
+        return self
+
+    def dot(self, other):
+        return self.x * other.x + self.y * other.y + self.z * other.z
 
     @staticmethod
     def from_Vector2D(vec: Vector2D):
@@ -503,6 +655,570 @@ class Vector3D(AbstractVector):
 
         return Vector3D(*rotated)
 
+class AbstractVectorArray:
+    """
+    N vectors stored as the rows of an (N, WIDTH) float32 array, with the vector operations broadcast over
+    all rows at once. Operands can be another array of the same length, a single vector (applied to every row),
+    a scalar, or a (N,) numpy array of per-row scalars.
+    Wrapping a float32 array (or a view of one, e.g. a mesh's vertex_positions) doesn't copy it.
+    """
+    __slots__ = ("data",)
+
+    WIDTH = 0
+    VECTOR = None
+
+    def __init__(self, data):
+        self.data = np.asarray(data, dtype="float32").reshape(-1, self.WIDTH)
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        return cls(np.array([tuple(v) for v in vectors], dtype="float32").reshape(-1, cls.WIDTH))
+
+    @classmethod
+    def zeros(cls, count):
+        return cls(np.zeros((count, cls.WIDTH), dtype="float32"))
+
+    @classmethod
+    def from_buffer(cls, buffer, count=-1, offset=0):
+        """
+        Array viewing the float32 values of a buffer (bytes, memoryview, mapped GL buffer...) without copying
+        :param count: number of vectors, -1 for as many as the buffer holds
+        :param offset: offset in bytes of the first vector
+        """
+        values = np.frombuffer(buffer, dtype="float32", count=count * cls.WIDTH if count >= 0 else -1, offset=offset)
+
+        return cls(values)
+
+    def to_buffer(self):
+        """
+        :return: the values as a C-contiguous float32 array, which glBufferData/glBufferSubData take directly
+            (only copied if the array is a strided view)
+        """
+        return np.ascontiguousarray(self.data)
+
+    def to_vectors(self):
+        return [self.VECTOR(*row) for row in self.data.tolist()]
+
+    @staticmethod
+    def _operand(other):
+        if isinstance(other, AbstractVectorArray):
+            return other.data
+        if isinstance(other, AbstractVector):
+            return np.array(tuple(other), dtype="float32")
+        if isinstance(other, np.ndarray) and other.ndim == 1:
+            # Per-row scalars
+            return other[:, np.newaxis]
+
+        return other
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.to_vectors())
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return self.VECTOR(*self.data[item].tolist())
+
+        return self.__class__(self.data[item])
+
+    def __setitem__(self, item, value):
+        self.data[item] = self._operand(value)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.data})"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.data})"
+
+    @property
+    def x(self):
+        return self.data[:, 0]
+
+    @property
+    def y(self):
+        return self.data[:, 1]
+
+    def __neg__(self):
+        return self.__class__(-self.data)
+
+    def __add__(self, other):
+        return self.__class__(self.data + self._operand(other))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self.__class__(self.data - self._operand(other))
+
+    def __rsub__(self, other):
+        return self.__class__(self._operand(other) - self.data)
+
+    def __mul__(self, other):
+        return self.__class__(self.data * self._operand(other))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return self.__class__(self.data / self._operand(other))
+
+    def __rtruediv__(self, other):
+        return self.__class__(self._operand(other) / self.data)
+
+    # In place versions, writing into the existing rows
+    def __iadd__(self, other):
+        self.data += self._operand(other)
+        return self
+
+    def __isub__(self, other):
+        self.data -= self._operand(other)
+        return self
+
+    def __imul__(self, other):
+        self.data *= self._operand(other)
+        return self
+
+    def __itruediv__(self, other):
+        self.data /= self._operand(other)
+        return self
+
+    def dot(self, other):
+        """
+        :return: (N,) dot products
+        """
+        return (self.data * self._operand(other)).sum(axis=1)
+
+    @property
+    def length_sq(self):
+        return (self.data * self.data).sum(axis=1)
+
+    @property
+    def length(self):
+        return np.sqrt(self.length_sq)
+
+    @property
+    def normalized(self):
+        # Null vectors are left as they are, like Vector.normalized
+        lengths = self.length
+        lengths[lengths == 0.] = 1.
+
+        return self.__class__(self.data / lengths[:, np.newaxis])
+
+    def scale_to_length(self, target_len):
+        return self.normalized * target_len
+
+    def distance_sq_to(self, other):
+        return (self - other).length_sq
+
+    def distance_to(self, other):
+        return np.sqrt(self.distance_sq_to(other))
+
+    def direction_to(self, other):
+        return (other - self).normalized
+
+    def lin_interpolate(self, target, weight):
+        """
+        :param weight: a single weight or (N,) per-row weights
+        """
+        weight = self._operand(np.clip(weight, 0., 1.))
+
+        return self.__class__(self.data * (1. - weight) + self._operand(target) * weight)
+
+    def projected(self, other):
+        other = self._operand(other)
+        other_len_sq = (other * other).sum(axis=-1)
+
+        return self.__class__(other * ((self.data * other).sum(axis=1) / other_len_sq)[:, np.newaxis])
+
+    def reflected(self, normal_vec):
+        normal = self.__class__(np.broadcast_to(self._operand(normal_vec), self.data.shape)).normalized
+
+        return self - normal * (2. * self.dot(normal))
+
+    def angle_with(self, other):
+        other = self.__class__(np.broadcast_to(self._operand(other), self.data.shape))
+        cos_angle = self.dot(other) / (self.length * other.length)
+
+        return np.arccos(np.clip(cos_angle, -1., 1.))
+
+class Vector2DArray(AbstractVectorArray):
+    __slots__ = ()
+
+    WIDTH = 2
+    VECTOR = Vector2D
+
+    def cross(self, other):
+        """
+        :return: (N,) signed areas, see Vector2D.cross
+        """
+        other = np.broadcast_to(self._operand(other), self.data.shape)
+
+        return self.data[:, 0] * other[:, 1] - self.data[:, 1] * other[:, 0]
+
+    def rotated(self, angle):
+        """
+        :param angle: a single angle or (N,) per-row angles
+        """
+        cos_angle, sin_angle = np.cos(angle), np.sin(angle)
+        x, y = self.data[:, 0], self.data[:, 1]
+
+        return Vector2DArray(np.stack([cos_angle * x - sin_angle * y, sin_angle * x + cos_angle * y], axis=-1))
+
+class Vector3DArray(AbstractVectorArray):
+    __slots__ = ()
+
+    WIDTH = 3
+    VECTOR = Vector3D
+
+    @property
+    def z(self):
+        return self.data[:, 2]
+
+    def cross(self, other):
+        return Vector3DArray(np.cross(self.data, self._operand(other)))
+
+    def rotate(self, axis, angle):
+        """
+        Rodrigues' rotation of every row, same as Vector3D.rotate
+        :param axis: a single axis or one per row
+        :param angle: a single angle or (N,) per-row angles
+        """
+        axis = Vector3DArray(np.broadcast_to(self._operand(axis), self.data.shape)).normalized
+        cos_angle, sin_angle = np.cos(angle), np.sin(angle)
+
+        return self * cos_angle + axis.cross(self) * sin_angle + axis * (axis.dot(self) * (1. - cos_angle))
+
+    def distance_to_plane(self, plane_normal, plane_point):
+        return np.abs(self.dot(plane_normal) - plane_point.dot(plane_normal))
+
+    def project_on_plane(self, plane_normal):
+        """
+        :param plane_normal: a single normal or one per row
+        """
+        normal = self._operand(plane_normal)
+        normal = normal / np.linalg.norm(normal, axis=-1, keepdims=True)
+
+        return Vector3DArray(self.data - normal * (self.data * normal).sum(axis=1)[:, np.newaxis])
+
+    def rotate_with_matrix(self, rot_matrix):
+        """
+        Same as Vector3D.rotate_with_matrix for every row, with a single matrix product
+        """
+        homogenous = np.concatenate([self.data, np.ones((len(self), 1), dtype="float32")], axis=1)
+        rotated = homogenous @ np.asarray(rot_matrix, dtype="float32").T
+
+        return Vector3DArray(rotated[:, :3] / rotated[:, 3:])
+
+
+class Quaternion:
+    """
+    Unit quaternion (w + xi + yj + zk) representing a rotation. q1 * q2 applies q2 then q1, like matrices,
+    and q * v rotates a Vector3D. Euler angles follow the engine's convention (rotation x, then y, then z
+    in matrix order, i.e. Rx @ Ry @ Rz).
+    The *_arrays static methods do the same for (N, 4) arrays of (w, x, y, z) rows at once.
+    """
+    __slots__ = ("w", "x", "y", "z")
+
+    def __init__(self, w=1., x=0., y=0., z=0.):
+        self.w, self.x, self.y, self.z = w, x, y, z
+
+    @classproperty
+    def IDENTITY(self):
+        return Quaternion()
+
+    @staticmethod
+    def from_axis_angle(axis: Vector3D, angle: float):
+        axis = axis.normalized
+        s = math.sin(angle / 2.)
+
+        return Quaternion(math.cos(angle / 2.), axis.x * s, axis.y * s, axis.z * s)
+
+    @staticmethod
+    def from_euler(rotation: Vector3D):
+        cx, sx = math.cos(rotation.x / 2.), math.sin(rotation.x / 2.)
+        cy, sy = math.cos(rotation.y / 2.), math.sin(rotation.y / 2.)
+        cz, sz = math.cos(rotation.z / 2.), math.sin(rotation.z / 2.)
+
+        # Product of the x, y and z rotations, expanded
+        return Quaternion(cx * cy * cz - sx * sy * sz,
+                          sx * cy * cz + cx * sy * sz,
+                          cx * sy * cz - sx * cy * sz,
+                          cx * cy * sz + sx * sy * cz)
+
+    @staticmethod
+    def from_matrix(matrix):
+        """
+        :param matrix: rotation matrix, 3x3 or the upper left part of a 4x4
+        """
+        m = np.asarray(matrix)
+        m00, m01, m02 = float(m[0, 0]), float(m[0, 1]), float(m[0, 2])
+        m10, m11, m12 = float(m[1, 0]), float(m[1, 1]), float(m[1, 2])
+        m20, m21, m22 = float(m[2, 0]), float(m[2, 1]), float(m[2, 2])
+
+        # Divides by the largest of w, x, y, z to stay accurate
+        trace = m00 + m11 + m22
+        if trace > 0.:
+            s = math.sqrt(trace + 1.) * 2.
+            q = Quaternion(s / 4., (m21 - m12) / s, (m02 - m20) / s, (m10 - m01) / s)
+        elif m00 > m11 and m00 > m22:
+            s = math.sqrt(1. + m00 - m11 - m22) * 2.
+            q = Quaternion((m21 - m12) / s, s / 4., (m01 + m10) / s, (m02 + m20) / s)
+        elif m11 > m22:
+            s = math.sqrt(1. + m11 - m00 - m22) * 2.
+            q = Quaternion((m02 - m20) / s, (m01 + m10) / s, s / 4., (m12 + m21) / s)
+        else:
+            s = math.sqrt(1. + m22 - m00 - m11) * 2.
+            q = Quaternion((m10 - m01) / s, (m02 + m20) / s, (m12 + m21) / s, s / 4.)
+
+        return q.normalized
+
+    @staticmethod
+    def from_axes(right: Vector3D, up: Vector3D, forward: Vector3D):
+        """
+        Rotation taking the x, y and z axes to the given orthonormal axes
+        """
+        return Quaternion.from_matrix([[right.x, up.x, forward.x],
+                                       [right.y, up.y, forward.y],
+                                       [right.z, up.z, forward.z]])
+
+    @staticmethod
+    def look_rotation(forward: Vector3D, up: Vector3D = Vector3D.UP):
+        """
+        Rotation pointing the z axis along forward, with the y axis as close to up as possible
+        """
+        forward = forward.normalized
+        right = up.cross(forward).normalized
+        if right.length_sq == 0.:
+            # Looking straight along up, any right axis works
+            right = Vector3D.RIGHT if abs(forward.x) < .9 else Vector3D.UP.cross(forward).normalized
+
+        return Quaternion.from_axes(right, forward.cross(right), forward)
+
+    def __iter__(self):
+        yield self.w
+        yield self.x
+        yield self.y
+        yield self.z
+
+    def __eq__(self, other):
+        if type(other) != Quaternion:
+            return False
+
+        return self.w == other.w and self.x == other.x and self.y == other.y and self.z == other.z
+
+    def __str__(self):
+        return f"({self.w}, {self.x}, {self.y}, {self.z})"
+
+    def __repr__(self):
+        return f"Quaternion({self.w}, {self.x}, {self.y}, {self.z})"
+
+    def __neg__(self):
+        return Quaternion(-self.w, -self.x, -self.y, -self.z)
+
+    def __mul__(self, other):
+        if type(other) == Quaternion:
+            return Quaternion(self.w * other.w - self.x * other.x - self.y * other.y - self.z * other.z,
+                              self.w * other.x + self.x * other.w + self.y * other.z - self.z * other.y,
+                              self.w * other.y - self.x * other.z + self.y * other.w + self.z * other.x,
+                              self.w * other.z + self.x * other.y - self.y * other.x + self.z * other.w)
+
+        if type(other) == Vector3D:
+            return self.rotate(other)
+
+        if isinstance(other, (int, float)):
+            return Quaternion(self.w * other, self.x * other, self.y * other, self.z * other)
+
+        return NotImplemented
+
+    @property
+    def length_sq(self):
+        return self.w * self.w + self.x * self.x + self.y * self.y + self.z * self.z
+
+    @property
+    def length(self):
+        return math.sqrt(self.length_sq)
+
+    @property
+    def normalized(self):
+        l = self.length
+        if l == 0.:
+            return Quaternion()
+
+        return Quaternion(self.w / l, self.x / l, self.y / l, self.z / l)
+
+    @property
+    def conjugate(self):
+        return Quaternion(self.w, -self.x, -self.y, -self.z)
+
+    @property
+    def inverse(self):
+        l = self.length_sq
+        return Quaternion(self.w / l, -self.x / l, -self.y / l, -self.z / l)
+
+    def dot(self, other: "Quaternion"):
+        return self.w * other.w + self.x * other.x + self.y * other.y + self.z * other.z
+
+    def rotate(self, vec: Vector3D):
+        """
+        Rotates a vector, assuming a unit quaternion
+        """
+        # v + 2w(q x v) + 2q x (q x v), with t = 2(q x v)
+        tx = 2. * (self.y * vec.z - self.z * vec.y)
+        ty = 2. * (self.z * vec.x - self.x * vec.z)
+        tz = 2. * (self.x * vec.y - self.y * vec.x)
+
+        return Vector3D(vec.x + self.w * tx + self.y * tz - self.z * ty,
+                        vec.y + self.w * ty + self.z * tx - self.x * tz,
+                        vec.z + self.w * tz + self.x * ty - self.y * tx)
+
+    @property
+    def axes(self):
+        """
+        :return: the rotated x, y and z axes (the columns of the rotation matrix)
+        """
+        w, x, y, z = self.w, self.x, self.y, self.z
+
+        return (Vector3D(1. - 2. * (y * y + z * z), 2. * (x * y + w * z), 2. * (x * z - w * y)),
+                Vector3D(2. * (x * y - w * z), 1. - 2. * (x * x + z * z), 2. * (y * z + w * x)),
+                Vector3D(2. * (x * z + w * y), 2. * (y * z - w * x), 1. - 2. * (x * x + y * y)))
+
+    def slerp(self, target: "Quaternion", weight: float):
+        weight = min(1., max(0., weight))
+
+        cos_angle = self.dot(target)
+        # Takes the shortest way around
+        if cos_angle < 0.:
+            target, cos_angle = -target, -cos_angle
+
+        if cos_angle > .9995:
+            # Nearly the same rotation, a normalized linear interpolation is accurate enough
+            return Quaternion(*[a + (b - a) * weight for a, b in zip(self, target)]).normalized
+
+        angle = math.acos(cos_angle)
+        sin_angle = math.sin(angle)
+        w1 = math.sin((1. - weight) * angle) / sin_angle
+        w2 = math.sin(weight * angle) / sin_angle
+
+        return Quaternion(*[a * w1 + b * w2 for a, b in zip(self, target)])
+
+    def to_axis_angle(self):
+        q = self.normalized
+        angle = 2. * math.acos(max(-1., min(1., q.w)))
+        s = math.sqrt(max(0., 1. - q.w * q.w))
+
+        if s < 1e-8:
+            return Vector3D.RIGHT, 0.
+
+        return Vector3D(q.x / s, q.y / s, q.z / s), angle
+
+    def to_euler(self):
+        """
+        :return: Euler angles giving the same rotation, as used by Entity.rotation
+        """
+        w, x, y, z = self.w, self.x, self.y, self.z
+
+        # Matrix terms needed to undo Rx @ Ry @ Rz
+        m02 = 2. * (x * z + w * y)
+        m12 = 2. * (y * z - w * x)
+        m22 = 1. - 2. * (x * x + y * y)
+        m01 = 2. * (x * y - w * z)
+        m00 = 1. - 2. * (y * y + z * z)
+
+        return Vector3D(math.atan2(-m12, m22), math.asin(max(-1., min(1., m02))), math.atan2(-m01, m00))
+
+    def to_matrix3(self):
+        return np.array([list(axis) for axis in self.axes], dtype="float32").T
+
+    def to_matrix4(self):
+        m = np.eye(4, dtype="float32")
+        m[:3, :3] = self.to_matrix3()
+
+        return m
+
+    @staticmethod
+    def compose_arrays(a, b):
+        """
+        :return: (N, 4) products a * b of rows of (N, 4) arrays (or a single quaternion broadcast to every row)
+        """
+        a = np.asarray(a, dtype="float32")
+        b = np.asarray(b, dtype="float32")
+        aw, ax, ay, az = np.moveaxis(a, -1, 0)
+        bw, bx, by, bz = np.moveaxis(b, -1, 0)
+
+        return np.stack([aw * bw - ax * bx - ay * by - az * bz,
+                         aw * bx + ax * bw + ay * bz - az * by,
+                         aw * by - ax * bz + ay * bw + az * bx,
+                         aw * bz + ax * by - ay * bx + az * bw], axis=-1)
+
+    @staticmethod
+    def slerp_arrays(a, b, weights):
+        """
+        Row by row slerp between two (N, 4) arrays
+        :param weights: a single weight or (N,) per-row weights
+        """
+        a = np.asarray(a, dtype="float32")
+        b = np.array(b, dtype="float32")
+        weights = np.clip(np.asarray(weights, dtype="float32"), 0., 1.)[..., np.newaxis]
+
+        cos_angle = (a * b).sum(axis=-1, keepdims=True)
+        b = np.where(cos_angle < 0., -b, b)
+        cos_angle = np.abs(cos_angle)
+
+        angle = np.arccos(np.minimum(cos_angle, 1.))
+        sin_angle = np.sin(angle)
+        # Nearly identical rows are linearly interpolated (then normalized)
+        near = cos_angle > .9995
+        safe_sin = np.where(near, 1., sin_angle)
+        w1 = np.where(near, 1. - weights, np.sin((1. - weights) * angle) / safe_sin)
+        w2 = np.where(near, weights, np.sin(weights * angle) / safe_sin)
+
+        out = a * w1 + b * w2
+        return out / np.linalg.norm(out, axis=-1, keepdims=True)
+
+    @staticmethod
+    def arrays_to_matrices(q):
+        """
+        :return: (N, 3, 3) rotation matrices of the (N, 4) unit quaternion rows
+        """
+        q = np.asarray(q, dtype="float32")
+        w, x, y, z = np.moveaxis(q, -1, 0)
+
+        m = np.empty(q.shape[:-1] + (3, 3), dtype="float32")
+        m[..., 0, 0] = 1. - 2. * (y * y + z * z)
+        m[..., 0, 1] = 2. * (x * y - w * z)
+        m[..., 0, 2] = 2. * (x * z + w * y)
+        m[..., 1, 0] = 2. * (x * y + w * z)
+        m[..., 1, 1] = 1. - 2. * (x * x + z * z)
+        m[..., 1, 2] = 2. * (y * z - w * x)
+        m[..., 2, 0] = 2. * (x * z - w * y)
+        m[..., 2, 1] = 2. * (y * z + w * x)
+        m[..., 2, 2] = 1. - 2. * (x * x + y * y)
+
+        return m
+
+
+def _add_swizzles(cls):
+    """
+    Adds a property for every 2 and 3 letters combination of the class' fields and 0 (v.xy, v.zyx, v.x0z...)
+    """
+    symbols = cls.FIELDS + ("0",)
+
+    def swizzle(item):
+        getters = [(lambda v: 0.) if c == "0" else attrgetter(c) for c in item]
+        target = Vector2D if len(item) == 2 else Vector3D
+
+        return property(lambda self: target(*[g(self) for g in getters]))
+
+    for item in product(symbols, repeat=2):
+        setattr(cls, "".join(item), swizzle(item))
+    for item in product(symbols, repeat=3):
+        setattr(cls, "".join(item), swizzle(item))
+
+
+_add_swizzles(Vector2D)
+_add_swizzles(Vector3D)
+
+
 def euler_from_vectors(normal_vector, up_vector=Vector3D.UP):
     # Normalize the input vectors
     normal_vector = normal_vector.normalized
@@ -0,0 +1,224 @@
+from OpenGL.GL import *
+
+
+class GLState:
+    """
+    CPU-side copy of the GL state the engine touches (program, vertex array, buffers, textures,
+    blend/depth/cull settings). Going through it instead of calling GL directly turns redundant
+    state changes into no-ops, and removes the need to ever query the driver (glGet* calls force a sync).
+
+    Everything assumes a single GL context.
+    """
+    program = 0
+    vertex_array = 0
+    # target -> buffer id (None = unknown)
+    buffers = {}
+    # GL_READ_FRAMEBUFFER/GL_DRAW_FRAMEBUFFER -> framebuffer id
+    framebuffers = {}
+    active_unit = 0
+    # (unit, target) -> texture id
+    textures = {}
+    # capability -> enabled
+    capabilities = {}
+    # function name -> last arguments
+    functions = {}
+
+    # Counters for the current frame, by kind of state
+    changes = {}
+    avoided = {}
+    # Counters of the last complete frame
+    last_changes = {}
+    last_avoided = {}
+
+    @staticmethod
+    def __changed(kind):
+        GLState.changes[kind] = GLState.changes.get(kind, 0) + 1
+
+    @staticmethod
+    def __skipped(kind):
+        GLState.avoided[kind] = GLState.avoided.get(kind, 0) + 1
+
+    @staticmethod
+    def new_frame():
+        GLState.last_changes = GLState.changes
+        GLState.last_avoided = GLState.avoided
+        GLState.changes = {}
+        GLState.avoided = {}
+
+    @staticmethod
+    def stats():
+        """
+        State changes issued and avoided during the last complete frame
+        """
+        return {
+            "changes": sum(GLState.last_changes.values()),
+            "avoided": sum(GLState.last_avoided.values()),
+            "changes_by_kind": dict(GLState.last_changes),
+            "avoided_by_kind": dict(GLState.last_avoided),
+        }
+
+    @staticmethod
+    def reset():
+        """
+        Forgets everything, for when the GL state was changed behind the tracker's back (e.g. new context)
+        """
+        GLState.program = None
+        GLState.vertex_array = None
+        GLState.buffers = {}
+        GLState.framebuffers = {}
+        GLState.active_unit = None
+        GLState.textures = {}
+        GLState.capabilities = {}
+        GLState.functions = {}
+
+    @staticmethod
+    def use_program(program_id):
+        if GLState.program == program_id:
+            GLState.__skipped("program")
+            return
+
+        glUseProgram(program_id)
+        GLState.program = program_id
+        GLState.__changed("program")
+
+    @staticmethod
+    def bind_vertex_array(vao_id):
+        if GLState.vertex_array == vao_id:
+            GLState.__skipped("vertex_array")
+            return
+
+        glBindVertexArray(vao_id)
+        GLState.vertex_array = vao_id
+        # The element buffer binding belongs to the vertex array
+        GLState.buffers[GL_ELEMENT_ARRAY_BUFFER] = None
+        GLState.__changed("vertex_array")
+
+    @staticmethod
+    def bind_buffer(target, buffer_id):
+        if GLState.buffers.get(target, None) == buffer_id:
+            GLState.__skipped("buffer")
+            return
+
+        glBindBuffer(target, buffer_id)
+        GLState.buffers[target] = buffer_id
+        GLState.__changed("buffer")
+
+    @staticmethod
+    def bind_buffer_base(target, index, buffer_id):
+        glBindBufferBase(target, index, buffer_id)
+        # Also binds to the generic binding point
+        GLState.buffers[target] = buffer_id
+        GLState.__changed("buffer")
+
+    @staticmethod
+    def bind_framebuffer(target, framebuffer_id):
+        # GL_FRAMEBUFFER binds both the read and the draw framebuffers
+        targets = [GL_READ_FRAMEBUFFER, GL_DRAW_FRAMEBUFFER] if target == GL_FRAMEBUFFER else [target]
+
+        if all(GLState.framebuffers.get(t, None) == framebuffer_id for t in targets):
+            GLState.__skipped("framebuffer")
+            return
+
+        glBindFramebuffer(target, framebuffer_id)
+        for t in targets:
+            GLState.framebuffers[t] = framebuffer_id
+        GLState.__changed("framebuffer")
+
+    @staticmethod
+    def active_texture(unit):
+        if GLState.active_unit == unit:
+            return
+
+        glActiveTexture(GL_TEXTURE0 + unit)
+        GLState.active_unit = unit
+        GLState.__changed("active_texture")
+
+    @staticmethod
+    def bind_texture(target, texture_id, unit=None):
+        """
+        :param unit: texture unit to bind to, None for the currently active one
+        """
+        if unit is None:
+            unit = GLState.active_unit if GLState.active_unit is not None else 0
+
+        if GLState.textures.get((unit, target), None) == texture_id:
+            GLState.__skipped("texture")
+            return
+
+        GLState.active_texture(unit)
+        glBindTexture(target, texture_id)
+        GLState.textures[(unit, target)] = texture_id
+        GLState.__changed("texture")
+
+    @staticmethod
+    def set_enabled(capability, enabled: bool):
+        if GLState.capabilities.get(capability, None) == enabled:
+            GLState.__skipped("capability")
+            return
+
+        if enabled:
+            glEnable(capability)
+        else:
+            glDisable(capability)
+
+        GLState.capabilities[capability] = enabled
+        GLState.__changed("capability")
+
+    @staticmethod
+    def is_enabled(capability):
+        return GLState.capabilities.get(capability, False)
+
+    @staticmethod
+    def __set_function(name, gl_function, *args):
+        if GLState.functions.get(name, None) == args:
+            GLState.__skipped(name)
+            return
+
+        gl_function(*args)
+        GLState.functions[name] = args
+        GLState.__changed(name)
+
+    @staticmethod
+    def blend_func(src, dst):
+        GLState.__set_function("blend_func", glBlendFunc, src, dst)
+
+    @staticmethod
+    def depth_func(func):
+        GLState.__set_function("depth_func", glDepthFunc, func)
+
+    @staticmethod
+    def depth_mask(enabled: bool):
+        GLState.__set_function("depth_mask", glDepthMask, enabled)
+
+    @staticmethod
+    def cull_face(mode):
+        GLState.__set_function("cull_face", glCullFace, mode)
+
+    @staticmethod
+    def front_face(mode):
+        GLState.__set_function("front_face", glFrontFace, mode)
+
+    @staticmethod
+    def delete_buffers(buffer_ids):
+        glDeleteBuffers(len(buffer_ids), buffer_ids)
+
+        # Deleting a bound buffer unbinds it
+        for target, bound in GLState.buffers.items():
+            if bound in buffer_ids:
+                GLState.buffers[target] = 0
+
+    @staticmethod
+    def delete_vertex_arrays(vao_ids):
+        glDeleteVertexArrays(len(vao_ids), vao_ids)
+
+        if GLState.vertex_array in vao_ids:
+            GLState.vertex_array = 0
+            GLState.buffers[GL_ELEMENT_ARRAY_BUFFER] = None
+
+    @staticmethod
+    def delete_textures(texture_ids):
+        glDeleteTextures(len(texture_ids), texture_ids)
+
+        for key, bound in GLState.textures.items():
+            if bound in texture_ids:
+                GLState.textures[key] = 0
@@ -3,7 +3,7 @@ from abc import ABC
 
 import numpy as np
 
-from oven_engine_3D.utils.geometry import Vector3D
+from oven_engine_3D.utils.geometry import Vector3D, Quaternion
 
 
 def set_values_in_matrix(matrix, idx_val_zip):
@@ -14,22 +14,35 @@ def set_values_in_matrix(matrix, idx_val_zip):
 
 class Matrix(ABC):
     def __init__(self, rows = 4, cols = 4):
-        self._matrix = np.eye(rows, cols)
+        # Persistent float32 storage, updated in place and uploaded to GL as is
+        self._matrix = np.eye(rows, cols, dtype="float32")
         self.rows = rows
         self.cols = cols
+        self._version = 0
+
+    @property
+    def version(self):
+        """
+        Incremented whenever the values change, lets anything derived from them know when it's out of date
+        """
+        return self._version
+
+    def _changed(self):
+        self._version += 1
 
     def __eq__(self, other):
         if not isinstance(other, Matrix):
             return False
 
-        return np.array_equal(self._matrix, other._matrix)
+        return np.array_equal(self.values, other.values)
 
     @property
     def identity(self):
-        return np.eye(self.rows, self.cols)
+        return np.eye(self.rows, self.cols, dtype="float32")
 
     def load_identity(self):
-        self._matrix = self.identity
+        self._matrix[...] = self.identity
+        self._changed()
 
     def copy_matrix(self):
         return np.copy(self._matrix)
@@ -47,7 +60,8 @@ class Matrix(ABC):
 
     def add_transformation(self, other):
         other = np.array(other).reshape(4, 4)
-        self._matrix = (self._matrix @ other)
+        self._matrix[...] = self._matrix @ other
+        self._changed()
 
     @property
     def values(self):
@@ -61,6 +75,11 @@ class ModelMatrix(Matrix):
         self.stack_count = 0
         self.stack_capacity = 0
 
+        # Version of the values the cached inverse and normal matrix were computed from
+        self.__inverse_version = -1
+        self.__inverse = None
+        self.__normal_matrix = None
+
     @staticmethod
     def from_transformations(offset: Vector3D, rotation: Vector3D = Vector3D.ZERO, scale:Vector3D = Vector3D.ONE):
         matrix = ModelMatrix()
@@ -74,6 +93,42 @@ class ModelMatrix(Matrix):
 
         return matrix
 
+    def set_transformations(self, offset: Vector3D, rotation: [Vector3D|Quaternion] = Vector3D.ZERO, scale: [float|Vector3D] = Vector3D.ONE):
+        """
+        Overwrites the matrix with translation * rotation (x, then y, then z) * scale, computed in
+        closed form and written in place, same result as load_identity followed by the add_* calls
+        :param rotation: Euler angles or a quaternion
+        """
+        sx_, sy_, sz_ = (scale.x, scale.y, scale.z) if type(scale) is Vector3D else (scale, scale, scale)
+
+        m = self._matrix
+
+        if type(rotation) is Quaternion:
+            right, up, forward = rotation.axes
+            m[0, 0], m[1, 0], m[2, 0] = right.x * sx_, right.y * sx_, right.z * sx_
+            m[0, 1], m[1, 1], m[2, 1] = up.x * sy_, up.y * sy_, up.z * sy_
+            m[0, 2], m[1, 2], m[2, 2] = forward.x * sz_, forward.y * sz_, forward.z * sz_
+        else:
+            cx, sx = math.cos(rotation.x), math.sin(rotation.x)
+            cy, sy = math.cos(rotation.y), math.sin(rotation.y)
+            cz, sz = math.cos(rotation.z), math.sin(rotation.z)
+
+            m[0, 0] = cy * cz * sx_
+            m[0, 1] = -cy * sz * sy_
+            m[0, 2] = sy * sz_
+            m[1, 0] = (sx * sy * cz + cx * sz) * sx_
+            m[1, 1] = (cx * cz - sx * sy * sz) * sy_
+            m[1, 2] = -sx * cy * sz_
+            m[2, 0] = (sx * sz - cx * sy * cz) * sx_
+            m[2, 1] = (cx * sy * sz + sx * cz) * sy_
+            m[2, 2] = cx * cy * sz_
+
+        m[0, 3], m[1, 3], m[2, 3] = offset.x, offset.y, offset.z
+        m[3, 0] = m[3, 1] = m[3, 2] = 0.
+        m[3, 3] = 1.
+
+        self._changed()
+
     def add_translation(self, x : [float|Vector3D], y = None, z = None):
         offset = x
         if not type(x) is Vector3D:
@@ -86,41 +141,24 @@ class ModelMatrix(Matrix):
 
         self.add_transformation(translation_matrix)
 
-    def add_rotation(self, angle_x: [float|Vector3D], angle_y = None, angle_z = None):
-        if type(angle_x) is Vector3D:
-            angle_x, angle_y, angle_z = angle_x.x, angle_x.y, angle_x.z
+    def add_rotation(self, angle_x: [float|Vector3D|Quaternion], angle_y = None, angle_z = None):
+        """
+        :param angle_x: Euler angles (as a vector or three floats) or a quaternion
+        """
+        if type(angle_x) is Quaternion:
+            rotation = angle_x
+        else:
+            if type(angle_x) is Vector3D:
+                angle_x, angle_y, angle_z = angle_x.x, angle_x.y, angle_x.z
+
+            if angle_x == angle_y == angle_z == 0.:
+                return
 
-        if angle_x == angle_y == angle_z == 0.:
-            return
+            rotation = Quaternion.from_euler(Vector3D(angle_x, angle_y, angle_z))
 
-        cx, sx = np.cos(angle_x), np.sin(angle_x)
-        cy, sy = np.cos(angle_y), np.sin(angle_y)
-        cz, sz = np.cos(angle_z), np.sin(angle_z)
-
-        rot_mat_x = np.array([
-            [1, 0, 0, 0],
-            [0, cx, -sx, 0],
-            [0, sx, cx, 0],
-            [0, 0, 0, 1]
-        ])
-
-        rot_mat_y = np.array([
-            [cy, 0, sy, 0],
-            [0, 1, 0, 0],
-            [-sy, 0, cy, 0],
-            [0, 0, 0, 1]
-        ])
-
-        rot_mat_z = np.array([
-            [cz, -sz, 0, 0],
-            [sz, cz, 0, 0],
-            [0, 0, 1, 0],
-            [0, 0, 0, 1]
-        ])
-
-        self.add_transformation(rot_mat_x)
-        self.add_transformation(rot_mat_y)
-        self.add_transformation(rot_mat_z)
+        # Only the 3x3 part changes, the translation column stays as it is
+        self._matrix[:, :3] = self._matrix[:, :3] @ rotation.to_matrix3()
+        self._changed()
 
     def add_scale(self, x : [float|Vector3D], y = None, z = None):
         if type(x) is Vector3D:
@@ -136,6 +174,70 @@ class ModelMatrix(Matrix):
         self.add_transformation(scale_matrix)
 
 
+    @staticmethod
+    def inverse_linear_parts(linear):
+        """
+        Inverts (N, 3, 3) matrices. Translation * rotation * scale matrices have orthogonal columns, their
+        inverse is their transpose with each row divided by the squared column length, only the others
+        (sheared by a parent's non-uniform scale) go through a general inverse.
+        """
+        linear = np.asarray(linear, dtype="float32")
+        col_len_sq = (linear * linear).sum(axis=1)
+        col_len_sq[col_len_sq == 0.] = 1.
+
+        inverse = linear.transpose(0, 2, 1) / col_len_sq[:, :, np.newaxis]
+
+        # Dot products between different columns, relative to their lengths
+        gram = linear.transpose(0, 2, 1) @ linear
+        off_diagonal = np.abs(gram - gram * np.eye(3, dtype="float32")).max(axis=(1, 2))
+        sheared = off_diagonal > 1e-5 * col_len_sq.max(axis=1)
+
+        if np.any(sheared):
+            inverse[sheared] = np.linalg.inv(linear[sheared])
+
+        return inverse
+
+    def __update_inverse(self):
+        if self.__inverse_version == self.version:
+            return
+
+        m = self._matrix
+        inverse_linear = ModelMatrix.inverse_linear_parts(m[np.newaxis, :3, :3])[0]
+
+        self.__inverse = np.eye(4, dtype="float32")
+        self.__inverse[:3, :3] = inverse_linear
+        self.__inverse[:3, 3] = -inverse_linear @ m[:3, 3]
+        self.__normal_matrix = np.ascontiguousarray(inverse_linear.T)
+        self.__inverse_version = self.version
+
+    @property
+    def inverse(self):
+        """
+        Inverse of the matrix, computed the first time it's needed after the matrix changes
+        """
+        self.__update_inverse()
+        return self.__inverse
+
+    @property
+    def normal_matrix(self):
+        """
+        3x3 inverse transpose, transforms normals so that they stay perpendicular to surfaces under non-uniform scale
+        """
+        self.__update_inverse()
+        return self.__normal_matrix
+
+    def transform_point(self, point: Vector3D):
+        m = self._matrix
+        return Vector3D(*(m[:3, :3] @ (point.x, point.y, point.z) + m[:3, 3]).tolist())
+
+    def transform_direction(self, direction: Vector3D):
+        return Vector3D(*(self._matrix[:3, :3] @ (direction.x, direction.y, direction.z)).tolist())
+
+    def inverse_transform_point(self, point: Vector3D):
+        inverse = self.inverse
+        return Vector3D(*(inverse[:3, :3] @ (point.x, point.y, point.z) + inverse[:3, 3]).tolist())
+
+
 # The ViewMatrix class holds the camera's coordinate frame and
 # set's up a transformation concerning the camera's position
 # and orientation
@@ -144,11 +246,54 @@ class ViewMatrix(Matrix):
     def __init__(self):
         super().__init__(4, 4)
 
+        # Whether the values are out of date with eye/u/v/n, they're only rebuilt when read
+        self.__dirty = True
+
         self.eye = Vector3D(0,0,0)
         self.u = Vector3D(1, 0, 0)
         self.v = Vector3D(0, 1, 0)
         self.n = Vector3D(0, 0, 1)
 
+    def __moved(self):
+        self.__dirty = True
+        self._changed()
+
+    @property
+    def eye(self):
+        return self.__eye
+
+    @eye.setter
+    def eye(self, value):
+        self.__eye = value
+        self.__moved()
+
+    @property
+    def u(self):
+        return self.__u
+
+    @u.setter
+    def u(self, value):
+        self.__u = value
+        self.__moved()
+
+    @property
+    def v(self):
+        return self.__v
+
+    @v.setter
+    def v(self, value):
+        self.__v = value
+        self.__moved()
+
+    @property
+    def n(self):
+        return self.__n
+
+    @n.setter
+    def n(self, value):
+        self.__n = value
+        self.__moved()
+
     def look_at(self, eye, target, up_vector = Vector3D.UP):
         self.eye = eye
         self.n = (eye - target).normalized
@@ -180,52 +325,38 @@ class ViewMatrix(Matrix):
         self.u, self.v = ViewMatrix.__rotate_axes(self.u, self.v, angle)
 
     def rotate_global_x(self, angle):
-        c = np.cos(angle)
-        s = np.sin(angle)
-
-        # Create the rotation matrix around the global x-axis
-        R_x = np.array([
-            [1, 0, 0, 0],
-            [0, c, -s, 0],
-            [0, s, c, 0],
-            [0, 0, 0, 1]
-        ], dtype=np.float32)
-
-        self.rotate_with_matrix(R_x)
+        self.rotate_with_quaternion(Quaternion.from_axis_angle(Vector3D.RIGHT, angle))
 
     def rotate_global_y(self, angle):
-        c = np.cos(angle)
-        s = np.sin(angle)
-
-        # Create the rotation matrix around the global y-axis
-        R_y = np.array([
-            [c, 0, s, 0],
-            [0, 1, 0, 0],
-            [-s, 0, c, 0],
-            [0, 0, 0, 1]
-        ], dtype=np.float32)
-
-        self.rotate_with_matrix(R_y)
+        self.rotate_with_quaternion(Quaternion.from_axis_angle(Vector3D.UP, angle))
 
     def rotate_global_z(self, angle):
-        c = np.cos(angle)
-        s = np.sin(angle)
-
-        # Create the rotation matrix around the global z-axis
-        R_z = np.array([
-            [c, -s, 0, 0],
-            [s, c, 0, 0],
-            [0, 0, 1, 0],
-            [0, 0, 0, 1]
-        ], dtype=np.float32)
-
-        self.rotate_with_matrix(R_z)
+        self.rotate_with_quaternion(Quaternion.from_axis_angle(Vector3D.FORWARD, angle))
 
     def rotate_with_matrix(self, rot_matrix):
         self.u = self.u.rotate_with_matrix(rot_matrix)
         self.v = self.v.rotate_with_matrix(rot_matrix)
         self.n = self.n.rotate_with_matrix(rot_matrix)
 
+    def rotate_with_quaternion(self, rotation: Quaternion):
+        """
+        Rotates the camera's axes around world space axes
+        """
+        self.u = rotation.rotate(self.u)
+        self.v = rotation.rotate(self.v)
+        self.n = rotation.rotate(self.n)
+
+    @property
+    def orientation(self):
+        """
+        Rotation taking the world axes to the camera's (u, v, n)
+        """
+        return Quaternion.from_axes(self.u, self.v, self.n)
+
+    @orientation.setter
+    def orientation(self, value: Quaternion):
+        self.u, self.v, self.n = value.axes
+
     @staticmethod
     def __rotate_axes(a, b, angle):
         c = np.cos(angle)
@@ -239,10 +370,16 @@ class ViewMatrix(Matrix):
 
     @property
     def values(self):
-        return np.array([[self.u.x, self.u.y, self.u.z, -self.eye.dot(self.u)],
-                [self.v.x, self.v.y, self.v.z, -self.eye.dot(self.v)],
-                [self.n.x, self.n.y, self.n.z, -self.eye.dot(self.n)],
-                [0,        0,        0,        1]])
+        if self.__dirty:
+            u, v, n, eye = self.__u, self.__v, self.__n, self.__eye
+            m = self._matrix
+
+            m[0, 0], m[0, 1], m[0, 2], m[0, 3] = u.x, u.y, u.z, -eye.dot(u)
+            m[1, 0], m[1, 1], m[1, 2], m[1, 3] = v.x, v.y, v.z, -eye.dot(v)
+            m[2, 0], m[2, 1], m[2, 2], m[2, 3] = n.x, n.y, n.z, -eye.dot(n)
+            self.__dirty = False
+
+        return self._matrix
 
 class ProjectionMatrix(Matrix):
     __create_key = object()
@@ -264,6 +401,8 @@ class ProjectionMatrix(Matrix):
 
         self.is_orthographic = False
 
+        self.__built_parameters = None
+
     @staticmethod
     def perspective(fov: float, aspect_ratio: float, near: float, far: float):
         near, far = min(near, far), max(near, far)
@@ -305,8 +444,30 @@ class ProjectionMatrix(Matrix):
 
         return output
 
+    def __parameters(self):
+        return (self.left, self.right, self.bottom, self.top, self.near, self.far, self.is_orthographic)
+
+    @property
+    def version(self):
+        self.__refresh()
+        return self._version
+
     @property
     def values(self):
+        self.__refresh()
+        return self._matrix
+
+    def __refresh(self):
+        # The parameters are plain attributes, so changes are found by comparing them to those of the last build
+        parameters = self.__parameters()
+        if parameters == self.__built_parameters:
+            return
+
+        self.__built_parameters = parameters
+        self._matrix[...] = self.__compute()
+        self._changed()
+
+    def __compute(self):
         rl_inv_dist = 1. / (self.right - self.left)
         tb_inv_dist = 1. / (self.top - self.bottom)
         nf_inv_dist = 1. / (self.near - self.far)
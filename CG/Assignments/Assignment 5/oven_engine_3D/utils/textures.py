@@ -8,6 +8,7 @@ from OpenGL.GL import *
 from OpenGL.constant import IntConstant
 
 from oven_engine_3D.utils.geometry import Vector2D
+from oven_engine_3D.utils.gl_state import GLState
 
 MISSING_TEXTURE = "res/textures/DB_missing_texture.png"
 
@@ -43,7 +44,7 @@ class TexturesManager:
 
         textID = glGenTextures(1)
 
-        glBindTexture(GL_TEXTURE_2D, textID)
+        GLState.bind_texture(GL_TEXTURE_2D, textID)
 
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, filtering)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, filtering)
@@ -60,7 +61,7 @@ class TexturesManager:
 
         glTexImage2D(GL_TEXTURE_2D, 0, color_format, size.x, size.y, 0, pixel_format, GL_UNSIGNED_BYTE, tex_str)
 
-        glBindTexture(GL_TEXTURE_2D, 0)
+        GLState.bind_texture(GL_TEXTURE_2D, 0)
 
         textID = int(textID)
 
@@ -130,7 +131,7 @@ class TexturesManager:
             faces_size[idx] = Vector2D(s.get_size())
 
         cmapID = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_CUBE_MAP, cmapID)
+        GLState.bind_texture(GL_TEXTURE_CUBE_MAP, cmapID)
 
         glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
         glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
@@ -143,7 +144,7 @@ class TexturesManager:
             w, h = faces_size[idx]
             glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X + idx, 0, GL_RGB, w, h, 0, GL_RGB, GL_UNSIGNED_BYTE, faces_data[idx])
 
-        glBindTexture(GL_TEXTURE_CUBE_MAP, 0)
+        GLState.bind_texture(GL_TEXTURE_CUBE_MAP, 0)
 
         cmapID = int(cmapID)
 
@@ -208,5 +209,5 @@ class TexturesManager:
             print(f"Invalid texture ID {textureID}")
             return False
 
-        glDeleteTextures(textureID, 1)
+        GLState.delete_textures([textureID])
         return True
\ No newline at end of file
@@ -0,0 +1,41 @@
+#version 330
+
+// Light pass of the deferred path: shades every pixel of the G-buffer written by gbuffer.frag,
+// with the same lighting, fog and tonemapping as mesh.frag
+
+#define SURFACE_UNSHADED 2.
+
+//--INCLUDE lighting.glsl
+
+// G-buffer, see gbuffer.frag for what each target holds
+uniform sampler2D u_gbuffer_albedo;
+uniform sampler2D u_gbuffer_position;
+uniform sampler2D u_gbuffer_normal;
+uniform sampler2D u_gbuffer_specular;
+uniform sampler2D u_gbuffer_ambient;
+
+void main(void)
+{
+	ivec2 texel = ivec2(gl_FragCoord.xy);
+
+	vec4 position = texelFetch(u_gbuffer_position, texel, 0);
+	// Nothing was drawn there, the clear color stays
+	if (position.w == 0.)
+		discard;
+
+	vec4 albedo = texelFetch(u_gbuffer_albedo, texel, 0);
+	if (position.w == SURFACE_UNSHADED)
+	{
+		gl_FragColor = vec4(albedo.rgb, 1.);
+		return;
+	}
+
+	vec4 normal = texelFetch(u_gbuffer_normal, texel, 0);
+	vec4 ambient = texelFetch(u_gbuffer_ambient, texel, 0);
+
+	Surface s = Surface(vec4(position.xyz, 1.), vec4(normal.xyz, 0.), vec4(albedo.rgb, 1.),
+						texelFetch(u_gbuffer_specular, texel, 0), vec4(ambient.rgb, 1.),
+						normal.w, albedo.a, ambient.a > .5);
+
+	gl_FragColor = vec4(shade_surface(s).rgb, 1.);
+}
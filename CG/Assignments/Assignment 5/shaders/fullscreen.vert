@@ -0,0 +1,11 @@
+#version 330
+
+// One triangle covering the whole screen, made from the vertex index alone (drawn without any vertex buffer).
+// Its corners are (-1, -1), (-1, 3), (3, -1): clockwise, the engine's front face
+
+void main(void)
+{
+	vec2 pos = vec2(gl_VertexID & 2, (gl_VertexID << 1) & 2);
+
+	gl_Position = vec4(pos * 2. - 1., 0., 1.);
+}
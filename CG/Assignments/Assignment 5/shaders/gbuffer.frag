@@ -0,0 +1,88 @@
+#version 330
+
+// Geometry pass of the deferred path: writes the surface attributes mesh.frag would shade with
+// into the G-buffer (see deferred.py), lighting happens later in deferred_light.frag
+
+#define WHITE vec4(1.)
+#define SURFACE_SHADED 1.
+#define SURFACE_UNSHADED 2.
+
+// USE_DIFF_TEXTURE, USE_SPEC_TEXTURE, UNSHADED and ALPHA_DISCARD are defined per material, as in mesh.frag
+// (see MeshShader.Feature)
+
+// Same block as in mesh.frag, for the injected code
+layout(std140, row_major) uniform FrameBlock
+{
+	mat4 u_projection_matrix;
+	mat4 u_view_matrix;
+	vec4 u_camera_position;
+	float u_time;
+};
+
+struct Material
+{
+	vec4 diffuse_color,
+		 specular_color,
+		 ambient_color;
+	sampler2D diffuse_tex, specular_tex;
+	float shininess;
+	float alpha_cutoff;
+	int transparency_mode; // 0 = opaque, 1 = discard, 2 = normal transparent
+	bool receive_ambient,
+		 unshaded,
+		 use_diff_texture,
+		 use_spec_texture;
+	bool use_distance_fade;
+	float distance_fade[2];
+};
+uniform Material u_material;
+
+uniform vec2 u_uv_offset;
+uniform vec2 u_uv_scale;
+
+in vec4 v_pos;
+in vec4 v_norm;
+in vec2 v_uv;
+
+layout(location = 0) out vec4 g_albedo; // base diffuse color, specular texture value
+layout(location = 1) out vec4 g_position; // world position, SURFACE_SHADED or SURFACE_UNSHADED (0 where nothing was drawn)
+layout(location = 2) out vec4 g_normal; // world normal, shininess
+layout(location = 3) out vec4 g_specular; // specular color
+layout(location = 4) out vec4 g_ambient; // ambient color, 1 if the surface receives ambient light
+
+//--INJECTION-BEGIN
+vec4 get_base_diffuse()
+{
+#ifdef USE_DIFF_TEXTURE
+	return u_material.diffuse_color * texture(u_material.diffuse_tex, v_uv);
+#else
+	return u_material.diffuse_color;
+#endif
+}
+//--INJECTION-END
+
+void main(void)
+{
+	vec4 base_diff = get_base_diffuse();
+
+#ifdef ALPHA_DISCARD
+	if (base_diff.a < u_material.alpha_cutoff)
+		discard;
+#endif
+
+#ifdef USE_SPEC_TEXTURE
+	float spec_tex_value = texture(u_material.specular_tex, v_uv).r;
+#else
+	float spec_tex_value = 1.;
+#endif
+
+	g_albedo = vec4(base_diff.rgb, spec_tex_value);
+#ifdef UNSHADED
+	g_position = vec4(v_pos.xyz, SURFACE_UNSHADED);
+#else
+	g_position = vec4(v_pos.xyz, SURFACE_SHADED);
+#endif
+	g_normal = vec4(normalize(v_norm.xyz), u_material.shininess);
+	g_specular = u_material.specular_color;
+	g_ambient = vec4(u_material.ambient_color.rgb, u_material.receive_ambient ? 1. : 0.);
+}
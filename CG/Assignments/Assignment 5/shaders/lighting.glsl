@@ -0,0 +1,231 @@
+// Lighting, fog and tonemapping shared by mesh.frag and deferred_light.frag, spliced in where they
+// have "//--INCLUDE lighting.glsl" (see BaseShader.resolve_includes)
+
+#define BLACK vec4(vec3(0.), 1.)
+#define FOG_NONE -1
+#define FOG_LINEAR 0
+#define FOG_EXP 1
+#define FOG_EXP2 2
+#define TONEMAP_NONE -1
+#define TONEMAP_ACES 0
+#define TONEMAP_REINHARD 1
+#define TONEMAP_UNCHARTED2 2
+#define LIGHT_TEXELS 6
+
+// Set from the environment (see Environment.shader_defines)
+#ifndef FOG_MODE
+#define FOG_MODE FOG_NONE
+#endif
+#ifndef TONEMAP_MODE
+#define TONEMAP_MODE TONEMAP_NONE
+#endif
+
+// Uniform blocks filled once per frame by FrameUniforms (see uniform_blocks.py for the matching layouts)
+layout(std140, row_major) uniform FrameBlock
+{
+	mat4 u_projection_matrix;
+	mat4 u_view_matrix;
+	vec4 u_camera_position;
+	float u_time;
+};
+
+layout(std140) uniform EnvironmentBlock
+{
+	vec4 global_ambient;
+	vec4 fog_color;
+	float ambient_strength;
+	float start_fog, end_fog; // Used only for linear fog
+	float fog_density; // Used only for exp or exp2 fog
+	int fog_mode; // -1 = none, 0 = linear, 1 = exp, 2 = exp2
+	int tonemap_mode; // -1 = none, 0 = aces
+} u_env;
+
+struct Light
+{
+	vec4 diffuse,
+		 specular,
+		 ambient;
+	vec4 position;
+	vec4 attenuation;
+	float intensity;
+	float radius;
+	bool is_sun;
+};
+
+// Clustered lighting, see light_clusters.py
+layout(std140) uniform LightsBlock
+{
+	ivec4 u_cluster_grid; // tiles along x and y, depth slices, lights reaching everything (first in u_light_data)
+	vec4 u_cluster_depth; // near, far, slices per unit of log(depth / near)
+	int u_light_count;
+};
+uniform samplerBuffer u_light_data; // LIGHT_TEXELS texels per light
+uniform isamplerBuffer u_cluster_cells; // offset in u_cluster_lights and light count of each cluster
+uniform isamplerBuffer u_cluster_lights; // light indices of each cluster
+
+// Everything about a point of a surface its lighting needs
+struct Surface
+{
+	vec4 position;
+	vec4 normal;
+	vec4 diffuse;
+	vec4 specular_color;
+	vec4 ambient_color;
+	float shininess;
+	float spec_tex_value;
+	bool receive_ambient;
+};
+
+vec4 color_from_light(vec4 view_vec, Light light, Surface s)
+{
+	float d = distance(light.position, s.position);
+
+	if (light.radius > 0. && d > light.radius)
+		return BLACK;
+
+	vec4 s_vec = light.is_sun ? normalize(light.position) : light.position - s.position;
+
+	vec4 ambient = s.receive_ambient ? (light.ambient * s.ambient_color) : BLACK;
+
+	float lambert = max(0.0, dot(s_vec, s.normal) / (length(s_vec) * length(s.normal)));
+	vec4 diffuse = light.diffuse * light.intensity * s.diffuse * lambert;
+
+	vec4 h = (view_vec + s_vec) * .5;
+	float phong = max(0.0, dot(h, s.normal) / (length(h) * length(s.normal)));
+	vec4 specular = light.specular * light.intensity * s.specular_color * pow(phong, s.shininess) * s.spec_tex_value;
+
+	float dist_factor = 1.;
+	if (light.radius > 0.)
+		dist_factor = clamp(1. - pow(d / light.radius, 2.), 0., 1.);
+
+	return (ambient + diffuse + specular) * (dist_factor * dist_factor);
+}
+
+Light fetch_light(int idx)
+{
+	int base = idx * LIGHT_TEXELS;
+	vec4 params = texelFetch(u_light_data, base + 5);
+
+	return Light(texelFetch(u_light_data, base),
+				 texelFetch(u_light_data, base + 1),
+				 texelFetch(u_light_data, base + 2),
+				 texelFetch(u_light_data, base + 3),
+				 texelFetch(u_light_data, base + 4),
+				 params.x, params.y, params.z > .5);
+}
+
+int cluster_index(vec4 pos)
+{
+	vec4 view_pos = u_view_matrix * pos;
+	vec4 clip_pos = u_projection_matrix * view_pos;
+
+	ivec2 tile = ivec2(floor((clip_pos.xy / clip_pos.w * .5 + .5) * vec2(u_cluster_grid.xy)));
+	tile = clamp(tile, ivec2(0), u_cluster_grid.xy - 1);
+
+	float depth = max(-view_pos.z, u_cluster_depth.x);
+	int slice = clamp(int(floor(log(depth / u_cluster_depth.x) * u_cluster_depth.z)), 0, u_cluster_grid.z - 1);
+
+	return (slice * u_cluster_grid.y + tile.y) * u_cluster_grid.x + tile.x;
+}
+
+float linear_fog_factor(float dist)
+{
+	float fact = (u_env.end_fog - dist) / (u_env.end_fog - u_env.start_fog);
+	return clamp(fact, 0., 1.);
+}
+
+float exp_fog_factor(float dist)
+{
+	float fact = exp(-u_env.fog_density * dist);
+	return clamp(fact, 0., 1.);
+}
+
+float exp2_fog_factor(float dist)
+{
+	float fact = exp(-pow(u_env.fog_density * dist, 2.));
+	return clamp(fact, 0., 1.);
+}
+
+vec4 apply_fog(vec4 base_color, float dist)
+{
+#if FOG_MODE == FOG_NONE
+	return base_color;
+#else
+#if FOG_MODE == FOG_EXP
+	float fog_strength = exp_fog_factor(dist);
+#elif FOG_MODE == FOG_EXP2
+	float fog_strength = exp2_fog_factor(dist);
+#else
+	float fog_strength = linear_fog_factor(dist);
+#endif
+
+	return fog_strength * base_color + (1. - fog_strength) * u_env.fog_color;
+#endif
+}
+
+vec3 aces(vec3 x) {
+  const float a = 2.51;
+  const float b = 0.03;
+  const float c = 2.43;
+  const float d = 0.59;
+  const float e = 0.14;
+  return clamp((x * (a * x + b)) / (x * (c * x + d) + e), 0.0, 1.0);
+}
+
+vec3 reinhard(vec3 v)
+{
+    return v / (1.0f + v);
+}
+
+vec3 uncharted2_tonemap_partial(vec3 x)
+{
+    float A = 0.15f;
+    float B = 0.50f;
+    float C = 0.10f;
+    float D = 0.20f;
+    float E = 0.02f;
+    float F = 0.30f;
+    return ((x*(A*x+C*B)+D*E)/(x*(A*x+B)+D*F))-E/F;
+}
+
+vec3 uncharted2_filmic(vec3 v)
+{
+    float exposure_bias = 2.0f;
+    vec3 curr = uncharted2_tonemap_partial(v * exposure_bias);
+
+    vec3 W = vec3(11.2f);
+    vec3 white_scale = vec3(1.0f) / uncharted2_tonemap_partial(W);
+    return curr * white_scale;
+}
+
+vec4 tonemap(vec4 color)
+{
+#if TONEMAP_MODE == TONEMAP_ACES
+	return vec4(aces(color.rgb), color.a);
+#elif TONEMAP_MODE == TONEMAP_REINHARD
+	return vec4(reinhard(color.rgb), color.a);
+#elif TONEMAP_MODE == TONEMAP_UNCHARTED2
+	return vec4(uncharted2_filmic(color.rgb), color.a);
+#else
+	return clamp(color, 0., 1.);
+#endif
+}
+
+// Final color of a surface: global ambient, then the lights reaching everything and those of its cluster,
+// fogged and tonemapped
+vec4 shade_surface(Surface s)
+{
+	vec4 view_vec = u_camera_position - s.position;
+
+	vec4 shaded_color = u_env.global_ambient * s.diffuse * u_env.ambient_strength;
+
+	for (int i = 0; i < u_cluster_grid.w; i++)
+		shaded_color += color_from_light(view_vec, fetch_light(i), s);
+
+	// Only the lights whose radius reaches the surface's cluster
+	ivec2 cell = texelFetch(u_cluster_cells, cluster_index(s.position)).xy;
+	for (int i = 0; i < cell.y; i++)
+		shaded_color += color_from_light(view_vec, fetch_light(texelFetch(u_cluster_lights, cell.x + i).x), s);
+
+	return tonemap(apply_fog(shaded_color, length(view_vec)));
+}
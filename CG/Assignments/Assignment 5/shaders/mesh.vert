@@ -3,15 +3,27 @@
 layout(location = 0) in vec3 a_position;
 layout(location = 1) in vec3 a_normal;
 layout(location = 2) in vec2 a_uv;
+// Per-instance model matrix, takes locations 3 to 6
+layout(location = 3) in mat4 a_model_matrix;
+// Per-instance inverse transpose of the model matrix, takes locations 7 to 9
+layout(location = 7) in mat3 a_normal_matrix;
+
+// Filled once per frame by FrameUniforms, same as in mesh.frag
+layout(std140, row_major) uniform FrameBlock
+{
+	mat4 u_projection_matrix;
+	mat4 u_view_matrix;
+	vec4 u_camera_position;
+	float u_time;
+};
 
 uniform mat4 u_model_matrix;
-uniform mat4 u_view_matrix;
-uniform mat4 u_projection_matrix;
+// Inverse transpose of the model matrix, keeps normals perpendicular to surfaces under non-uniform scale
+uniform mat3 u_normal_matrix;
+uniform bool u_instanced;
 uniform vec2 u_uv_offset;
 uniform vec2 u_uv_scale;
 
-uniform float u_time;
-
 out vec4 v_pos;
 out vec4 v_norm;
 out vec2 v_uv;
@@ -33,9 +45,12 @@ vec2 get_uv(vec2 uv)
 
 void main(void)
 {
+	mat4 model_matrix = u_instanced ? a_model_matrix : u_model_matrix;
+	mat3 normal_matrix = u_instanced ? a_normal_matrix : u_normal_matrix;
+
 	v_uv = get_uv(a_uv) * u_uv_scale + u_uv_offset;
-	v_norm = normalize(u_model_matrix * vec4(get_normal(a_normal), 0.0));
-	v_pos = get_position(u_model_matrix * vec4((a_position), 1.0));
+	v_norm = vec4(normalize(normal_matrix * get_normal(a_normal)), 0.0);
+	v_pos = get_position(model_matrix * vec4((a_position), 1.0));
 
 	gl_Position = u_projection_matrix * (u_view_matrix * v_pos);
 }
\ No newline at end of file